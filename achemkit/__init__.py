@@ -19,14 +19,16 @@ from achemkit.reactionnetdot import net_to_dot
 from achemkit.randomnet import Uniform
 from achemkit.randomnet import Linear
 
-from achemkit.bucket import Bucket, Event
+from achemkit.bucket import Bucket, Event, EventBatch
 
-from achemkit.achem import AChem, AChemReactionNetwork
+from achemkit.achem import AChem, AChemReactionNetwork, CachedAChem
 
 from achemkit.sim.reactor import Reactor
 from achemkit.sim.simple import sim_enumerate, sim_itterative, sim_stepwise, net_enumerate
 from achemkit.sim.simple import ReactorEnumerate, ReactorItterative, ReactorStepwise
 from achemkit.sim.gillespie import sim_gillespie, ReactorGillespieLike
+from achemkit.sim.ensemble import Ensemble
+from achemkit.sim.compartments import Compartments
 
 import achemkit.properties
 import achemkit.properties_wnx
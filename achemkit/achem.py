@@ -6,11 +6,42 @@ to do so.
 """
 
 import random
+import collections
+import os
+import hashlib
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle as pickle
+
+from achemkit import OrderedFrozenBag, FrozenBag
+from achemkit.utils.sampler import AliasTable
+
+def react_with(achem, reactants, rng):
+    """
+    Calls :py:meth:`AChem.react`, passing `rng` if the AChem draws from a
+    caller-supplied random number generator (``usesrng`` is true), so that
+    the outcome depends only on the state of `rng`.
+    """
+    if getattr(achem, "usesrng", False):
+        return achem.react(reactants, rng)
+    return achem.react(reactants)
+
+def react_many_with(achem, reactantslist, rng):
+    """
+    As :py:func:`react_with` for :py:meth:`AChem.react_many`.
+    """
+    if getattr(achem, "usesrng", False):
+        return achem.react_many(reactantslist, rng)
+    return achem.react_many(reactantslist)
 
-from achemkit import OrderedFrozenBag
 
 class AChem(object):
     noreactants = (2,)
+    #if true, react always gives the same products for the same reactants
+    deterministic = False
+    #if true, react and react_many accept a random number generator to use
+    usesrng = False
 
     def react(self, molecules):
         """
@@ -25,6 +56,20 @@ class AChem(object):
         raise NotImplementedError
         
         
+    def react_many(self, reactantslist):
+        """
+        May be overridden by subclasses to react many collections of 
+        reactants in a single call, e.g. by vectorized or precomputed 
+        lookups.
+        
+        By default, calls :py:meth:`react` for each collection in turn.
+        
+        :param reactantslist: Itterable of itterables of reactant molecules
+        :rtype: List of itterables of product molecules, in the same order.
+        """
+        return [self.react(reactants) for reactants in reactantslist]
+        
+        
     def all_reactions(self, molecules):
         """
         May be implemented by subclasses to enable enumeration
@@ -41,6 +86,30 @@ class AChem(object):
         raise NotImplementedError
         
         
+    def reactive_reactants(self):
+        """
+        May be implemented by subclasses to enable skipping of elastic 
+        collisions during simulation.
+        
+        Returns every collection of reactants that can react. Any other 
+        collection of reactants is assumed to only react elastically.
+        
+        :rtype: Itterable of reactant collections.
+        """
+        raise NotImplementedError
+        
+        
+    def identity(self):
+        """
+        Returns a string that identifies this Artificial Chemistry, for 
+        example so that results stored on disk can be matched to it later.
+        
+        By default this is the name of the class. Subclasses with parameters
+        that change their reactions should override this to include them.
+        """
+        return "{0}.{1}".format(self.__class__.__module__, self.__class__.__name__)
+        
+        
     def atoms(self, molecule):
         """
         May be implemented by subclasses to enable some analysis
@@ -63,33 +132,284 @@ class AChemReactionNetwork(AChem):
     typically to see which best reconstructs the original
     :py:class:`achem.Reaction Network`.
     """
+    usesrng = True
     
-    def __init__(self, reactionnetwork):
+    def __init__(self, reactionnetwork, elastic=False, rng=None):
+        """
+        :param reactionnetwork: :py:class:`achemkit.ReactionNetwork` to use.
+        :param elastic: If true, reactions are treated as probabilities per 
+                        collision so reactants whose reactions have rates 
+                        summing to less than 1.0 may also collide elastically.
+                        Otherwise only divergent reactions compete.
+        :param rng: Instance of :py:class:`random.Random` to use when one is
+                    not given to :py:meth:`react`. Defaults to the 
+                    :py:mod:`random` module.
+        """
         self.reactionnetwork = reactionnetwork
         self.noreactants = [len(x) for x,y in reactionnetwork.reactions]
+        self.elastic = elastic
+        if rng is None:
+            rng = random
+        self.rng = rng
+        #precompute the possible products of each collection of reactants
+        self.products = {}
+        for netreactants, netproducts in self.reactionnetwork.reactions:
+            if netreactants not in self.products:
+                self.products[netreactants] = []
+            self.products[netreactants].append(netproducts)
+        #and an alias table to choose between them according to their rates
+        self.outcomes = {}
+        for netreactants, possibleproducts in self.products.items():
+            outcomes = list(possibleproducts)
+            weights = [self.reactionnetwork.rate(netreactants, x) for x in possibleproducts]
+            if elastic and sum(weights) < 1.0:
+                outcomes.append(netreactants)
+                weights.append(1.0 - sum(weights))
+            self.outcomes[netreactants] = (tuple(outcomes), AliasTable(weights))
+        self.deterministic = all(len(x) == 1 for x, table in self.outcomes.values())
+        
+    def __reduce__(self):
+        #the lookup tables are rebuilt from the network, which keeps pickles
+        #small, and the random module cannot be pickled so is restored
+        rng = self.rng
+        if rng is random:
+            rng = None
+        return (self.__class__, (self.reactionnetwork, self.elastic, rng))
+        
+    def react(self, reactants, rng=None):
+        """
+        Choose between the reactions of the reactants according to their rates.
         
-    def react(self, reactants):
+        :param reactants: Itterable of reactant molecules
+        :param rng: Instance of :py:class:`random.Random` to use.
+        :rtype: Itterable of product molecules
+        """
         #need to convert to a bag so that it maps to the reactionnetwork properly
         if not isinstance(reactants, OrderedFrozenBag):
             reactants = OrderedFrozenBag(reactants)
             
-        possibleproducts = []
-        for netreactants, netproducts in self.reactionnetwork.reactions:
-            if netreactants == reactants:
-                possibleproducts.append(netproducts)
-                
-        if len(possibleproducts) == 0:
+        outcomes = self.outcomes.get(reactants)
+        if outcomes is None:
             return reactants
-        else:
-            return random.choice(possibleproducts)
+        possibleproducts, table = outcomes
+        if len(possibleproducts) == 1:
+            return possibleproducts[0]
+        if rng is None:
+            rng = self.rng
+        return possibleproducts[table.sample(rng)]
+            
+    def react_many(self, reactantslist, rng=None):
+        if rng is None:
+            rng = self.rng
+        alloutcomes = self.outcomes
+        results = []
+        for reactants in reactantslist:
+            if not isinstance(reactants, OrderedFrozenBag):
+                reactants = OrderedFrozenBag(reactants)
+            outcomes = alloutcomes.get(reactants)
+            if outcomes is None:
+                results.append(reactants)
+            else:
+                possibleproducts, table = outcomes
+                if len(possibleproducts) == 1:
+                    results.append(possibleproducts[0])
+                else:
+                    results.append(possibleproducts[table.sample(rng)])
+        return results
+        
+    def reactive_reactants(self):
+        return set(self.products)
         
     def all_reactions(self, reactants):
         #need to convert to a bag so that it maps to the reactionnetwork properly
         reactants = OrderedFrozenBag(reactants)
             
         possibleproducts = {}
-        for netreactants, netproducts in self.reactionnetwork.reactions:
-            if netreactants == reactants:
-                possibleproducts[netreactants, netproducts] =  self.reactionnetwork.rate(netreactants, netproducts)
+        for netproducts in self.products.get(reactants, ()):
+            possibleproducts[reactants, netproducts] =  self.reactionnetwork.rate(reactants, netproducts)
         
         return possibleproducts
+        
+    def identity(self):
+        return "{0}:{1}:{2}".format(super(AChemReactionNetwork, self).identity(), 
+                                    hashlib.md5(str(self.reactionnetwork)).hexdigest(),
+                                    self.elastic)
+        
+
+class CachedAChem(AChem):
+    """
+    Wraps another :py:class:`AChem` and remembers the results it gives, 
+    discarding the least recently used results when full.
+    
+    Results of :py:meth:`AChem.all_reactions` are always remembered. Results 
+    of :py:meth:`AChem.react` are only remembered if the wrapped 
+    :py:class:`AChem` is deterministic. Both are remembered regardless of the 
+    order of the reactants.
+    
+    The numbers of hits, misses and evictions are recorded as attributes
+    ``hits``, ``misses`` and ``evictions``.
+    """
+    
+    def __init__(self, achem, maxsize=100000, filename=None):
+        """
+        :param achem: :py:class:`AChem` object or equivalent to wrap.
+        :param maxsize: Maximum number of results to remember for each method.
+        :param filename: If given, results are loaded from this file if it 
+                         exists and stored to it by :py:meth:`save`.
+        """
+        self.achem = achem
+        self.noreactants = achem.noreactants
+        self.deterministic = getattr(achem, "deterministic", False)
+        self.usesrng = getattr(achem, "usesrng", False)
+        self.maxsize = maxsize
+        self.filename = filename
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._react = collections.OrderedDict()
+        self._all_reactions = collections.OrderedDict()
+        if filename is not None and os.path.exists(filename):
+            self.load(filename)
+            
+    def _get(self, cache, key):
+        """
+        Internal function to lookup a key and mark it as recently used.
+        Raises :py:class:`KeyError` if it is not present.
+        """
+        try:
+            value = cache.pop(key)
+        except KeyError:
+            self.misses += 1
+            raise
+        cache[key] = value
+        self.hits += 1
+        return value
+        
+    def _put(self, cache, key, value):
+        """
+        Internal function to store a value, evicting the least recently used
+        if needed.
+        """
+        cache[key] = value
+        while len(cache) > self.maxsize:
+            cache.popitem(last=False)
+            self.evictions += 1
+            
+    def react(self, reactants, rng=None):
+        if not self.deterministic:
+            return react_with(self.achem, reactants, rng)
+        key = OrderedFrozenBag(reactants)
+        try:
+            return self._get(self._react, key)
+        except KeyError:
+            products = self.achem.react(reactants)
+            self._put(self._react, key, products)
+            return products
+            
+    def react_many(self, reactantslist, rng=None):
+        if not self.deterministic:
+            return react_many_with(self.achem, reactantslist, rng)
+        results = []
+        #reactants and positions in results of each missing key, so
+        #duplicates are only reacted once
+        missing = collections.OrderedDict()
+        for reactants in reactantslist:
+            key = OrderedFrozenBag(reactants)
+            if key in missing:
+                self.hits += 1
+                missing[key][1].append(len(results))
+                results.append(None)
+                continue
+            try:
+                results.append(self._get(self._react, key))
+            except KeyError:
+                missing[key] = (reactants, [len(results)])
+                results.append(None)
+        if len(missing) > 0:
+            products = self.achem.react_many([reactants for reactants, indexes in missing.itervalues()])
+            for (key, (reactants, indexes)), thisproducts in zip(missing.iteritems(), products):
+                for i in indexes:
+                    results[i] = thisproducts
+                self._put(self._react, key, thisproducts)
+        return results
+        
+    def all_reactions(self, reactants):
+        key = FrozenBag(reactants)
+        try:
+            return dict(self._get(self._all_reactions, key))
+        except KeyError:
+            reactions = self.achem.all_reactions(reactants)
+            self._put(self._all_reactions, key, dict(reactions))
+            return reactions
+            
+    def reactive_reactants(self):
+        return self.achem.reactive_reactants()
+        
+    def atoms(self, molecule):
+        return self.achem.atoms(molecule)
+        
+    def identity(self):
+        try:
+            return self.achem.identity()
+        except AttributeError:
+            return "{0}.{1}".format(self.achem.__class__.__module__, self.achem.__class__.__name__)
+            
+    def statistics(self):
+        """
+        Returns a dictionary of cache statistics.
+        """
+        lookups = self.hits + self.misses
+        if lookups > 0:
+            hitrate = self.hits / float(lookups)
+        else:
+            hitrate = 0.0
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, 
+                "hitrate": hitrate, "size": len(self._react) + len(self._all_reactions)}
+                
+    def clear(self):
+        """
+        Forget all remembered results.
+        """
+        self._react.clear()
+        self._all_reactions.clear()
+        
+    def save(self, filename=None):
+        """
+        Store remembered results to disk, keyed by :py:meth:`identity` so that
+        results from other Artificial Chemistries in the same file are kept.
+        
+        The file is replaced atomically.
+        
+        :param filename: Path to write to. Defaults to the filename given when
+                         created.
+        """
+        if filename is None:
+            filename = self.filename
+        stored = {}
+        if os.path.exists(filename):
+            stored = pickle.load(open(filename, "rb"))
+        stored[self.identity()] = (tuple(self._react.items()), tuple(self._all_reactions.items()))
+        tmpfilename = filename + ".tmp"
+        outfile = open(tmpfilename, "wb")
+        pickle.dump(stored, outfile, 2)
+        outfile.close()
+        os.rename(tmpfilename, filename)
+        
+    def load(self, filename=None):
+        """
+        Load results previously stored by :py:meth:`save` for this
+        Artificial Chemistry.
+        
+        :param filename: Path to read from. Defaults to the filename given when
+                         created.
+        """
+        if filename is None:
+            filename = self.filename
+        stored = pickle.load(open(filename, "rb"))
+        if self.identity() in stored:
+            react, all_reactions = stored[self.identity()]
+            for key, value in react:
+                #older files are keyed by tuples
+                self._put(self._react, OrderedFrozenBag(key), value)
+            for key, value in all_reactions:
+                self._put(self._all_reactions, key, value)
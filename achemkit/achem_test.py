@@ -1,4 +1,12 @@
 import unittest
+import os
+import shutil
+import tempfile
+import random
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 
 import achemkit
 import achemkit.achem
@@ -12,3 +20,92 @@ class TestAChem(unittest.TestCase):
         
     def test(self):
         self.assertEqual(self.achem.react(("A", "B")), OrderedFrozenBag(("B", "C")))
+        
+    def test_react_many(self):
+        products = self.achem.react_many([("A", "B"), ("B", "C"), OrderedFrozenBag(("B", "A"))])
+        self.assertEqual(products, [OrderedFrozenBag(("B", "C")), OrderedFrozenBag(("B", "C")), OrderedFrozenBag(("B", "C"))])
+        
+    def test_pickle(self):
+        achem = pickle.loads(pickle.dumps(self.achem, 2))
+        self.assertEqual(achem.reactionnetwork, self.net)
+        self.assertTrue(achem.rng is random)
+        self.assertEqual(achem.react(("A", "B")), OrderedFrozenBag(("B", "C")))
+        
+    def test_react_many_default(self):
+        products = achemkit.AChem.react_many(self.achem, [("A", "B"), ("B", "C")])
+        self.assertEqual(products, [OrderedFrozenBag(("B", "C")), OrderedFrozenBag(("B", "C"))])
+        
+class TestCachedAChem(unittest.TestCase):
+    def setUp(self):        
+        self.rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])):2.0,
+                      (OrderedFrozenBag(["A", "C"]), OrderedFrozenBag(["D"])):1.0}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.achem = achemkit.CachedAChem(achemkit.AChemReactionNetwork(self.net), maxsize=1)
+        
+    def test_react(self):
+        self.assertTrue(self.achem.deterministic)
+        self.assertEqual(self.achem.react(("A", "B")), OrderedFrozenBag(("B", "C")))
+        self.assertEqual(self.achem.react(("A", "B")), OrderedFrozenBag(("B", "C")))
+        self.assertEqual((self.achem.hits, self.achem.misses, self.achem.evictions), (1, 1, 0))
+        #the same reactants in any order are only reacted once in a batch
+        self.assertEqual(self.achem.react_many([("A", "C"), ("C", "A")]), [OrderedFrozenBag(("D",)), OrderedFrozenBag(("D",))])
+        self.assertEqual((self.achem.hits, self.achem.misses, self.achem.evictions), (2, 2, 1))
+        self.assertEqual(self.achem.react(("C", "A")), OrderedFrozenBag(("D",)))
+        self.assertEqual(self.achem.hits, 3)
+        
+    def test_all_reactions(self):
+        target = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])):2.0}
+        self.assertEqual(self.achem.all_reactions(("A", "B")), target)
+        self.assertEqual(self.achem.all_reactions(("B", "A")), target)
+        self.assertEqual(self.achem.statistics()["hits"], 1)
+        
+    def test_save(self):
+        directory = tempfile.mkdtemp()
+        filename = os.path.join(directory, "cache")
+        try:
+            self.achem.all_reactions(("A", "B"))
+            self.achem.save(filename)
+            other = achemkit.CachedAChem(achemkit.AChemReactionNetwork(self.net), filename=filename)
+            other.all_reactions(("A", "B"))
+            self.assertEqual(other.hits, 1)
+            #a different chemistry should not use the stored results
+            othernet = achemkit.ReactionNetwork({(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["D"])):1.0})
+            other = achemkit.CachedAChem(achemkit.AChemReactionNetwork(othernet), filename=filename)
+            other.all_reactions(("A", "B"))
+            self.assertEqual(other.hits, 0)
+        finally:
+            shutil.rmtree(directory)
+        
+class TestAChemReactionNetworkRates(unittest.TestCase):
+    def setUp(self):        
+        self.reactants = OrderedFrozenBag(["A", "B"])
+        self.rates = {(self.reactants, OrderedFrozenBag(["C"])):0.1,
+                      (self.reactants, OrderedFrozenBag(["D"])):0.3}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.rng = random.Random(42)
+        
+    def count(self, achem, repeats=10000):
+        counts = {}
+        for products in achem.react_many([self.reactants]*repeats, self.rng):
+            counts[products] = counts.get(products, 0) + 1
+        return dict((x, counts[x] / float(repeats)) for x in counts)
+        
+    def test_rates(self):
+        achem = achemkit.AChemReactionNetwork(self.net)
+        self.assertFalse(achem.deterministic)
+        counts = self.count(achem)
+        self.assertAlmostEqual(counts[OrderedFrozenBag(["C"])], 0.25, delta=0.02)
+        self.assertAlmostEqual(counts[OrderedFrozenBag(["D"])], 0.75, delta=0.02)
+        
+    def test_elastic(self):
+        achem = achemkit.AChemReactionNetwork(self.net, elastic=True, rng=self.rng)
+        counts = self.count(achem)
+        self.assertAlmostEqual(counts[OrderedFrozenBag(["C"])], 0.1, delta=0.02)
+        self.assertAlmostEqual(counts[OrderedFrozenBag(["D"])], 0.3, delta=0.02)
+        self.assertAlmostEqual(counts[self.reactants], 0.6, delta=0.02)
+        
+    def test_rng(self):
+        achem = achemkit.AChemReactionNetwork(self.net)
+        first = [achem.react(self.reactants, random.Random(1)) for i in xrange(10)]
+        second = [achem.react(self.reactants, random.Random(1)) for i in xrange(10)]
+        self.assertEqual(first, second)
@@ -1,6 +1,8 @@
 import time
+import operator
 
-import AChemKit
+import achemkit
+from achemkit.sim.executor import SerialExecutor, UmpfExecutor, ThreadExecutor, ProcessExecutor, PoolExecutor
 
 
 def benchmark(func, *args, **kwargs):
@@ -8,11 +10,49 @@ def benchmark(func, *args, **kwargs):
     Runs supplied function with supplied arguments.
     Prints to std out the name of function and time elapsed.
     """
-    starttime = time.clock()
+    starttime = time.time()
     func(*args, **kwargs)
-    endtime = time.clock()
-    print func.__name__, "%7.3fsec"%(endtime-starttim)
+    endtime = time.time()
+    print func.__name__, "%7.3fsec"%(endtime-starttime)
     
+def executor_overhead(executor, items=10000):
+    """
+    Time taken per item for an executor to apply a trivial function, which is
+    the overhead of dispatching an item to it.
+    """
+    starttime = time.time()
+    for result in executor.map(operator.neg, xrange(items)):
+        pass
+    endtime = time.time()
+    return (endtime - starttime) / items
+
+def bench_executors(items=10000):
+    """
+    Prints to std out the per-item dispatch overhead of each executor, for
+    different chunk sizes.
+    """
+    executors = [("serial", SerialExecutor)]
+    try:
+        UmpfExecutor()
+    except ImportError:
+        pass
+    else:
+        executors.append(("umpf", UmpfExecutor))
+    executors.append(("thread", ThreadExecutor))
+    executors.append(("process", ProcessExecutor))
+    executors.append(("pool", PoolExecutor))
+    for name, executorclass in executors:
+        for chunksize in (1, 10, 100):
+            executor = executorclass(chunksize=chunksize)
+            if name == "pool":
+                #warm up the pool so only dispatch is timed
+                executor_overhead(executor, 1)
+            overhead = executor_overhead(executor, items)
+            executor.close()
+            print "%-8s chunksize %4d %9.3fusec/item"%(name, chunksize, overhead*1e6)
+            if name in ("serial", "umpf"):
+                #chunk size makes no difference
+                break
 
 if __name__ == "__main__":
-    pass
+    bench_executors()
@@ -6,12 +6,28 @@ the data within :py:class:`~.Bucket` objects.
 """
 
 import re
+import array
+import itertools
 import collections
 import math
+import StringIO
 
 from achemkit import ReactionNetwork
 from achemkit import OrderedFrozenBag
 
+def event_to_line(time, reactants, products, rateconstant=None, walltime=0):
+    """
+    Produces a single line of a bucket log file, see :ref:`bucket_file_format`,
+    for an event. Unlike :py:meth:`~.ReactionNetwork.reaction_to_string` this
+    also represents elastic reactions.
+    """
+    if rateconstant is None:
+        arrow = "->"
+    else:
+        arrow = "-{0}>".format(rateconstant)
+    return "{0}\t{1}\t{2} {3} {4}\n".format(int(walltime), time, 
+        " + ".join(str(x) for x in reactants), arrow, " + ".join(str(x) for x in products))
+
 class Event(object):
     """
     Mini-class for tracking events (instances of a reaction) within a :py:class:`~.Bucket`.
@@ -54,6 +70,45 @@ class Event(object):
     def __delattr__(self):
         raise TypeError("Cannot change an immutable object")
 
+class EventBatch(object):
+    """
+    Columnar batch of events, as yielded by 
+    :py:meth:`achemkit.Reactor.do_batches`.
+    
+    Rather than an :py:class:`Event` for each, the batch holds an array of 
+    times and an array of reaction ids. ``reactions`` is a list of tuples 
+    of (reactants, products, rate constant) indexed by reaction id, where
+    reactants and products are :py:class:`~.OrderedFrozenBag` objects. It is 
+    shared by all batches from the same call, and grows as new reactions
+    happen, so ids mean the same reaction in every batch.
+    
+    ``times`` and ``ids`` are :py:class:`array.array` objects, which can be 
+    viewed as NumPy arrays without copying with :py:func:`numpy.frombuffer`.
+    
+    Iterating gives tuples of (time, reactants, products, rate constant).
+    """
+    __slots__ = ["times", "ids", "reactions"]
+    
+    def __init__(self, reactions, times=(), ids=()):
+        self.reactions = reactions
+        self.times = array.array("d", times)
+        self.ids = array.array("l", ids)
+        
+    def __len__(self):
+        return len(self.times)
+        
+    def __iter__(self):
+        reactions = self.reactions
+        for time, i in itertools.izip(self.times, self.ids):
+            reactants, products, rateconstant = reactions[i]
+            yield time, reactants, products, rateconstant
+            
+    def events(self):
+        """
+        :rtype: list of :py:class:`Event` objects.
+        """
+        return [Event(*reaction) for reaction in self]
+
 class Bucket(object):
     """
     Event history of a simulation of an Artificial Chemistry.
@@ -68,6 +123,16 @@ class Bucket(object):
         """
         self.events = sorted(events)
 
+    @classmethod
+    def from_batches(cls, batches):
+        """
+        Alternative constructor from batches of events, as yielded by 
+        :py:meth:`achemkit.Reactor.do_batches`. Each batch may be a list of 
+        tuples of (time, reactants, products, rate constant) or an 
+        :py:class:`EventBatch`.
+        """
+        return cls(Event(*reaction) for batch in batches for reaction in batch)
+
     @classmethod
     def from_string(cls, instr):
         """
@@ -1,6 +1,27 @@
 import unittest
 
 import achemkit.bucket
+from achemkit import OrderedFrozenBag
+from achemkit.bucket import Bucket, Event, EventBatch
 
 class TestUniform(unittest.TestCase):
     pass
+
+class TestEventBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.reactions = [(OrderedFrozenBag("AB"), OrderedFrozenBag("C"), None),
+                          (OrderedFrozenBag("C"), OrderedFrozenBag("AB"), 0.5)]
+        self.batch = EventBatch(self.reactions, [1.0, 2.0, 3.0], [0, 1, 0])
+
+    def test_iter(self):
+        self.assertEqual(len(self.batch), 3)
+        self.assertEqual(list(self.batch)[1], (2.0, OrderedFrozenBag("C"), OrderedFrozenBag("AB"), 0.5))
+        self.assertEqual(self.batch.events(), [Event(1.0, "AB", "C"), Event(2.0, "C", "AB", 0.5),
+                                               Event(3.0, "AB", "C")])
+
+    def test_bucket(self):
+        other = [(4.0, "C", "AB", 0.5)]
+        bucket = Bucket.from_batches([self.batch, other])
+        self.assertEqual(len(bucket.events), 4)
+        self.assertEqual(bucket.reactionnet.rate(OrderedFrozenBag("AB"), OrderedFrozenBag("C")), 2)
@@ -11,6 +11,7 @@ import re
 
 from achemkit import ReactionNetwork
 from achemkit.utils.utils import get_sample
+from achemkit.utils.sampler import make_sampler
 from achemkit import OrderedFrozenBag
 
 
@@ -97,23 +98,24 @@ def Uniform(nmols, nreactions, nreactants, nproducts, rates = 1.0, cls = Reactio
         #its a tuple not a generator because its the same variable name
         newnreactants = []
         newnproducts = []
-        for nreactant, nproduct in [get_sample(nreactants, rng) for i in xrange(nreactions)]:
+        for nreactant, nproduct in make_sampler(nreactants).samples(nreactions, rng):
             newnreactants.append(nreactant)
             newnproducts.append(nproduct)
-        nproducts = newnreactants
-        nreactants = newnproducts
+        nreactants = newnreactants
+        nproducts = newnproducts
     else:
         #its a tuple not a generator because its the same variable name
-        nreactants = [get_sample(nreactants, rng) for i in xrange(nreactions)]
-        nproducts = [get_sample(nproducts, rng) for i in xrange(nreactions)]
+        nreactants = make_sampler(nreactants).samples(nreactions, rng)
+        nproducts = make_sampler(nproducts).samples(nreactions, rng)
 
-    rates = [get_sample(rates, rng) for i in xrange(nreactions)]
+    rates = make_sampler(rates).samples(nreactions, rng)
 
+    molsampler = make_sampler(nmols)
     outrates = {}
     for thisnreactants, thisnproducts, thisrate in zip(nreactants, nproducts, rates):
 
-        reactants = [get_sample(nmols, rng)  for j in xrange(thisnreactants)]
-        products = [get_sample(nmols, rng)  for j in xrange(thisnproducts)]
+        reactants = molsampler.samples(thisnreactants, rng)
+        products = molsampler.samples(thisnproducts, rng)
         reactants = OrderedFrozenBag(reactants)
         products = OrderedFrozenBag(products)
 
@@ -170,6 +172,7 @@ def Linear(natoms, maxlength, pform, pbreak, directed = True, rates = 1.0, cls =
     maxlength = get_sample(maxlength, rng)
     pform = get_sample(pform, rng)
     pbreak = get_sample(pbreak, rng)
+    ratesampler = make_sampler(rates)
     assert pform >= 0.0
     assert pform <= 1.0
     assert pbreak >= 0.0
@@ -241,7 +244,7 @@ def Linear(natoms, maxlength, pform, pbreak, directed = True, rates = 1.0, cls =
                     reaction = (OrderedFrozenBag((z,)), OrderedFrozenBag(sorted((a,b))))
 
                     if reaction not in outrates:
-                        outrates[reaction] = get_sample(rates, rng)
+                        outrates[reaction] = ratesampler.sample(rng)
 
                     if a not in molecules and a not in new:
                         new.append(a)
@@ -272,7 +275,7 @@ def Linear(natoms, maxlength, pform, pbreak, directed = True, rates = 1.0, cls =
                         reaction = (reactants, products)
 
                         if reaction not in outrates:
-                            outrates[reaction] = get_sample(rates, rng)
+                            outrates[reaction] = ratesampler.sample(rng)
 
                         if z not in molecules and z not in new:
                             new.append(z)
@@ -87,6 +87,13 @@ class TestUniform(unittest.TestCase):
         net = Uniform(10, 50, {(1,1):1, (2,2):2.0}, None, rng = self.rng)
         self.assertEqual(net.seen, self.mols)
         
+    def test_nprods_none_pairs(self):
+        #pairs are (reactants, products), not the other way round
+        net = Uniform(5, 10, ((2,1),), None, rng = self.rng)
+        self.assertTrue(len(net.reactions) > 0)
+        for reactants, products in net.reactions:
+            self.assertEqual((len(reactants), len(products)), (2, 1))
+        
         
     def test_rate_int(self):
         net = Uniform(10, 50, 2, 2, 2)
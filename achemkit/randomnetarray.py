@@ -0,0 +1,119 @@
+"""
+Generation of large random reaction networks in bulk with NumPy
+(http://numpy.scipy.org/), directly in the array-backed form of
+:py:class:`~achemkit.reactionnetarray.ArrayReactionNetwork`.
+
+:py:func:`UniformArray` follows the same model as
+:py:func:`achemkit.randomnet.Uniform`, but draws the number of reactants and
+products, the species and the rate of every reaction at once as arrays, and
+removes duplicate reactions by sorting rather than with a dictionary. It does
+not draw the same networks as :py:func:`~achemkit.randomnet.Uniform` for the
+same seed.
+"""
+
+import random
+
+import numpy
+
+from achemkit.reactionnetarray import ArrayReactionNetwork
+from achemkit.utils.sampler import make_sampler
+
+def _draw(distribution, count, rng):
+    """
+    Internal function to draw `count` values of a distribution as a NumPy
+    array.
+    """
+    sampler = make_sampler(distribution)
+    values = numpy.empty(len(sampler.values), dtype=object)
+    for i, value in enumerate(sampler.values):
+        values[i] = value
+    return values[sampler.indexes(count, rng)]
+
+def _species_sampler(nmols):
+    """
+    Internal function to prepare to draw molecular species as indexes into
+    the sorted tuple of species that can be drawn.
+
+    :rtype: tuple of (sorted species, sampler, array of the index of each
+            value of the sampler).
+    """
+    sampler = make_sampler(nmols)
+    candidates = tuple(sorted(set(sampler.values)))
+    index = dict((mol, i) for i, mol in enumerate(candidates))
+    valueindexes = numpy.array([index[mol] for mol in sampler.values], dtype=numpy.intp)
+    return candidates, sampler, valueindexes
+
+def _padded_species(sampler, valueindexes, pad, arities, width, rng):
+    """
+    Internal function to draw the species of each reaction as rows of indexes,
+    sorted and padded at the end with `pad`.
+    """
+    count = len(arities) * width
+    indexes = valueindexes[sampler.indexes(count, rng)].reshape((len(arities), width))
+    indexes[numpy.arange(width) >= arities[:, numpy.newaxis]] = pad
+    indexes.sort(axis=1)
+    return indexes
+
+def UniformArray(nmols, nreactions, nreactants, nproducts, rates=1.0, rng=None):
+    """
+    Generates a random :py:class:`~achemkit.reactionnetarray.ArrayReactionNetwork`
+    by assigning reactions randomly between all molecular species.
+
+    Arguments are as for :py:func:`achemkit.randomnet.Uniform`, except:
+
+    rng
+        Instance of :py:class:`numpy.random.RandomState` or seed for one. An
+        instance of :py:class:`random.Random` is used to seed one.
+
+    As for :py:func:`~achemkit.randomnet.Uniform`, reactions where the
+    reactants and products are the same are dropped, and if the same reaction
+    is drawn more than once the last rate drawn is used. Molecular species are
+    numbered in sorted order and reactions in order of their species.
+    """
+    if isinstance(rng, random.Random):
+        rng = rng.getrandbits(32)
+    if not isinstance(rng, numpy.random.RandomState):
+        rng = numpy.random.RandomState(rng)
+
+    if isinstance(nmols, int):
+        nmols = ["M%d" % i for i in xrange(nmols)]
+
+    nreactions = int(_draw(nreactions, 1, rng)[0])
+
+    if nproducts is None:
+        pairs = _draw(nreactants, nreactions, rng)
+        arities = numpy.array(pairs.tolist(), dtype=numpy.intp).reshape((nreactions, 2))
+        nreactants = arities[:, 0]
+        nproducts = arities[:, 1]
+    else:
+        nreactants = _draw(nreactants, nreactions, rng).astype(numpy.intp)
+        nproducts = _draw(nproducts, nreactions, rng).astype(numpy.intp)
+    rates = _draw(rates, nreactions, rng).astype(numpy.float64)
+
+    #the same width for both, so rows can be compared
+    width = max(int(nreactants.max()) if nreactions else 0,
+                int(nproducts.max()) if nreactions else 0, 1)
+    candidates, sampler, valueindexes = _species_sampler(nmols)
+    pad = len(candidates)
+    reactants = _padded_species(sampler, valueindexes, pad, nreactants, width, rng)
+    products = _padded_species(sampler, valueindexes, pad, nproducts, width, rng)
+
+    #drop elastic reactions
+    reactive = (reactants != products).any(axis=1)
+    keys = numpy.concatenate((reactants, products), axis=1)[reactive]
+    rates = rates[reactive]
+
+    #the first of each distinct reaction in reverse is the last drawn
+    keys, first = numpy.unique(keys[::-1], axis=0, return_index=True)
+    rates = rates[::-1][first]
+    reactants = keys[:, :width]
+    products = keys[:, width:]
+
+    #only species that take part are in the network
+    used = numpy.unique(keys)
+    used = used[used != pad]
+    seen = tuple(candidates[i] for i in used.tolist())
+    remap = numpy.empty(pad + 1, dtype=numpy.intp)
+    remap.fill(len(seen))
+    remap[used] = numpy.arange(len(seen))
+    return ArrayReactionNetwork.from_padded(seen, remap[reactants], remap[products], rates)
@@ -0,0 +1,52 @@
+"""
+This is the test harness for :py:mod:`achemkit.randomnetarray`.
+
+"""
+
+import random
+import unittest
+
+from achemkit import Uniform
+
+try:
+    import numpy
+    from achemkit.randomnetarray import UniformArray
+except ImportError:
+    numpy = None
+
+@unittest.skipIf(numpy is None, "requires NumPy")
+class TestUniformArray(unittest.TestCase):
+    
+    def test_arities(self):
+        net = UniformArray(10, 50, 2, 1, rng=42)
+        self.assertTrue(0 < len(net) <= 50)
+        for reactants, products in zip(net.reactants, net.products):
+            self.assertEqual(len(reactants), 2)
+            self.assertEqual(len(products), 1)
+            
+    def test_pairs(self):
+        net = UniformArray(10, 50, ((2, 1),), None, rng=42)
+        for reactants, products in zip(net.reactants, net.products):
+            self.assertEqual((len(reactants), len(products)), (2, 1))
+        
+    def test_network(self):
+        net = UniformArray(["A", "B", "C", "D"], 30, (1, 2), (1, 2), {1.0: 1, 2.0: 1}, rng=42)
+        reactionnet = net.to_reactionnetwork()
+        self.assertEqual(len(reactionnet.reactions), len(net))
+        self.assertEqual(net.seen, reactionnet.seen)
+        self.assertEqual(set(net.rates.tolist()) - set([1.0, 2.0]), set())
+        for reactants, products in zip(net.reactants, net.products):
+            self.assertNotEqual(sorted(reactants), sorted(products))
+            
+    def test_seed(self):
+        first = UniformArray(10, 50, (1, 2), (1, 2), rng=42).to_reactionnetwork()
+        self.assertEqual(UniformArray(10, 50, (1, 2), (1, 2), rng=42).to_reactionnetwork(), first)
+        self.assertEqual(UniformArray(10, 50, (1, 2), (1, 2), rng=random.Random(7)).to_reactionnetwork(),
+                         UniformArray(10, 50, (1, 2), (1, 2), rng=random.Random(7)).to_reactionnetwork())
+        
+    def test_model(self):
+        #with many more draws than possible reactions, both find them all
+        net = UniformArray(5, 1000, 1, 1, rng=42)
+        expected = Uniform(5, 1000, 1, 1, rng=random.Random(42))
+        self.assertEqual(len(net), 20)
+        self.assertEqual(set(net.to_reactionnetwork().reactions), set(expected.reactions))
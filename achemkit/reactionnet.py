@@ -153,6 +153,18 @@ class ReactionNetwork(object):
             self._hash = hash(tuple(sorted(self._rates.keys())))+hash(tuple(sorted(self._rates.values())))
         return self._hash
 
+    def __reduce__(self):
+        """
+        Compact pickled form, where each molecular species is stored once and
+        reactions refer to species by their index in 
+        :py:attr:`~achemkit.reactionnet.ReactionNetwork.seen`. 
+        """
+        seen = self.seen
+        index = dict((mol, i) for i, mol in enumerate(seen))
+        reactions = tuple((tuple(index[x] for x in reactants), tuple(index[x] for x in products), rate)
+                          for (reactants, products), rate in self._rates.iteritems())
+        return (_from_compact, (self.__class__, seen, reactions))
+
     @classmethod
     def from_string(cls, instr):
         """
@@ -237,3 +249,15 @@ class ReactionNetwork(object):
                 raise ValueError, "Invalid reaction at line %d : %s" % (linecount, rawline)
         return cls(rates)
         
+
+def _from_compact(cls, seen, reactions):
+    """
+    Internal function to rebuild a :py:class:`~achemkit.reactionnet.ReactionNetwork`
+    from the compact form of :py:meth:`~achemkit.reactionnet.ReactionNetwork.__reduce__`.
+    """
+    rates = {}
+    for reactants, products, rate in reactions:
+        reactants = OrderedFrozenBag(seen[i] for i in reactants)
+        products = OrderedFrozenBag(seen[i] for i in products)
+        rates[reactants, products] = rate
+    return cls(rates)
@@ -4,6 +4,10 @@ This is the test harness for :py:mod:`achemkit.reactionnet`.
 """
 
 import unittest
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
 
 from achemkit import ReactionNetwork
 from achemkit import OrderedFrozenBag
@@ -56,6 +60,13 @@ class TestReactionNetwork(unittest.TestCase):
         target = """A + B\t-2.0>\tB + C"""
         self.assertEqual(str(self.net), target)
         
+    def test_pickle(self):
+        for protocol in (0, 2):
+            newnet = pickle.loads(pickle.dumps(self.net, protocol))
+            self.assertEqual(newnet, self.net)
+            self.assertEqual(newnet.__class__, self.net.__class__)
+            self.assertEqual(newnet.seen, self.net.seen)
+            
     def test_equal(self):
         """
         As ReactionNetwork has a custom __eq__ function, it is tested
@@ -0,0 +1,288 @@
+"""
+Array-backed form of a :py:class:`~achemkit.reactionnet.ReactionNetwork`, for
+numerical simulation with NumPy (http://numpy.scipy.org/).
+
+Molecular species are numbered in the order of
+:py:attr:`~achemkit.reactionnet.ReactionNetwork.seen` and reactions in the
+order of :py:attr:`~achemkit.reactionnet.ReactionNetwork.reactions`. Reactants
+and stoichiometry are stored as padded index arrays, so propensities and state
+updates can be calculated for many states at once.
+"""
+
+import numpy
+
+from achemkit import ReactionNetwork
+from achemkit import OrderedFrozenBag
+
+def _padded(rows, width, pad):
+    """
+    Internal function to convert a list of lists of (index, value) pairs to
+    a pair of padded 2d arrays.
+    """
+    indexes = numpy.empty((len(rows), width), dtype=numpy.intp)
+    values = numpy.zeros((len(rows), width), dtype=numpy.int64)
+    indexes.fill(pad)
+    for i, row in enumerate(rows):
+        for j, (index, value) in enumerate(row):
+            indexes[i, j] = index
+            values[i, j] = value
+    return indexes, values
+
+def _grouped(indexes, weights, pad):
+    """
+    Internal function to total `weights` over equal indexes in each row of a
+    2d array of indexes, sorted within each row and padded at the end with
+    `pad`. Returns a pair of padded 2d arrays of the distinct indexes with a
+    non-zero total, and their totals, as for :py:func:`_padded`.
+    """
+    n, width = indexes.shape
+    rows = numpy.arange(n)[:, numpy.newaxis]
+    heads = numpy.ones(indexes.shape, dtype=bool)
+    heads[:, 1:] = indexes[:, 1:] != indexes[:, :-1]
+    group = numpy.cumsum(heads, axis=1) - 1
+    totals = numpy.bincount((rows * width + group).ravel(), weights.ravel(), n * width)
+    totals = totals.reshape((n, width)).astype(numpy.int64)
+    groupindexes = numpy.empty((n, width), dtype=numpy.intp)
+    groupindexes.fill(pad)
+    rows = numpy.broadcast_to(rows, indexes.shape)
+    groupindexes[rows[heads], group[heads]] = indexes[heads]
+
+    keep = (totals != 0) & (groupindexes != pad)
+    column = numpy.cumsum(keep, axis=1) - 1
+    outwidth = max(int(keep.sum(axis=1).max()) if n else 0, 1)
+    outindexes = numpy.empty((n, outwidth), dtype=numpy.intp)
+    outindexes.fill(pad)
+    outvalues = numpy.zeros((n, outwidth), dtype=numpy.int64)
+    outindexes[rows[keep], column[keep]] = groupindexes[keep]
+    outvalues[rows[keep], column[keep]] = totals[keep]
+    return outindexes, outvalues
+
+def _unpadded(indexes, pad):
+    """
+    Internal function to convert a 2d array of indexes padded at the end with
+    `pad` to a tuple of tuples of indexes.
+    """
+    lengths = (indexes != pad).sum(axis=1)
+    result = [None] * len(indexes)
+    #rows of the same length are sliced together
+    for length in numpy.unique(lengths).tolist():
+        selected = numpy.flatnonzero(lengths == length)
+        for i, row in zip(selected.tolist(), indexes[selected, :length].tolist()):
+            result[i] = tuple(row)
+    return tuple(result)
+
+
+class ArrayReactionNetwork(object):
+    """
+    A reaction network stored as NumPy arrays.
+
+    Attributes:
+
+    seen
+        Tuple of all molecular species, as for :py:class:`~achemkit.reactionnet.ReactionNetwork`.
+
+    rates
+        Array of the rate of each reaction.
+
+    reactant_species, reactant_counts
+        Arrays of shape (reactions, max. distinct reactant species) of the
+        index and number of each reactant species, padded with index
+        ``len(seen)`` and number 0.
+
+    change_species, change_counts
+        Arrays of shape (reactions, max. distinct changed species) of the
+        index and net change of each species changed by a reaction, padded with
+        index ``len(seen)`` and change 0.
+
+    reactants, products
+        Tuples of tuples of the reactant and product species indexes of each
+        reaction.
+
+    State arrays passed to methods have the number of molecules (or
+    concentration) of each molecular species as their last dimension.
+    """
+    _reactants = None
+    _products = None
+    _rows = None
+
+    def __init__(self, seen, reactants, products, rates):
+        """
+        :param seen: Sequence of molecular species.
+        :param reactants: Sequence of sequences of reactant species indexes,
+                          one per reaction.
+        :param products: Sequence of sequences of product species indexes,
+                         one per reaction.
+        :param rates: Sequence of reaction rates.
+        """
+        self.seen = tuple(seen)
+        self.index = dict((mol, i) for i, mol in enumerate(self.seen))
+        self.rates = numpy.asarray(rates, dtype=numpy.float64)
+        self._reactants = tuple(tuple(x) for x in reactants)
+        self._products = tuple(tuple(x) for x in products)
+        assert len(self.reactants) == len(self.products) == len(self.rates)
+        nspecies = len(self.seen)
+
+        reactantrows = []
+        changerows = []
+        for thisreactants, thisproducts in zip(self.reactants, self.products):
+            counts = {}
+            for i in thisreactants:
+                counts[i] = counts.get(i, 0) + 1
+            reactantrows.append(sorted(counts.items()))
+            change = {}
+            for i in thisreactants:
+                change[i] = change.get(i, 0) - 1
+            for i in thisproducts:
+                change[i] = change.get(i, 0) + 1
+            changerows.append(sorted((i, x) for i, x in change.items() if x != 0))
+
+        width = max([len(x) for x in reactantrows] + [1])
+        self.reactant_species, self.reactant_counts = _padded(reactantrows, width, nspecies)
+        width = max([len(x) for x in changerows] + [1])
+        self.change_species, self.change_counts = _padded(changerows, width, nspecies)
+        self.maxorder = int(self.reactant_counts.max()) if len(self.rates) else 0
+
+    @classmethod
+    def from_reactionnetwork(cls, net):
+        """
+        Alternative constructor from a :py:class:`~achemkit.reactionnet.ReactionNetwork`.
+        """
+        index = dict((mol, i) for i, mol in enumerate(net.seen))
+        reactants = []
+        products = []
+        rates = []
+        for reaction in net.reactions:
+            thisreactants, thisproducts = reaction
+            reactants.append([index[x] for x in thisreactants])
+            products.append([index[x] for x in thisproducts])
+            rates.append(net.rate(*reaction))
+        return cls(net.seen, reactants, products, rates)
+
+    @classmethod
+    def from_padded(cls, seen, reactants, products, rates):
+        """
+        Alternative constructor from 2d arrays of the reactant and product
+        species indexes of each reaction, each row sorted and padded at the
+        end with ``len(seen)``. The arrays are built without looping over
+        reactions, so this is much faster than the usual constructor for large
+        networks, e.g. from :py:func:`achemkit.randomnetarray.UniformArray`.
+        """
+        net = cls.__new__(cls)
+        pad = len(seen)
+        reactants = numpy.asarray(reactants, dtype=numpy.intp)
+        products = numpy.asarray(products, dtype=numpy.intp)
+        net.seen = tuple(seen)
+        net.index = dict((mol, i) for i, mol in enumerate(net.seen))
+        net.rates = numpy.asarray(rates, dtype=numpy.float64)
+        #converted to tuples only when needed, which is slow for many reactions
+        net._rows = (reactants, products)
+        assert len(reactants) == len(products) == len(net.rates)
+
+        weights = (reactants != pad).astype(numpy.int64)
+        net.reactant_species, net.reactant_counts = _grouped(reactants, weights, pad)
+        #net change is the products minus the reactants of each species
+        both = numpy.concatenate((reactants, products), axis=1)
+        weights = numpy.concatenate((-weights, (products != pad).astype(numpy.int64)), axis=1)
+        order = numpy.argsort(both, axis=1, kind="mergesort")
+        rows = numpy.arange(len(both))[:, numpy.newaxis]
+        net.change_species, net.change_counts = _grouped(both[rows, order], weights[rows, order], pad)
+        net.maxorder = int(net.reactant_counts.max()) if len(net.rates) else 0
+        return net
+
+    @property
+    def reactants(self):
+        if self._reactants is None:
+            self._reactants = _unpadded(self._rows[0], len(self.seen))
+        return self._reactants
+
+    @property
+    def products(self):
+        if self._products is None:
+            self._products = _unpadded(self._rows[1], len(self.seen))
+        return self._products
+
+    def to_reactionnetwork(self, cls=ReactionNetwork):
+        """
+        Convert to a :py:class:`~achemkit.reactionnet.ReactionNetwork` or
+        the provided subclass.
+        """
+        rates = {}
+        for thisreactants, thisproducts, rate in zip(self.reactants, self.products, self.rates):
+            reactants = OrderedFrozenBag(self.seen[i] for i in thisreactants)
+            products = OrderedFrozenBag(self.seen[i] for i in thisproducts)
+            rates[reactants, products] = float(rate)
+        return cls(rates)
+
+    def __len__(self):
+        return len(self.rates)
+
+    def counts(self, mols):
+        """
+        Convert an itterable of molecules to an array of counts of each species.
+        """
+        counts = numpy.zeros(len(self.seen), dtype=numpy.int64)
+        for mol in mols:
+            counts[self.index[mol]] += 1
+        return counts
+
+    def _padded_state(self, state):
+        """
+        Internal function to append a padding column of ones to a state.
+        """
+        state = numpy.asarray(state)
+        pad = numpy.ones(state.shape[:-1] + (1,), dtype=state.dtype)
+        return numpy.concatenate((state, pad), axis=-1)
+
+    def propensities(self, counts):
+        """
+        Stochastic propensity of every reaction, being the rate multiplied by
+        the number of distinct ways to choose its reactants from `counts`.
+
+        :param counts: Array of molecule counts of shape (..., species).
+        :rtype: Array of shape (..., reactions).
+        """
+        n = self._padded_state(counts)[..., self.reactant_species].astype(numpy.float64)
+        ways = numpy.ones(n.shape, dtype=numpy.float64)
+        factorial = numpy.ones(self.reactant_counts.shape, dtype=numpy.float64)
+        for j in xrange(self.maxorder):
+            active = self.reactant_counts > j
+            ways *= numpy.where(active, numpy.maximum(n - j, 0.0), 1.0)
+            factorial *= numpy.where(active, j + 1.0, 1.0)
+        return self.rates * (ways / factorial).prod(axis=-1)
+
+    def rate_law(self, concentrations):
+        """
+        Deterministic mass-action rate of every reaction, being the rate
+        multiplied by the product of the concentration of each reactant to the
+        power of its multiplicity divided by the factorial of its
+        multiplicity. This is the limit of :py:meth:`propensities` for large
+        numbers of molecules.
+
+        :param concentrations: Array of concentrations of shape (..., species).
+        :rtype: Array of shape (..., reactions).
+        """
+        c = self._padded_state(concentrations)[..., self.reactant_species]
+        terms = numpy.ones(c.shape, dtype=numpy.float64)
+        factorial = numpy.ones(self.reactant_counts.shape, dtype=numpy.float64)
+        for j in xrange(self.maxorder):
+            active = self.reactant_counts > j
+            terms *= numpy.where(active, c, 1.0)
+            factorial *= numpy.where(active, j + 1.0, 1.0)
+        return self.rates * (terms / factorial).prod(axis=-1)
+
+    def apply(self, counts, reactions, rows=None):
+        """
+        Apply reactions to counts in place.
+
+        :param counts: Array of molecule counts of shape (states, species).
+        :param reactions: Array of the index of the reaction to apply to each
+                          row of `counts`.
+        :param rows: Array of the rows of `counts` to apply `reactions` to, if
+                     not every row.
+        """
+        if rows is None:
+            rows = numpy.arange(len(reactions))
+        species = self.change_species[reactions]
+        keep = species < len(self.seen)
+        rows = numpy.broadcast_to(rows[:, numpy.newaxis], species.shape)
+        numpy.add.at(counts, (rows[keep], species[keep]), self.change_counts[reactions][keep])
@@ -0,0 +1,64 @@
+"""
+This is the test harness for :py:mod:`achemkit.reactionnetarray`.
+
+"""
+
+import unittest
+
+from achemkit import ReactionNetwork
+from achemkit import OrderedFrozenBag
+
+try:
+    import numpy
+    from achemkit.reactionnetarray import ArrayReactionNetwork
+except ImportError:
+    numpy = None
+
+@unittest.skipIf(numpy is None, "requires NumPy")
+class TestArrayReactionNetwork(unittest.TestCase):
+    
+    def setUp(self): 
+        self.rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])):2.0,
+                      (OrderedFrozenBag(["A", "A"]), OrderedFrozenBag(["D"])):0.5,
+                      (OrderedFrozenBag([]), OrderedFrozenBag(["A"])):3.0}
+        self.net = ReactionNetwork(self.rates)
+        self.arraynet = ArrayReactionNetwork.from_reactionnetwork(self.net)
+        
+    def test_roundtrip(self):
+        self.assertEqual(self.arraynet.seen, self.net.seen)
+        self.assertEqual(self.arraynet.to_reactionnetwork(), self.net)
+        
+    def test_propensities(self):
+        counts = self.arraynet.counts(("A", "A", "A", "B", "B"))
+        propensities = self.arraynet.propensities(numpy.array([counts, counts * 0]))
+        expected = dict(zip(self.net.reactions, propensities[0]))
+        self.assertEqual(expected[OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])], 2.0 * 3 * 2)
+        self.assertEqual(expected[OrderedFrozenBag(["A", "A"]), OrderedFrozenBag(["D"])], 0.5 * 3)
+        self.assertEqual(expected[OrderedFrozenBag([]), OrderedFrozenBag(["A"])], 3.0)
+        self.assertEqual(list(propensities[1]), [3.0, 0.0, 0.0])
+        
+    def test_rate_law(self):
+        rates = dict(zip(self.net.reactions, self.arraynet.rate_law(numpy.array([2.0, 0.5, 0.0, 0.0]))))
+        self.assertAlmostEqual(rates[OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])], 2.0 * 2.0 * 0.5)
+        self.assertAlmostEqual(rates[OrderedFrozenBag(["A", "A"]), OrderedFrozenBag(["D"])], 0.5 * 2.0 * 2.0 / 2.0)
+        
+    def test_apply(self):
+        counts = numpy.array([self.arraynet.counts(("A", "B")), self.arraynet.counts(("A", "A"))])
+        reactions = [self.net.reactions.index((OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"]))),
+                     self.net.reactions.index((OrderedFrozenBag(["A", "A"]), OrderedFrozenBag(["D"])))]
+        self.arraynet.apply(counts, numpy.array(reactions))
+        self.assertEqual(counts.tolist(), [[0, 1, 1, 0], [0, 0, 0, 1]])
+        
+    def test_padded(self):
+        #same arrays as the usual constructor
+        pad = len(self.arraynet.seen)
+        def padded(rows):
+            return [sorted(row) + [pad] * (2 - len(row)) for row in rows]
+        net = ArrayReactionNetwork.from_padded(self.arraynet.seen, padded(self.arraynet.reactants),
+                                               padded(self.arraynet.products), self.arraynet.rates)
+        self.assertEqual(net.reactants, self.arraynet.reactants)
+        self.assertEqual(net.products, self.arraynet.products)
+        for name in ("reactant_species", "reactant_counts", "change_species", "change_counts"):
+            self.assertEqual(getattr(net, name).tolist(), getattr(self.arraynet, name).tolist())
+        self.assertEqual(net.maxorder, self.arraynet.maxorder)
+        self.assertEqual(net.to_reactionnetwork(), self.net)
@@ -0,0 +1,219 @@
+"""
+Checkpoints of the state of a :py:class:`achemkit.Reactor`, so that a long
+simulation can be resumed after an interruption.
+
+Rather than pickling the whole reactor, including its
+:py:class:`~achemkit.achem.AChem`, a checkpoint only stores the compact state
+returned by :py:meth:`achemkit.Reactor.get_state`: the molecular species and
+the number of each, the state of the random number generator, the time, and
+for :py:class:`achemkit.ReactorEnumerate` the collections of reactants still to
+be tested. A reactor created with the same AChem and given that state by
+:py:meth:`achemkit.Reactor.resume` continues exactly as the original would
+have, producing the same events. AChems that choose between products at
+random, such as :py:class:`achemkit.achem.AChemReactionNetwork`, draw from the
+reactor's generator, so their choices are resumed exactly too.
+
+A :py:class:`Checkpointer` attached to a reactor writes checkpoints while
+:py:meth:`achemkit.Reactor.do` runs, every so many events or seconds. Every
+`fullevery` checkpoints it writes a full state atomically to a file, and in
+between it appends only what has changed since the previous checkpoint to a
+second file with the same name plus ".delta". Each delta is checksummed, so a
+delta that was only partly written when the process was interrupted is
+ignored.
+
+For example::
+
+    reactor = achemkit.ReactorItterative(achem, mols, 42)
+    reactor.checkpointer = Checkpointer("run.checkpoint", events=10000)
+    for event in reactor.do(1000000):
+        ...
+
+and after an interruption::
+
+    reactor = achemkit.ReactorItterative(achem, [])
+    reactor.resume("run.checkpoint")
+    for event in reactor.do(0):
+        ...
+"""
+
+import os
+import time
+import struct
+import hashlib
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle as pickle
+
+from achemkit.utils import diskset
+
+_HEADER = struct.Struct("<Q16s")
+
+def diff_state(old, new):
+    """
+    Describe the changes between two states, as returned by
+    :py:meth:`achemkit.Reactor.get_state`.
+
+    Lists and sets that have changed in only a few places are described by
+    those changes, other values that have changed are included whole.
+
+    :rtype: dictionary to give to :py:func:`apply_delta`.
+    """
+    delta = {}
+    for key, value in new.iteritems():
+        if key not in old:
+            delta[key] = ("value", value)
+            continue
+        previous = old[key]
+        if isinstance(value, list) and isinstance(previous, list):
+            changes = {}
+            for i, item in enumerate(value):
+                if i >= len(previous) or previous[i] != item:
+                    changes[i] = item
+            if len(changes) < len(value) // 2:
+                if changes or len(value) != len(previous):
+                    delta[key] = ("list", len(value), changes)
+                continue
+        elif isinstance(value, (set, frozenset)) and isinstance(previous, (set, frozenset)):
+            added = value - previous
+            removed = previous - value
+            if len(added) + len(removed) < len(value) // 2:
+                if added or removed:
+                    delta[key] = ("set", added, removed)
+                continue
+        if previous != value:
+            delta[key] = ("value", value)
+    for key in old:
+        if key not in new:
+            delta[key] = ("delete",)
+    return delta
+
+def apply_delta(state, delta):
+    """
+    Apply changes described by :py:func:`diff_state` to a state in place.
+    """
+    for key, change in delta.iteritems():
+        kind = change[0]
+        if kind == "value":
+            state[key] = change[1]
+        elif kind == "list":
+            length, changes = change[1:]
+            value = state[key]
+            del value[length:]
+            value.extend([None] * (length - len(value)))
+            for i, item in changes.iteritems():
+                value[i] = item
+        elif kind == "set":
+            added, removed = change[1:]
+            state[key] = (state[key] - removed) | added
+        elif kind == "delete":
+            del state[key]
+        else:
+            raise ValueError("unknown change ("+repr(kind)+")")
+    return state
+
+def read_checkpoint(filename):
+    """
+    Read the latest checkpoint written by a :py:class:`Checkpointer`.
+
+    :param filename: Name of the checkpoint file.
+    :rtype: tuple of (name of reactor class, state), or None if there is no
+            checkpoint.
+    """
+    record = diskset.read_state(filename)
+    if record is None:
+        return None
+    state = record["state"]
+    deltaname = filename + ".delta"
+    if os.path.exists(deltaname):
+        infile = open(deltaname, "rb")
+        while True:
+            header = infile.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                break
+            length, digest = _HEADER.unpack(header)
+            data = infile.read(length)
+            if len(data) < length or hashlib.md5(data).digest() != digest:
+                #partly written when interrupted
+                break
+            serial, delta = pickle.loads(data)
+            if serial != record["serial"]:
+                #left over from before the full checkpoint was written
+                break
+            apply_delta(state, delta)
+        infile.close()
+    return record["class"], state
+
+
+class Checkpointer(object):
+    """
+    Writes checkpoints of a reactor as it runs.
+
+    Assign to the ``checkpointer`` attribute of a :py:class:`achemkit.Reactor`,
+    which calls :py:meth:`tick` before each event (or each step, for stepwise
+    reactors) at a point where its state is consistent.
+
+    ``written`` is the number of checkpoints written, full or delta.
+    """
+
+    def __init__(self, filename, events=None, seconds=None, fullevery=10):
+        """
+        :param filename: Name of the file to write to.
+        :param events: Write a checkpoint after this many calls to
+                       :py:meth:`tick`.
+        :param seconds: Write a checkpoint after this many seconds of wall
+                        clock time.
+        :param fullevery: Number of checkpoints between full checkpoints.
+                          The others are deltas. If 1, every checkpoint is
+                          full.
+        """
+        self.filename = filename
+        self.deltaname = filename + ".delta"
+        self.events = events
+        self.seconds = seconds
+        self.fullevery = fullevery
+        self.written = 0
+        self._count = 0
+        self._last = time.time()
+        self._serial = 0
+        self._deltas = 0
+        self._previous = None
+        existing = diskset.read_state(filename)
+        if existing is not None:
+            #continue numbering so left over deltas are not applied
+            self._serial = existing["serial"]
+
+    def tick(self, reactor):
+        """
+        Count an event, and checkpoint `reactor` if one is due.
+        """
+        self._count += 1
+        if self.events is not None and self._count >= self.events:
+            self.save(reactor)
+        elif self.seconds is not None and time.time() - self._last >= self.seconds:
+            self.save(reactor)
+
+    def save(self, reactor):
+        """
+        Checkpoint `reactor` now.
+        """
+        state = reactor.get_state()
+        if self._previous is None or self._deltas + 1 >= self.fullevery:
+            self._serial += 1
+            record = {"serial": self._serial, "class": reactor.__class__.__name__, "state": state}
+            diskset.write_state(self.filename, record)
+            open(self.deltaname, "wb").close()
+            self._deltas = 0
+        else:
+            data = pickle.dumps((self._serial, diff_state(self._previous, state)), 2)
+            outfile = open(self.deltaname, "ab")
+            outfile.write(_HEADER.pack(len(data), hashlib.md5(data).digest()))
+            outfile.write(data)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+            outfile.close()
+            self._deltas += 1
+        self._previous = state
+        self._count = 0
+        self._last = time.time()
+        self.written += 1
@@ -0,0 +1,154 @@
+"""
+This is the test harness for :py:mod:`achemkit.sim.checkpoint`.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import achemkit
+from achemkit import OrderedFrozenBag
+from achemkit.sim.checkpoint import Checkpointer, read_checkpoint, diff_state, apply_delta
+
+
+class TestDelta(unittest.TestCase):
+
+    def test_roundtrip(self):
+        old = {"counts": [1, 2, 3, 4, 5, 6], "species": ["A", "B"], "tested": set(range(10)),
+               "time": 1.0, "gone": True}
+        new = {"counts": [1, 2, 0, 4, 5, 6, 7], "species": ["A", "B"], "tested": set(range(1, 11)),
+               "time": 2.0}
+        delta = diff_state(old, new)
+        #only the changed items of lists and sets are included
+        self.assertEqual(delta["counts"], ("list", 7, {2: 0, 6: 7}))
+        self.assertEqual(delta["tested"], ("set", set([10]), set([0])))
+        self.assertFalse("species" in delta)
+        self.assertEqual(delta["gone"], ("delete",))
+        self.assertEqual(apply_delta(old, delta), new)
+
+    def test_shrink(self):
+        old = {"ids": range(10)}
+        new = {"ids": range(8)}
+        self.assertEqual(apply_delta(old, diff_state(old, new)), new)
+
+
+class TestResume(unittest.TestCase):
+    """
+    Interrupt a run part way through, resume it from the checkpoint, and
+    compare against an uninterrupted run with the same seed.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "checkpoint")
+        self.rates = {}
+        for reactants, products in ((("A", "B"), ("B", "C")),
+                                    (("B", "C"), ("A", "D")),
+                                    (("A", "D"), ("A", "A")),
+                                    (("C", "C"), ("B",)),
+                                    (("B",), ("C", "C"))):
+            self.rates[OrderedFrozenBag(reactants), OrderedFrozenBag(products)] = 1.0
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.achem = achemkit.AChemReactionNetwork(self.net)
+        self.mols = ["A"] * 20 + ["B"] * 10 + ["C"] * 5
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def check_resume(self, make, time, events=5, fullevery=3, stop=40):
+        expected = list(make().do(time))
+        self.assertTrue(len(expected) > stop)
+
+        reactor = make()
+        reactor.checkpointer = Checkpointer(self.filename, events=events, fullevery=fullevery)
+        generator = reactor.do(time)
+        for i in xrange(stop):
+            generator.next()
+        #interrupted without finishing
+        del generator
+        self.assertTrue(reactor.checkpointer.written > fullevery)
+
+        resumed = make()
+        resumed.resume(self.filename)
+        rest = list(resumed.do(0))
+        self.assertTrue(0 < len(rest) < len(expected))
+        self.assertEqual([(e.time, e.reactants, e.products) for e in rest],
+                         [(e.time, e.reactants, e.products) for e in expected[-len(rest):]])
+        return resumed
+
+    def test_itterative(self):
+        self.check_resume(lambda: achemkit.ReactorItterative(self.achem, self.mols, 42), 500)
+
+    def test_itterative_skipelastic(self):
+        self.check_resume(lambda: achemkit.ReactorItterative(self.achem, self.mols, 42, skipelastic=True), 500)
+
+    def test_gillespie(self):
+        self.check_resume(lambda: achemkit.ReactorGillespieLike(self.achem, self.mols, 42), 500)
+
+    def test_stepwise(self):
+        self.check_resume(lambda: achemkit.ReactorStepwise(self.achem, self.mols, 42), 20, events=1, stop=100)
+
+    def test_divergent(self):
+        #the same reactants have competing products
+        rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["A", "C"])): 1.0,
+                 (OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])): 1.0,
+                 (OrderedFrozenBag(["A", "C"]), OrderedFrozenBag(["A", "B"])): 1.0,
+                 (OrderedFrozenBag(["A", "C"]), OrderedFrozenBag(["C", "C"])): 1.0}
+        achem = achemkit.AChemReactionNetwork(achemkit.ReactionNetwork(rates))
+        mols = ["A"] * 20 + ["B"] * 20
+        self.check_resume(lambda: achemkit.ReactorItterative(achem, mols, 42), 500)
+        self.check_resume(lambda: achemkit.ReactorGillespieLike(achem, mols, 42), 500)
+        self.check_resume(lambda: achemkit.ReactorStepwise(achem, mols, 42), 20, events=1, stop=100)
+
+    def test_enumerate(self):
+        mols = ["A", "B"]
+        make = lambda: achemkit.ReactorEnumerate(self.achem, mols, chunksize=1)
+        resumed = self.check_resume(make, 10, events=1, fullevery=2, stop=3)
+        reference = make()
+        list(reference.do(10))
+        self.assertEqual(resumed.statistics(), reference.statistics())
+
+    def test_wrong_class(self):
+        reactor = achemkit.ReactorItterative(self.achem, self.mols, 42)
+        Checkpointer(self.filename).save(reactor)
+        other = achemkit.ReactorGillespieLike(self.achem, self.mols, 42)
+        self.assertRaises(ValueError, other.resume, self.filename)
+
+    def test_torn_delta(self):
+        reactor = achemkit.ReactorItterative(self.achem, self.mols, 42)
+        checkpointer = Checkpointer(self.filename)
+        checkpointer.save(reactor)
+        list(reactor.do(10))
+        checkpointer.save(reactor)
+        saved = reactor.get_state()
+        list(reactor.do(10))
+        checkpointer.save(reactor)
+        #interrupted while writing the last delta
+        deltaname = self.filename + ".delta"
+        size = os.path.getsize(deltaname)
+        outfile = open(deltaname, "r+b")
+        outfile.truncate(size - 10)
+        outfile.close()
+        self.assertEqual(read_checkpoint(self.filename), ("ReactorItterative", saved))
+
+    def test_stale_delta(self):
+        reactor = achemkit.ReactorItterative(self.achem, self.mols, 42)
+        checkpointer = Checkpointer(self.filename, fullevery=2)
+        checkpointer.save(reactor)
+        list(reactor.do(10))
+        checkpointer.save(reactor)
+        stale = open(self.filename + ".delta", "rb").read()
+        list(reactor.do(10))
+        checkpointer.save(reactor)
+        saved = reactor.get_state()
+        #interrupted after the full checkpoint but before deltas were cleared
+        open(self.filename + ".delta", "wb").write(stale)
+        self.assertEqual(read_checkpoint(self.filename), ("ReactorItterative", saved))
+
+    def test_to_disk_gz(self):
+        reactor = achemkit.ReactorItterative(self.achem, self.mols, 42)
+        reactor.to_disk_gz(self.filename)
+        loaded = achemkit.Reactor.from_disk_gz(self.filename)
+        self.assertEqual(loaded.get_state(), reactor.get_state())
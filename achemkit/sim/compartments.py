@@ -0,0 +1,251 @@
+"""
+Simulation of spatially separated compartments, each a well-mixed
+:py:class:`achemkit.Reactor`, with molecules migrating between them.
+
+Compartments are simulated independently between synchronization barriers,
+every `barrier` units of time, so they can run in parallel on an
+:py:class:`~achemkit.sim.executor.Executor`. At each barrier molecules migrate
+in a batch. A molecule in compartment i moves to compartment j with rate
+``diffusion[i, j]`` per unit time, so over a barrier interval it leaves with
+probability one minus the exponential of minus the total rate out of i times
+the interval.
+
+Reactors are not kept in the worker processes. Instead the compact state of
+each (see :py:meth:`achemkit.Reactor.get_state`) is sent with each task and
+returned with the results, so any worker can simulate any compartment and the
+state in this process is always complete, e.g. for checkpoints. Each worker
+keeps a reactor for each compartment it has seen to restore states into, with
+the setup shared by the executor, so they are released with it when the
+executor or the :py:class:`Compartments` is closed.
+
+The reactor class must support :py:meth:`~achemkit.Reactor.get_state`,
+:py:meth:`~achemkit.Reactor.add_mols` and
+:py:meth:`~achemkit.Reactor.take_mols`, as
+:py:class:`achemkit.ReactorItterative`, :py:class:`achemkit.ReactorStepwise`
+and :py:class:`achemkit.ReactorGillespieLike` do.
+"""
+
+import math
+import heapq
+import itertools
+
+from achemkit import Event
+from achemkit.utils.utils import get_sample
+from achemkit.utils.rng import new_seed, stream
+from achemkit.sim.executor import get_executor, resolve
+from achemkit.sim.sink import Sink
+
+class _ListSink(Sink):
+    """
+    Internal sink that collects reactions as tuples.
+    """
+
+    def __init__(self):
+        self.reactions = []
+        self.event = lambda *reaction: self.reactions.append(reaction)
+
+
+def _binomial(n, p, rng):
+    """
+    Internal function for the number of successes in `n` trials of
+    probability `p`, by skipping geometrically distributed runs of failures
+    so the cost depends on the number of successes rather than `n`.
+    """
+    if p <= 0.0 or n <= 0:
+        return 0
+    if p >= 1.0:
+        return n
+    logq = math.log(1.0 - p)
+    count = 0
+    position = 0
+    while True:
+        position += int(math.log(1.0 - rng.random()) / logq) + 1
+        if position > n:
+            return count
+        count += 1
+
+def _run_compartment(setup, index, state, incoming, barrier, seed, rounds, events):
+    """
+    Internal function run by a worker to simulate a compartment up to the next
+    barrier.
+
+    :rtype: tuple of (compartment, new state, dictionary of destination
+            compartment to tuple of migrating molecules, list of reactions as
+            tuples of (time, reactants, products, rate constant)).
+    """
+    reactorclass, achem, reactorargs, outflows, reactors = resolve(setup)
+    if index not in reactors:
+        reactors[index] = reactorclass(achem, (), **reactorargs)
+    reactor = reactors[index]
+    reactor.set_state(state)
+    reactor.add_mols(incoming)
+
+    sink = _ListSink()
+    if events:
+        reactor.run(barrier, sink)
+    else:
+        for reaction in reactor._reactions(barrier):
+            pass
+
+    migrants = {}
+    destinations = outflows[index]
+    if destinations:
+        rng = stream(seed, index, "migration", rounds)
+        total = sum(destinations.values())
+        count = _binomial(reactor.population_size(), 1.0 - math.exp(-total * barrier), rng)
+        for mol in reactor.take_mols(count, rng):
+            destination = get_sample(destinations, rng)
+            migrants.setdefault(destination, []).append(mol)
+    return index, reactor.get_state(), migrants, sink.reactions
+
+
+class Compartments(object):
+    """
+    Many compartments, each simulated by its own reactor, with molecules
+    migrating between them at synchronization barriers.
+
+    ``states`` holds the state of each compartment's reactor, ``time`` the
+    time of the last barrier, and ``rounds`` the number of barriers passed.
+    """
+
+    def __init__(self, reactorclass, achem, compartments, diffusion, rngseed=None, barrier=1.0,
+                 executor=None, events=True, **reactorargs):
+        """
+        :param reactorclass: Subclass of :py:class:`achemkit.Reactor` for each
+                             compartment.
+        :param achem: :py:class:`achemkit.achem.AChem` object or equivalent,
+                      shared by all compartments.
+        :param compartments: Sequence of the initial molecules of each
+                             compartment.
+        :param diffusion: Dictionary of (source, destination) compartment
+                          numbers to rate of migration per molecule, or a
+                          single rate between every pair of compartments.
+        :param rngseed: Seed for the compartments. Each derives its own
+                        streams from it, see :py:mod:`achemkit.utils.rng`.
+        :param barrier: Simulated time between migrations.
+        :param executor: :py:class:`achemkit.sim.executor.Executor` to
+                         simulate compartments with. Defaults to serial.
+        :param events: If False, reactions are not sent back from the
+                       compartments and :py:meth:`do` yields nothing.
+        :param reactorargs: Additional keyword arguments for `reactorclass`.
+        """
+        self.reactorclass = reactorclass
+        self.achem = achem
+        self.executor = get_executor(executor)
+        self.barrier = barrier
+        self.events = events
+        self.reactorargs = reactorargs
+        if rngseed is None:
+            rngseed = new_seed()
+        self.seed = rngseed
+
+        count = len(compartments)
+        if not isinstance(diffusion, dict):
+            diffusion = dict(((i, j), diffusion) for i in xrange(count) for j in xrange(count) if i != j)
+        self.outflows = [{} for i in xrange(count)]
+        for (source, destination), rate in diffusion.iteritems():
+            if rate > 0.0 and source != destination:
+                self.outflows[source][destination] = rate
+
+        self.states = []
+        for i, mols in enumerate(compartments):
+            reactor = reactorclass(achem, mols, rngseed=stream(self.seed, i),
+                                   **reactorargs)
+            self.states.append(reactor.get_state())
+        self.incoming = [[] for i in xrange(count)]
+        self.time = 0.0
+        self.maxtime = 0.0
+        self.rounds = 0
+        self._setup = None
+
+    def __len__(self):
+        return len(self.states)
+
+    def reactor(self, index):
+        """
+        A new reactor in the current state of compartment `index`, including
+        molecules that are migrating to it.
+        """
+        reactor = self.reactorclass(self.achem, (), **self.reactorargs)
+        reactor.set_state(self.states[index])
+        reactor.add_mols(self.incoming[index])
+        return reactor
+
+    def populations(self):
+        """
+        Current number of molecules of each molecular species in each
+        compartment.
+
+        :rtype: list of dictionaries of molecular species to number.
+        """
+        populations = []
+        for i in xrange(len(self)):
+            counts = {}
+            for mol in self.reactor(i).mols:
+                counts[mol] = counts.get(mol, 0) + 1
+            populations.append(counts)
+        return populations
+
+    def step(self):
+        """
+        Simulate every compartment up to the next barrier, then migrate.
+
+        :rtype: list of tuples of (compartment, reactions), where reactions
+                is a list of tuples of (time, reactants, products, rate
+                constant) in the order they happened.
+        """
+        if self._setup is None:
+            #the last item is the reactors of each worker, by compartment
+            self._setup = self.executor.share((self.reactorclass, self.achem, self.reactorargs, self.outflows, {}))
+        count = len(self)
+        results = self.executor.map(_run_compartment, itertools.repeat(self._setup), xrange(count),
+                                    self.states, self.incoming, itertools.repeat(self.barrier),
+                                    itertools.repeat(self.seed), itertools.repeat(self.rounds),
+                                    itertools.repeat(self.events))
+        incoming = [[] for i in xrange(count)]
+        reactions = [None] * count
+        #results may arrive in any order, so migrants are combined in order
+        results = sorted(results, key=lambda result: result[0])
+        for index, state, migrants, thesereactions in results:
+            self.states[index] = state
+            reactions[index] = thesereactions
+        for index, state, migrants, thesereactions in results:
+            for destination in sorted(migrants):
+                incoming[destination].extend(migrants[destination])
+        self.incoming = incoming
+        self.rounds += 1
+        self.time += self.barrier
+        return list(enumerate(reactions))
+
+    def do(self, time):
+        """
+        Simulate all compartments for `time` more time, in steps of
+        `barrier`.
+
+        :param float time: Time to simulate.
+        :rtype: yields tuples of (compartment, :py:class:`achemkit.Event`), in
+                order of time within each barrier interval.
+        """
+        self.maxtime += time
+        while self.time < self.maxtime:
+            streams = []
+            for index, reactions in self.step():
+                streams.append([(reaction[0], index, i, reaction) for i, reaction in enumerate(reactions)])
+            for reactiontime, index, i, reaction in heapq.merge(*streams):
+                yield index, Event(*reaction)
+
+    def close(self):
+        """
+        Release the setup shared with the executor, and the reactors that
+        workers in this process keep with it.
+        """
+        if self._setup is not None:
+            self.executor.unshare(self._setup)
+            self._setup = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
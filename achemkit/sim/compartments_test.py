@@ -0,0 +1,84 @@
+"""
+This is the test harness for :py:mod:`achemkit.sim.compartments`.
+"""
+
+import random
+import unittest
+
+import achemkit
+from achemkit import OrderedFrozenBag
+from achemkit.sim.compartments import Compartments, _binomial
+from achemkit.sim.executor import PoolExecutor, ThreadExecutor
+
+class TestCompartments(unittest.TestCase):
+
+    def setUp(self):
+        self.rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])): 0.1}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.achem = achemkit.AChemReactionNetwork(self.net)
+        self.compartments = [["A"] * 20 + ["B"] * 5, ["B"] * 5, []]
+
+    def test_binomial(self):
+        rng = random.Random(42)
+        self.assertEqual(_binomial(100, 0.0, rng), 0)
+        self.assertEqual(_binomial(100, 1.0, rng), 100)
+        mean = sum(_binomial(100, 0.25, rng) for i in xrange(1000)) / 1000.0
+        self.assertTrue(23 < mean < 27)
+
+    def test_conserved(self):
+        compartments = Compartments(achemkit.ReactorItterative, self.achem, self.compartments, 0.2, 42)
+        events = list(compartments.do(10))
+        self.assertTrue(events)
+        self.assertEqual(compartments.rounds, 10)
+        #reactions conserve B, and migration conserves molecules
+        populations = compartments.populations()
+        self.assertEqual(sum(population.get("B", 0) for population in populations), 10)
+        self.assertEqual(sum(sum(population.values()) for population in populations), 30)
+        #molecules reached the empty compartment
+        self.assertTrue(populations[2])
+
+    def test_tagged(self):
+        compartments = Compartments(achemkit.ReactorItterative, self.achem, self.compartments, {}, 42)
+        events = list(compartments.do(5))
+        #without migration, only the first compartment has reactive collisions
+        self.assertTrue(events)
+        reactive = set(index for index, event in events if event.reactants != event.products)
+        self.assertEqual(reactive, set([0]))
+        self.assertTrue(2 not in set(index for index, event in events))
+        times = [event.time for index, event in events]
+        self.assertEqual(times, sorted(times))
+        self.assertEqual(compartments.populations()[1], {"B": 5})
+
+    def test_directed(self):
+        diffusion = {(0, 1): 10.0}
+        compartments = Compartments(achemkit.ReactorStepwise, self.achem, self.compartments, diffusion, 42)
+        list(compartments.do(1))
+        populations = compartments.populations()
+        self.assertEqual(populations[0], {})
+        self.assertEqual(populations[2], {})
+
+    def test_reproducible(self):
+        for reactorclass in (achemkit.ReactorItterative, achemkit.ReactorGillespieLike):
+            serial = Compartments(reactorclass, self.achem, self.compartments, 0.2, 42, barrier=0.5)
+            expected = list(serial.do(5))
+            with PoolExecutor(2) as executor:
+                parallel = Compartments(reactorclass, self.achem, self.compartments, 0.2, 42,
+                                        barrier=0.5, executor=executor)
+                self.assertEqual(list(parallel.do(5)), expected)
+                self.assertEqual(parallel.populations(), serial.populations())
+
+    def test_close(self):
+        with ThreadExecutor(2, persistent=True) as executor:
+            with Compartments(achemkit.ReactorItterative, self.achem, self.compartments, 0.2, 42,
+                              executor=executor) as compartments:
+                list(compartments.do(2))
+                #the reactors of this process are kept with the shared setup
+                (setup,) = executor.shared.values()
+                self.assertEqual(sorted(setup[-1]), [0, 1, 2])
+                #other compartments on the same executor have their own
+                other = Compartments(achemkit.ReactorStepwise, self.achem, self.compartments, 0.2, 42,
+                                     executor=executor)
+                list(other.do(2))
+                self.assertEqual(len(executor.shared), 2)
+            self.assertEqual(len(executor.shared), 1)
+        self.assertEqual(executor.shared, {})
@@ -0,0 +1,168 @@
+"""
+Runs many independent replicates of the same simulation, to get statistics
+over the stochastic behaviour of an Artificial Chemistry.
+
+Replicates are distributed across a pool of processes, or any other
+:py:class:`~achemkit.sim.executor.Executor`. The
+:py:class:`achemkit.achem.AChem` and initial molecules are shared with each
+worker process once when it starts, rather than with every replicate, and each
+replicate gets its own reproducible random number generator derived from the
+seed of the ensemble and the number of the replicate.
+"""
+
+import os
+
+from achemkit.utils.rng import derive_seed, new_seed, stream
+from achemkit.sim.sink import TextLogSink, PopulationSink
+from achemkit.sim.executor import SerialExecutor, ProcessExecutor, resolve
+
+def _run_replicate(task):
+    """
+    Internal function to run a single replicate in a worker process.
+
+    Returns the replicate number and either a time series of molecule counts
+    or the name of the log file written.
+    """
+    replicate, seed, time, interval, outdir, setup = task
+    reactorclass, achem, mols, reactorargs = resolve(setup)
+    reactor = reactorclass(achem, mols, rngseed=stream(seed, replicate), **reactorargs)
+    if outdir is not None:
+        filename = os.path.join(outdir, "replicate_{0:06d}.log".format(replicate))
+        sink = TextLogSink(filename)
+        reactor.run(time, sink)
+        sink.close()
+        return replicate, filename
+
+    sink = PopulationSink(mols, interval, time)
+    reactor.run(time, sink)
+    sink.finish(time)
+    return replicate, sink.data
+
+def replicate_seed(seed, replicate):
+    """
+    Derive the seed of a single replicate from the seed of an ensemble.
+
+    Seeds are derived by hashing, so they do not depend on the order or
+    the process in which replicates are run. This is the seed of the stream
+    of the replicate, see :py:mod:`achemkit.utils.rng`.
+    """
+    return derive_seed(seed, replicate)
+
+
+class Ensemble(object):
+    """
+    Many replicates of the same :py:class:`achemkit.Reactor` configuration.
+    """
+
+    def __init__(self, reactorclass, achem, mols, seed=None, processes=None, chunksize=1, executor=None,
+                 **reactorargs):
+        """
+        :param reactorclass: Subclass of :py:class:`achemkit.Reactor` that
+                             accepts an `rngseed` parameter, e.g.
+                             :py:class:`achemkit.ReactorGillespieLike`.
+        :param achem: :py:class:`achemkit.achem.AChem` object or equivalent.
+        :param mols: Initial molecules of every replicate.
+        :param seed: Seed for the ensemble. If not specified, one will be
+                     generated at random and stored as ``seed``.
+        :param processes: Number of worker processes. If 1, replicates are run
+                          in this process. Defaults to the number of CPUs.
+        :param chunksize: Number of replicates sent to a worker process at once.
+        :param executor: :py:class:`~achemkit.sim.executor.Executor` to run 
+                         replicates with instead of one made from `processes`
+                         and `chunksize`.
+        :param reactorargs: Additional keyword arguments for `reactorclass`.
+        """
+        self.reactorclass = reactorclass
+        self.achem = achem
+        self.mols = tuple(mols)
+        if seed is None:
+            seed = new_seed()
+        self.seed = seed
+        self.processes = processes
+        self.chunksize = chunksize
+        self.executor = executor
+        self.reactorargs = reactorargs
+
+    def _run(self, tasks):
+        """
+        Internal function to run tasks in worker processes, yielding results
+        as they complete.
+        """
+        executor = self.executor
+        if executor is None:
+            if self.processes == 1:
+                executor = SerialExecutor()
+            else:
+                executor = ProcessExecutor(self.processes, self.chunksize, False)
+        setup = executor.share((self.reactorclass, self.achem, self.mols, self.reactorargs))
+        tasks = [task + (setup,) for task in tasks]
+        try:
+            for result in executor.map(_run_replicate, tasks):
+                yield result
+        finally:
+            if executor is not self.executor:
+                executor.close()
+            else:
+                executor.unshare(setup)
+
+    def run(self, time, replicates, interval=1.0, outdir=None):
+        """
+        Run replicates, yielding results as they complete, which may not be
+        in order.
+
+        :param float time: Time to simulate each replicate for.
+        :param integer replicates: Number of replicates to run.
+        :param float interval: Time between samples of the molecule counts.
+        :param outdir: If given, each replicate writes its events to a log file
+                       in this directory instead of returning a time series.
+                       See :ref:`bucket_file_format`.
+        :rtype: yields tuples of (replicate number, result), where result is a
+                dictionary of time to dictionary of molecular species to count,
+                or the name of the log file written.
+        """
+        tasks = [(i, self.seed, time, interval, outdir) for i in xrange(replicates)]
+        for result in self._run(tasks):
+            yield result
+
+    def to_logs(self, time, replicates, outdir):
+        """
+        Run replicates, writing each to a log file in `outdir`.
+
+        :rtype: list of filenames, in order of replicate.
+        """
+        filenames = dict(self.run(time, replicates, outdir=outdir))
+        return [filenames[i] for i in xrange(replicates)]
+
+    def timeseries(self, time, replicates, interval=1.0):
+        """
+        Run replicates, aggregating their time series as they complete.
+
+        :rtype: tuple of (mean, standard deviation) where each is a dictionary
+                of time to dictionary of molecular species to value, suitable
+                for :py:func:`achemkit.utils.datafile.data_to_file`.
+        """
+        sums = {}
+        squares = {}
+        for replicate, series in self.run(time, replicates, interval):
+            for sampletime in series:
+                if sampletime not in sums:
+                    sums[sampletime] = {}
+                    squares[sampletime] = {}
+                for mol, count in series[sampletime].iteritems():
+                    sums[sampletime][mol] = sums[sampletime].get(mol, 0) + count
+                    squares[sampletime][mol] = squares[sampletime].get(mol, 0) + count * count
+
+        mean = {}
+        stdev = {}
+        allmols = set()
+        for sampletime in sums:
+            allmols.update(sums[sampletime])
+        for sampletime in sums:
+            mean[sampletime] = {}
+            stdev[sampletime] = {}
+            for mol in allmols:
+                thismean = sums[sampletime].get(mol, 0) / float(replicates)
+                variance = squares[sampletime].get(mol, 0) / float(replicates) - thismean * thismean
+                mean[sampletime][mol] = thismean
+                stdev[sampletime][mol] = max(variance, 0.0) ** 0.5
+        return mean, stdev
@@ -0,0 +1,67 @@
+"""
+This is the test harness for :py:mod:`achemkit.sim.ensemble`.
+"""
+
+import unittest
+import shutil
+import tempfile
+
+import achemkit
+from achemkit import OrderedFrozenBag
+from achemkit.sim.ensemble import Ensemble, replicate_seed
+from achemkit.sim.executor import SerialExecutor, ProcessExecutor
+
+class TestEnsemble(unittest.TestCase):
+    
+    def setUp(self): 
+        self.rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])):0.1}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.mols = [mol for mol in self.net.seen*10]
+        self.achem = achemkit.AChemReactionNetwork(self.net)
+        #the same reactants have competing products
+        competing = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["A", "C"])): 1.0,
+                     (OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])): 1.0}
+        self.competing = achemkit.AChemReactionNetwork(achemkit.ReactionNetwork(competing))
+        
+    def test_seed(self):
+        self.assertEqual(replicate_seed(42, 1), replicate_seed(42, 1))
+        self.assertNotEqual(replicate_seed(42, 1), replicate_seed(42, 2))
+        self.assertNotEqual(replicate_seed(42, 1), replicate_seed(43, 1))
+        
+    def test_reproducible(self):
+        serial = Ensemble(achemkit.ReactorItterative, self.competing, self.mols, seed=42, processes=1)
+        parallel = Ensemble(achemkit.ReactorItterative, self.competing, self.mols, seed=42, processes=2)
+        self.assertEqual(dict(serial.run(10, 4)), dict(parallel.run(10, 4)))
+        
+    def test_streams(self):
+        #outcomes of competing reactions come from the replicate streams, so
+        #do not depend on which process runs a replicate
+        for reactorclass in (achemkit.ReactorItterative, achemkit.ReactorGillespieLike):
+            results = []
+            for executor in (SerialExecutor(), ProcessExecutor(2)):
+                with executor:
+                    ensemble = Ensemble(reactorclass, self.competing, self.mols, seed=42, executor=executor)
+                    results.append(dict(ensemble.run(10, 4)))
+            self.assertEqual(results[0], results[1])
+            #replicates diverge from each other
+            self.assertTrue(len(set(repr(sorted(result[max(result)].items())) for result in results[0].values())) > 1)
+        
+    def test_timeseries(self):
+        ensemble = Ensemble(achemkit.ReactorGillespieLike, self.achem, self.mols, seed=42, processes=1)
+        mean, stdev = ensemble.timeseries(5, 4, 1.0)
+        self.assertEqual(sorted(mean.keys()), [0.0, 1.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(mean[0.0], {"A":10, "B":10, "C":10})
+        self.assertEqual(stdev[0.0], {"A":0, "B":0, "C":0})
+        for sampletime in mean:
+            self.assertEqual(mean[sampletime]["A"] + mean[sampletime]["C"], 20)
+        
+    def test_logs(self):
+        outdir = tempfile.mkdtemp()
+        try:
+            ensemble = Ensemble(achemkit.ReactorGillespieLike, self.achem, self.mols, seed=42, processes=1)
+            filenames = ensemble.to_logs(5, 2, outdir)
+            self.assertEqual(len(filenames), 2)
+            buck = achemkit.Bucket.from_filename(filenames[0])
+            self.assertEqual(buck.reactionnet.reactions, self.net.reactions)
+        finally:
+            shutil.rmtree(outdir)
@@ -0,0 +1,353 @@
+"""
+Executors that apply a function to many arguments, either in this process or
+in parallel.
+
+All of the parallel code paths in :py:mod:`achemkit.sim` take an executor, so
+the choice between serial, thread and process execution, the number of items
+sent to a worker at once, and whether a pool of workers is kept warm between
+calls can be made by the user.
+
+Each executor has a :py:meth:`Executor.map` method with the same interface as
+the built-in :py:func:`itertools.imap`. For process-based executors the
+function and its arguments must be picklable, so should be module-level
+functions rather than bound methods.
+
+Large objects that every task needs, such as the
+:py:class:`~achemkit.achem.AChem`, should be given to :py:meth:`Executor.share`
+rather than passed with each task. They are then installed once in each worker
+process when it starts, and tasks refer to them by a small :py:class:`Handle`.
+Tasks run in this process get the object from the handle itself, so nothing
+is kept once the executor and its handles are gone. An executor keeps the
+objects shared with it until they are released with
+:py:meth:`Executor.unshare` or it is closed.
+
+If :py:mod:`umpf` is installed, :py:class:`UmpfExecutor` uses it, so that any
+pool or server configured on :py:class:`umpf.Hub` is respected.
+"""
+
+import itertools
+import multiprocessing
+import multiprocessing.pool
+
+try:
+    import umpf
+except ImportError:
+    umpf = None
+
+#objects installed in this worker process when it started, by handle key
+_installed = {}
+_handles = itertools.count()
+
+def _initialize(shared, initializer, initargs):
+    """
+    Internal function run by every worker when it starts.
+    """
+    _installed.update(shared)
+    if initializer is not None:
+        initializer(*initargs)
+
+def resolve(obj):
+    """
+    Get the object installed for a :py:class:`Handle`, or `obj` itself if it
+    is not a handle.
+
+    Functions that are given to :py:meth:`Executor.map` should call this on
+    any arguments that may have been shared.
+    """
+    if isinstance(obj, Handle):
+        if obj.obj is not None:
+            return obj.obj
+        return _installed[obj.key]
+    return obj
+
+
+class Handle(object):
+    """
+    Small picklable reference to an object shared with workers by
+    :py:meth:`Executor.share`.
+
+    In this process the handle holds the object, but only the key is pickled.
+    """
+    __slots__ = ["key", "obj"]
+
+    def __init__(self, key, obj=None):
+        self.key = key
+        self.obj = obj
+
+    def __reduce__(self):
+        return (Handle, (self.key,))
+
+    def __repr__(self):
+        return "Handle({0})".format(repr(self.key))
+
+    def __eq__(self, other):
+        return isinstance(other, Handle) and self.key == other.key
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+def _star(passed):
+    """
+    Internal function to call a function with a tuple of arguments, so that
+    pools which pass a single argument can be used.
+    """
+    func, args = passed
+    return func(*args)
+
+
+class Executor(object):
+    """
+    Abstract class that defines the interface of executors.
+
+    Executors can be used in a ``with`` statement, which calls :py:meth:`close`
+    at the end.
+    """
+
+    def __init__(self, chunksize=1, ordered=True, initializer=None, initargs=()):
+        """
+        :param chunksize: Number of items sent to a worker at once.
+        :param ordered: If True, results are yielded in the order of the
+                        arguments. Otherwise they are yielded as they complete.
+        :param initializer: If given, called with `initargs` once by every
+                            worker before it does anything else.
+        :param initargs: Arguments for `initializer`.
+        """
+        self.chunksize = chunksize
+        self.ordered = ordered
+        self.initializer = initializer
+        self.initargs = tuple(initargs)
+        self.shared = {}
+
+    def share(self, obj):
+        """
+        Install `obj` in every worker of this executor once, rather than
+        sending it with every task.
+
+        :rtype: :py:class:`Handle` to pass to tasks instead of `obj`. Use
+                :py:func:`resolve` to get the object back.
+        """
+        for key, value in self.shared.iteritems():
+            if value is obj:
+                return Handle(key, obj)
+        key = "{0}:{1}".format(id(self), _handles.next())
+        self.shared[key] = obj
+        return Handle(key, obj)
+
+    def unshare(self, handle):
+        """
+        Release an object shared by :py:meth:`share`, so this executor no
+        longer keeps it. Worker processes that already have it keep their copy
+        until they are stopped.
+
+        :param handle: :py:class:`Handle` returned by :py:meth:`share`.
+        """
+        self.shared.pop(handle.key, None)
+
+    def _initialize(self):
+        """
+        Internal function to set up a worker in this process, which gets shared
+        objects from their handles.
+        """
+        _initialize({}, self.initializer, self.initargs)
+
+    def map(self, func, *iterables):
+        """
+        Apply `func` to each set of arguments from `iterables`, stopping at the
+        end of the shortest.
+
+        This is an abstract method that must be implemented by subclasses.
+
+        :rtype: yields results.
+        """
+        raise NotImplementedError, "Executor is an abstract class"
+
+    def close(self):
+        """
+        Release any workers held by this executor, and any objects shared with
+        them.
+        """
+        self.shared = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class SerialExecutor(Executor):
+    """
+    Executor that applies functions in this process, lazily, one item at a
+    time. This has the least overhead per item.
+    """
+
+    def map(self, func, *iterables):
+        self._initialize()
+        return itertools.imap(func, *iterables)
+
+
+class UmpfExecutor(Executor):
+    """
+    Executor that uses :py:func:`umpf.map`.
+
+    Results are always in order and chunk size is ignored.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if umpf is None:
+            raise ImportError, "umpf is not installed"
+        super(UmpfExecutor, self).__init__(*args, **kwargs)
+
+    def map(self, func, *iterables):
+        #umpf may use a pool or server that is not started by this executor
+        #so shared objects are only available in this process
+        self._initialize()
+        return umpf.map(func, *iterables)
+
+
+class _PoolExecutor(Executor):
+    """
+    Internal base class of executors that run tasks on a
+    :py:mod:`multiprocessing` pool of workers. Subclasses implement
+    :py:meth:`_make_pool`.
+
+    By default a new pool is started for each call to :py:meth:`map`, and
+    stopped once all results have been yielded. A persistent executor keeps
+    its pool between calls, so the cost of starting the workers and running
+    `initializer` is only paid once. The pool is then started on first use
+    and stopped by :py:meth:`close`.
+    """
+
+    def __init__(self, processes=None, chunksize=1, ordered=True, initializer=None, initargs=(), persistent=False):
+        """
+        :param processes: Number of workers. Defaults to the number of CPUs.
+        :param persistent: If True, keep the pool of workers between calls to
+                           :py:meth:`map`.
+
+        Other parameters are as for :py:class:`Executor`.
+        """
+        super(_PoolExecutor, self).__init__(chunksize, ordered, initializer, initargs)
+        self.processes = processes
+        self.persistent = persistent
+        self.pool = None
+
+    def _make_pool(self):
+        """
+        Internal function to start a new pool of workers.
+
+        This is an abstract method that must be implemented by subclasses.
+        """
+        raise NotImplementedError, "_PoolExecutor is an abstract class"
+
+    def _imap(self, pool, func, iterables):
+        """
+        Internal function to map over a pool in the configured order.
+        """
+        tasks = itertools.izip(itertools.repeat(func), itertools.izip(*iterables))
+        if self.ordered:
+            return pool.imap(_star, tasks, self.chunksize)
+        else:
+            return pool.imap_unordered(_star, tasks, self.chunksize)
+
+    def _map_once(self, func, iterables):
+        """
+        Internal function to map over a new pool, stopping it afterwards.
+        """
+        pool = self._make_pool()
+        try:
+            for result in self._imap(pool, func, iterables):
+                yield result
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def map(self, func, *iterables):
+        if not self.persistent:
+            return self._map_once(func, iterables)
+        if self.pool is None:
+            self.pool = self._make_pool()
+        return self._imap(self.pool, func, iterables)
+
+    def _close_pool(self):
+        """
+        Internal function to stop the pool of workers.
+        """
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def close(self):
+        self._close_pool()
+        super(_PoolExecutor, self).close()
+
+    def __getstate__(self):
+        #pools cannot be pickled, so a copy starts its own
+        state = dict(self.__dict__)
+        state["pool"] = None
+        return state
+
+
+class ProcessExecutor(_PoolExecutor):
+    """
+    Executor that runs tasks on a pool of worker processes, by default a new
+    one for each call to :py:meth:`map`.
+
+    If persistent, objects should be shared before the first call to
+    :py:meth:`map`, as sharing another one afterwards restarts the pool.
+    """
+
+    def share(self, obj):
+        count = len(self.shared)
+        handle = super(ProcessExecutor, self).share(obj)
+        if len(self.shared) > count:
+            #existing workers do not have the new object
+            self._close_pool()
+        return handle
+
+    def _make_pool(self):
+        initargs = (self.shared, self.initializer, self.initargs)
+        return multiprocessing.Pool(self.processes, _initialize, initargs)
+
+
+class ThreadExecutor(_PoolExecutor):
+    """
+    Executor that runs tasks on a pool of worker threads, by default a new one
+    for each call to :py:meth:`map`.
+
+    Threads share this process, so only help when `func` spends its time
+    outside the Python interpreter, for example in I/O or NumPy. They get
+    shared objects from their handles, so sharing never restarts the pool.
+    """
+
+    def _make_pool(self):
+        initargs = ({}, self.initializer, self.initargs)
+        return multiprocessing.pool.ThreadPool(self.processes, _initialize, initargs)
+
+
+class PoolExecutor(ProcessExecutor):
+    """
+    :py:class:`ProcessExecutor` that keeps its pool of worker processes
+    between calls to :py:meth:`map`. The pool is started on first use and
+    stopped by :py:meth:`close`.
+    """
+
+    def __init__(self, processes=None, chunksize=1, ordered=True, initializer=None, initargs=()):
+        super(PoolExecutor, self).__init__(processes, chunksize, ordered, initializer, initargs, True)
+
+
+def get_executor(executor=None):
+    """
+    Get the executor to use when `executor` is given to a simulation.
+
+    :param executor: An :py:class:`Executor`, or None for a
+                     :py:class:`SerialExecutor`.
+    """
+    if executor is None:
+        return SerialExecutor()
+    return executor
@@ -0,0 +1,137 @@
+"""
+This is the test harness for :py:mod:`achemkit.sim.executor`.
+"""
+
+import unittest
+import operator
+
+import achemkit
+from achemkit import OrderedFrozenBag
+from achemkit.sim.executor import SerialExecutor, ThreadExecutor, ProcessExecutor, PoolExecutor, get_executor
+from achemkit.sim.executor import Handle, resolve
+from achemkit.sim import executor as executor_module
+from achemkit.sim.ensemble import Ensemble
+
+#state set by _initializer, to check it is called
+_installed = None
+
+def _initializer(value):
+    global _installed
+    _installed = value
+    
+def _installed_plus(x):
+    return _installed + x
+    
+def _resolved_plus(handle, x):
+    return resolve(handle) + x
+
+class TestExecutors(unittest.TestCase):
+    
+    def setUp(self):
+        self.executors = (SerialExecutor(chunksize=3), 
+                          ThreadExecutor(2, chunksize=3), 
+                          ProcessExecutor(2, chunksize=3), 
+                          PoolExecutor(2, chunksize=3),
+                          ThreadExecutor(2, chunksize=3, persistent=True))
+        
+    def tearDown(self):
+        for executor in self.executors:
+            executor.close()
+    
+    def test_ordered(self):
+        for executor in self.executors:
+            self.assertEqual(list(executor.map(operator.add, xrange(10), xrange(10, 30))), range(10, 30, 2))
+            
+    def test_unordered(self):
+        for executor in self.executors:
+            executor.ordered = False
+            self.assertEqual(sorted(executor.map(abs, xrange(-10, 0))), range(1, 11))
+            
+    def test_initializer(self):
+        for executor in (SerialExecutor(initializer=_initializer, initargs=(100,)), 
+                         ProcessExecutor(2, initializer=_initializer, initargs=(100,))):
+            self.assertEqual(list(executor.map(_installed_plus, xrange(3))), [100, 101, 102])
+            
+    def test_share(self):
+        for executor in self.executors:
+            handle = executor.share(100)
+            self.assertTrue(isinstance(handle, Handle))
+            self.assertEqual(executor.share(100), handle)
+            results = executor.map(_resolved_plus, [handle] * 3, xrange(3))
+            self.assertEqual(list(results), [100, 101, 102])
+            
+    def test_unshare(self):
+        for executor in self.executors:
+            handle = executor.share(100)
+            executor.unshare(handle)
+            self.assertEqual(executor.shared, {})
+            
+    def test_share_restart(self):
+        with PoolExecutor(2) as executor:
+            first = executor.share(100)
+            self.assertEqual(list(executor.map(_resolved_plus, [first], [1])), [101])
+            second = executor.share(200)
+            self.assertEqual(list(executor.map(_resolved_plus, [first, second], [1, 2])), [101, 202])
+        self.assertEqual(resolve(5), 5)
+        
+    def test_persistent(self):
+        for executor in (PoolExecutor(2), ThreadExecutor(2, persistent=True)):
+            with executor:
+                list(executor.map(abs, xrange(3)))
+                pool = executor.pool
+                list(executor.map(abs, xrange(3)))
+                self.assertTrue(executor.pool is pool)
+                #workers in this process do not need restarting
+                executor.share(100)
+                self.assertEqual(executor.pool is pool, isinstance(executor, ThreadExecutor))
+            self.assertTrue(executor.pool is None)
+        self.assertFalse(isinstance(ThreadExecutor(), ProcessExecutor))
+        
+    def test_default(self):
+        self.assertTrue(isinstance(get_executor(), SerialExecutor))
+        executor = ThreadExecutor()
+        self.assertTrue(get_executor(executor) is executor)
+        
+class TestReactors(unittest.TestCase):
+    
+    def setUp(self): 
+        self.rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])):1.0}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.mols = [mol for mol in self.net.seen*10]
+        self.achem = achemkit.AChemReactionNetwork(self.net)
+        
+    def test_stepwise(self):
+        with PoolExecutor(2, ordered=False) as executor:
+            reactor = achemkit.ReactorStepwise(self.achem, self.mols, 42, batchsize=2, executor=executor)
+            events = list(reactor.do(2))
+        self.assertEqual(len(events), 30)
+        self.assertEqual(len(reactor.mols), 30)
+        self.assertEqual(reactor.mols.count("B"), 10)
+        
+    def test_enumerate(self):
+        with PoolExecutor(2) as executor:
+            reactor = achemkit.ReactorEnumerate(self.achem, ["A", "B"], executor=executor)
+            events = list(reactor.do(10))
+        self.assertEqual(set(reactor.mols), set(["A", "B", "C"]))
+        
+    def test_released(self):
+        #simulations with their own executor keep nothing shared
+        for i in xrange(50):
+            list(achemkit.sim_stepwise(self.achem, self.mols, 2))
+            list(achemkit.sim_enumerate(self.achem, ["A", "B"], 3))
+        with PoolExecutor(2) as executor:
+            ensemble = Ensemble(achemkit.ReactorItterative, self.achem, self.mols, seed=42, executor=executor)
+            for i in xrange(3):
+                list(ensemble.run(5, 2))
+            self.assertEqual(executor.shared, {})
+        self.assertEqual(executor_module._installed, {})
+        
+    def test_ensemble(self):
+        #the same reactants have competing products
+        rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["A", "C"])):1.0,
+                 (OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])):1.0}
+        achem = achemkit.AChemReactionNetwork(achemkit.ReactionNetwork(rates))
+        serial = Ensemble(achemkit.ReactorItterative, achem, self.mols, seed=42, processes=1)
+        with PoolExecutor(2, ordered=False) as executor:
+            parallel = Ensemble(achemkit.ReactorItterative, achem, self.mols, seed=42, executor=executor)
+            self.assertEqual(dict(serial.run(10, 4)), dict(parallel.run(10, 4)))
@@ -16,17 +16,31 @@ import random
 import achemkit
 from achemkit import Reactor
 from achemkit import Event
+from achemkit import OrderedFrozenBag
+from achemkit.sim.population import Population, ReactiveIndex
+from achemkit.utils.sampler import make_sampler
+from achemkit.achem import react_with
 
 class ReactorGillespieLike(Reactor):
-    def __init__(self, achem, mols, rngseed=None, timescale=100.0):
+    def __init__(self, achem, mols, rngseed=None, timescale=100.0, skipelastic=False, elasticrecords=False):
         """
         :param achem: :py:class:`achemkit.achem.AChem` object or equivalent.
         :param mols: Initial molecular species.
         :param rngseed: Instance of :py:class:`random.Random` or seed for 
                         :py:class:`random.Random`
         :param timescale: Volume/pressure constant.
+        :param skipelastic: If True, jump directly from one reactive collision
+                            to the next using 
+                            :py:meth:`achemkit.achem.AChem.reactive_reactants`.
+                            Elastic collisions are counted in ``elastic`` 
+                            rather than yielded.
+        :param elasticrecords: If True when skipping elastic collisions, each 
+                               run of them is recorded in ``elasticruns`` as a 
+                               tuple of (time the run ended, number of 
+                               collisions), rather than only counted.
         """
         super(ReactorGillespieLike, self).__init__(achem, mols)
+        self.mols = Population(mols)
         self.maxtime = 0.0
         self.time = 0.0
         if isinstance(rngseed, random.Random):
@@ -35,6 +49,46 @@ class ReactorGillespieLike(Reactor):
             self.rng = random.Random(rngseed)
         self.timescale = timescale
         self.possiblenoreactants = (2,)
+        self.elastic = 0
+        self.elasticruns = None
+        if elasticrecords:
+            self.elasticruns = []
+        self.reactive = None
+        if skipelastic:
+            self.reactive = ReactiveIndex(self.mols, achem.reactive_reactants())
+
+    def get_state(self):
+        species, counts = self.mols.slots()
+        return {"species": species,
+                "counts": counts,
+                "time": self.time,
+                "maxtime": self.maxtime,
+                "elastic": self.elastic,
+                "rng": self.rng.getstate()}
+
+    def set_state(self, state):
+        self.mols = Population.from_slots(state["species"], state["counts"])
+        self.time = state["time"]
+        self.maxtime = state["maxtime"]
+        self.elastic = state["elastic"]
+        self.rng.setstate(state["rng"])
+        if self.reactive is not None:
+            self.reactive = ReactiveIndex(self.mols, self.achem.reactive_reactants())
+
+    def fingerprint(self):
+        return hash(frozenset(self.mols.counts().iteritems()))
+
+    def add_mols(self, mols):
+        mols = tuple(mols)
+        self.mols.update(mols)
+        if self.reactive is not None:
+            self.reactive.refresh(set(mols))
+
+    def take_mols(self, count, rng):
+        taken = self.mols.take(count, rng)
+        if self.reactive is not None:
+            self.reactive.refresh(set(taken))
+        return taken
 
     def do(self, time):
         """
@@ -44,19 +98,39 @@ class ReactorGillespieLike(Reactor):
         :param float time: Time to simulate.
         :rtype: yields :py:class:`achemkit.Event` objects.
         """
+        for reaction in self._reactions(time):
+            yield Event(*reaction)
+
+    def _reactions(self, time):
         self.maxtime += time
+        self._begin()
+        sizes = make_sampler(self.achem.noreactants)
+        recorded = self.elastic
         while self.time < self.maxtime:
-            interval, reactants, products = self._next_reaction()
+            if self._tick():
+                break
+            interval, reactants, products = self._next_reaction(sizes)
             #not enough molecules to react further
             if interval is None:
                 break
             self.time += interval
-            yield Event(time, reactants, products)
+            if reactants is None:
+                #only elastic collisions happened
+                continue
+            if self.elasticruns is not None and self.elastic > recorded:
+                self.elasticruns.append((self.time, self.elastic - recorded))
+                recorded = self.elastic
+            yield self.time, reactants, products, None
+        if self.elasticruns is not None and self.elastic > recorded:
+            self.elasticruns.append((self.time, self.elastic - recorded))
 
 
-    def _next_reaction(self):
+    def _next_reaction(self, sizes):
         """
         Internal function that calculates and applies the next reaction.
+        
+        :param sizes: :py:class:`achemkit.utils.sampler.Sampler` of the number
+                      of reactants.
         """
         #Let the next reaction have index μ and fire at time t + τ.
         #Let α be the sum of the propensities.
@@ -75,30 +149,60 @@ class ReactorGillespieLike(Reactor):
                     count *= (len(self.mols)-(i-1))
                     i -= 1
             totalnumberofreactions += count
+        if totalnumberofreactions == 0:
+            #no molecules to react
+            return None, None, None
                         
+        if self.reactive is not None:
+            return self._next_reactive_reaction(totalnumberofreactions)
+
         interval = self.rng.expovariate(float(totalnumberofreactions)) * self.timescale
 
-        noreactants = achemkit.utils.utils.get_sample(self.achem.noreactants, self.rng)
+        noreactants = sizes.sample(self.rng)
         
         if len(self.mols) >= noreactants:
-            reactants = self.rng.sample(self.mols, noreactants)
-            for x in reactants:
-                i = self.mols.index(x)
-                self.mols = self.mols[:i] + self.mols[i+1:]
+            reactants = self.mols.take(noreactants, self.rng)
             
-            products = tuple(self.achem.react(reactants))
-            self.mols += products
+            products = tuple(react_with(self.achem, reactants, self.rng))
+            self.mols.update(products)
             return interval, reactants, products
         else:
             #not enough molecules left to react
             return None, None, None
+
+    def _next_reactive_reaction(self, totalnumberofreactions):
+        """
+        Internal function that skips over elastic collisions to calculate and
+        apply the next reactive reaction.
+        """
+        sizes = achemkit.utils.utils.get_probabilities(self.achem.noreactants)
+        skipped, reactants = self.reactive.next_reactive(sizes, self.rng)
+        if skipped is None:
+            #nothing can react any more
+            return None, None, None
+        
+        #the sum of skipped+1 exponential intervals is gamma distributed
+        interval = self.rng.gammavariate(skipped + 1, 1.0) / float(totalnumberofreactions) * self.timescale
+        self.elastic += skipped
+        
+        for mol in reactants:
+            self.mols.remove(mol)
+        products = tuple(react_with(self.achem, reactants, self.rng))
+        self.mols.update(products)
+        self.reactive.refresh(set(reactants).union(products))
+        
+        if OrderedFrozenBag(products) == OrderedFrozenBag(reactants):
+            #reactive collection can still collide elastically
+            self.elastic += 1
+            return interval, None, None
+        return interval, reactants, products
                     
 
-def sim_gillespie(achem, mols, maxtime, rng=None):
+def sim_gillespie(achem, mols, maxtime, rng=None, skipelastic=False):
     """
     Wrapper for :py:class:`ReactorGillespieLike`.
     """
-    sim = ReactorGillespieLike(achem, mols, rng)
+    sim = ReactorGillespieLike(achem, mols, rng, skipelastic=skipelastic)
     for e in sim.do(maxtime):
         yield e
     
@@ -7,6 +7,7 @@ import random
 
 import achemkit
 from achemkit import OrderedFrozenBag
+from achemkit.sim.sink import NetworkSink
 
 class TestGillespie(unittest.TestCase):
     
@@ -22,4 +23,39 @@ class TestGillespie(unittest.TestCase):
         events = achemkit.sim_gillespie(self.achem, self.mols, 50)
         buck = achemkit.Bucket(events)
         self.assertEqual(buck.reactionnet.reactions, self.net.reactions)
-
+        
+    def test_skipelastic(self):
+        events = achemkit.sim_gillespie(self.achem, self.mols, 50, skipelastic=True)
+        buck = achemkit.Bucket(events)
+        self.assertEqual(buck.reactionnet.reactions, self.net.reactions)
+        
+    def test_skipelastic_equivalence(self):
+        """
+        Skipping elastic collisions should give the same number of reactive
+        collisions on average.
+        """
+        rng = random.Random(42)
+        repeats = 100
+        skipped = []
+        counted = []
+        for i in xrange(repeats):
+            reactor = achemkit.ReactorGillespieLike(self.achem, self.mols, rng, skipelastic=True)
+            skipped.append(len(tuple(reactor.do(5))))
+            events = achemkit.sim_gillespie(self.achem, self.mols, 5, rng)
+            counted.append(len([e for e in events if e.reactants != e.products]))
+        self.assertAlmostEqual(sum(skipped) / float(repeats), sum(counted) / float(repeats), delta=1.0)
+        
+    def test_elasticrecords(self):
+        plain = achemkit.ReactorGillespieLike(self.achem, self.mols, 42, skipelastic=True)
+        expected = list(plain.do(5))
+        reactor = achemkit.ReactorGillespieLike(self.achem, self.mols, 42, skipelastic=True, elasticrecords=True)
+        events = list(reactor.do(5))
+        self.assertEqual(events, expected)
+        self.assertTrue(reactor.elasticruns)
+        self.assertEqual(sum(count for runtime, count in reactor.elasticruns), reactor.elastic)
+        self.assertEqual(achemkit.Bucket(events).reactionnet.reactions, self.net.reactions)
+        reactor = achemkit.ReactorGillespieLike(self.achem, self.mols, 1, skipelastic=True, elasticrecords=True)
+        sink = NetworkSink()
+        reactor.run(5, sink)
+        self.assertTrue(reactor.elasticruns)
+        self.assertEqual(sink.reactionnet.reactions, self.net.reactions)
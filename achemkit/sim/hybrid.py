@@ -0,0 +1,285 @@
+"""
+Hybrid stochastic/deterministic simulation of a
+:py:class:`~achemkit.reactionnet.ReactionNetwork`, using NumPy
+(http://numpy.scipy.org/).
+
+When a few molecular species are very abundant, an exact stochastic
+simulation spends nearly all of its events on reactions between them. Here
+reactions are partitioned into fast reactions, whose reactants and changed
+species are abundant and which happen often, and slow reactions. Fast
+reactions are integrated as mass-action ordinary differential equations (see
+:py:class:`achemkit.sim.ode.MassActionODE`) or as a chemical Langevin equation,
+and slow reactions are simulated exactly. The partition is recalculated as the
+numbers of molecules change.
+
+Events are only generated for slow reactions.
+"""
+
+import math
+import random
+
+import numpy
+
+import achemkit
+from achemkit import Reactor
+from achemkit import Event
+from achemkit.reactionnetarray import ArrayReactionNetwork
+from achemkit.sim.ode import MassActionODE
+
+class ReactorHybrid(Reactor):
+    """
+    Mixing algorithm that simulates slow reactions exactly, like Gillespie's
+    direct method, and fast reactions deterministically or as a diffusion.
+
+    Following Haseltine & Rawlings and Salis & Kaznessis, the next slow
+    reaction fires when the integral of the total slow propensity since the
+    previous one reaches an exponentially distributed threshold. Between slow
+    reactions the fast reactions are integrated in steps, and the integral is
+    approximated by the trapezoid rule over each step.
+
+    The current number of molecules of each species, in the order of
+    ``net.seen``, is held in ``counts``. Species changed by fast reactions may
+    have non-integer numbers. ``steps`` is the number of steps of fast
+    integration taken and ``fast`` is a tuple of the indexes of the
+    reactions currently treated as fast.
+    """
+
+    def __init__(self, achem, mols, rngseed=None, threshold=100, fastpropensity=10.0,
+                 maxstep=None, method="ode", rtol=1e-6, atol=1e-6):
+        """
+        :param achem: :py:class:`~achemkit.achem.AChemReactionNetwork`,
+                      :py:class:`~achemkit.reactionnet.ReactionNetwork` or
+                      :py:class:`~achemkit.reactionnetarray.ArrayReactionNetwork`.
+        :param mols: Initial molecules.
+        :param rngseed: Instance of :py:class:`random.Random` or seed for
+                        :py:class:`random.Random`
+        :param threshold: Minimum number of molecules of every reactant and
+                          changed species for a reaction to be fast.
+        :param fastpropensity: Minimum propensity for a reaction to be fast.
+        :param maxstep: Maximum time of a single step of fast integration.
+                        Defaults to no limit for "ode" and 0.01 for
+                        "langevin".
+        :param method: "ode" to integrate fast reactions as mass-action
+                       ordinary differential equations, or "langevin" to
+                       integrate them as a chemical Langevin equation.
+        :param rtol: Relative tolerance of "ode" integration.
+        :param atol: Absolute tolerance of "ode" integration.
+        """
+        super(ReactorHybrid, self).__init__(achem, mols)
+        if method not in ("ode", "langevin"):
+            raise ValueError("unknown method ("+repr(method)+")")
+        net = achem
+        if isinstance(net, achemkit.AChemReactionNetwork):
+            net = net.reactionnetwork
+        if not isinstance(net, ArrayReactionNetwork):
+            net = ArrayReactionNetwork.from_reactionnetwork(net)
+        self.net = net
+        self.counts = net.counts(mols).astype(numpy.float64)
+        if isinstance(rngseed, random.Random):
+            self.rng = rngseed
+        else:
+            self.rng = random.Random(rngseed)
+        self.threshold = threshold
+        self.fastpropensity = fastpropensity
+        self.method = method
+        if maxstep is None and method == "langevin":
+            maxstep = 0.01
+        self.maxstep = maxstep
+        self.rtol = rtol
+        self.atol = atol
+
+        self.time = 0.0
+        self.maxtime = 0.0
+        self.steps = 0
+        self.fast = ()
+        #integral of the slow propensity towards the next slow reaction
+        self._integral = 0.0
+        self._target = self.rng.expovariate(1.0)
+        #compiled fast subsystems, by tuple of fast reactions
+        self._subsystems = {}
+        #every species involved in a reaction, for partitioning
+        nspecies = len(net.seen)
+        involved = numpy.concatenate((net.reactant_species, net.change_species), axis=1)
+        self._involved = numpy.where(involved < nspecies, involved, nspecies)
+        self._partition()
+
+    def populations(self):
+        """
+        Current number of molecules of each molecular species.
+
+        :rtype: dictionary of molecular species to number.
+        """
+        return dict((mol, float(x)) for mol, x in zip(self.net.seen, self.counts) if x > 0.0)
+
+    def get_state(self):
+        return {"counts": self.counts.tolist(),
+                "time": self.time,
+                "maxtime": self.maxtime,
+                "steps": self.steps,
+                "integral": self._integral,
+                "target": self._target,
+                "rng": self.rng.getstate()}
+
+    def set_state(self, state):
+        self.counts = numpy.array(state["counts"], dtype=numpy.float64)
+        self.time = state["time"]
+        self.maxtime = state["maxtime"]
+        self.steps = state["steps"]
+        self._integral = state["integral"]
+        self._target = state["target"]
+        self.rng.setstate(state["rng"])
+        self._partition()
+
+    def population_size(self):
+        return float(self.counts.sum())
+
+    def fingerprint(self):
+        return hash(self.counts.tostring())
+
+    def _partition(self):
+        """
+        Internal function to recalculate which reactions are fast.
+        """
+        #the padding species is always abundant
+        padded = numpy.append(self.counts, numpy.inf)
+        abundant = (padded[self._involved] >= self.threshold).all(axis=1)
+        propensities = self.net.propensities(numpy.floor(self.counts))
+        fast = numpy.flatnonzero(abundant & (propensities >= self.fastpropensity))
+        self.fast = tuple(int(x) for x in fast)
+        self._slow = numpy.ones(len(self.net), dtype=bool)
+        self._slow[fast] = False
+
+    def _subsystem(self):
+        """
+        Internal function to get the compiled fast reactions.
+        """
+        if self.fast not in self._subsystems:
+            net = self.net
+            subnet = ArrayReactionNetwork(net.seen, [net.reactants[i] for i in self.fast],
+                                          [net.products[i] for i in self.fast],
+                                          net.rates[list(self.fast)])
+            self._subsystems[self.fast] = MassActionODE(subnet)
+        return self._subsystems[self.fast]
+
+    def _slow_propensities(self, counts):
+        """
+        Internal function for the propensities of slow reactions, with fast
+        reactions having propensity zero.
+        """
+        propensities = self.net.propensities(numpy.floor(counts))
+        propensities[~self._slow] = 0.0
+        return propensities
+
+    def _advance(self, counts, h):
+        """
+        Internal function to integrate the fast reactions for time `h`.
+        """
+        subsystem = self._subsystem()
+        if self.method == "ode":
+            counts = subsystem.integrate(counts, [0.0, h], rtol=self.rtol, atol=self.atol)[-1]
+        else:
+            #Euler-Maruyama step of the chemical Langevin equation
+            rates = numpy.maximum(subsystem.rates(counts), 0.0)
+            noise = numpy.array([self.rng.gauss(0.0, 1.0) for i in xrange(len(rates))])
+            changes = rates * h + numpy.sqrt(rates * h) * noise
+            counts = counts + numpy.bincount(subsystem._change_species,
+                                             weights=changes[subsystem._change_reaction] * subsystem._change_counts,
+                                             minlength=len(counts))
+        return numpy.maximum(counts, 0.0)
+
+    def do(self, time):
+        """
+        Simulate for `time` more time.
+
+        :param float time: Time to simulate.
+        :rtype: yields :py:class:`achemkit.Event` objects for slow reactions.
+        """
+        self.maxtime += time
+        self._begin()
+        while self.time < self.maxtime:
+            if self._tick():
+                break
+            event = self._next_slow_reaction()
+            if event is not None:
+                yield event
+
+    def _next_slow_reaction(self):
+        """
+        Internal function that advances to either the next slow reaction, which
+        is applied and returned as an :py:class:`achemkit.Event`, or the end of
+        a step of fast integration.
+        """
+        remaining = self.maxtime - self.time
+        propensities = self._slow_propensities(self.counts)
+        total = propensities.sum()
+        needed = self._target - self._integral
+
+        if len(self.fast) == 0:
+            #exact stochastic simulation while nothing is fast
+            if total <= 0.0 or needed / total >= remaining:
+                self._integral += total * remaining
+                self.time = self.maxtime
+                return None
+            self.time += needed / total
+            return self._fire(propensities)
+
+        h = remaining
+        if self.maxstep is not None:
+            h = min(h, self.maxstep)
+        if total > 0.0:
+            h = min(h, needed / total)
+        counts = self._advance(self.counts, h)
+        self.steps += 1
+        newpropensities = self._slow_propensities(counts)
+        newtotal = newpropensities.sum()
+        increase = 0.5 * h * (total + newtotal)
+
+        if self._integral + increase < self._target * (1.0 - 1e-12):
+            self._integral += increase
+            self.time += h
+            self.counts = counts
+            self._partition()
+            return None
+
+        #the integral reaches the target within this step, so find where
+        #assuming the slow propensity changes linearly
+        slope = (newtotal - total) / h
+        if abs(slope) * h > 1e-9 * (total + newtotal):
+            fraction = (-total + math.sqrt(max(total * total + 2.0 * slope * needed, 0.0))) / slope
+        else:
+            fraction = needed / (0.5 * (total + newtotal))
+        fraction = min(max(fraction, 0.0), h)
+        if fraction < h:
+            counts = self._advance(self.counts, fraction)
+            propensities = self._slow_propensities(counts)
+        else:
+            propensities = newpropensities
+        self.counts = counts
+        self.time += fraction
+        if propensities.sum() <= 0.0:
+            #propensity vanished at the crossing, so draw a new threshold
+            self._integral = 0.0
+            self._target = self.rng.expovariate(1.0)
+            self._partition()
+            return None
+        return self._fire(propensities)
+
+    def _fire(self, propensities):
+        """
+        Internal function to choose, apply and describe a slow reaction.
+        """
+        target = self.rng.random() * propensities.sum()
+        cumulative = propensities.cumsum()
+        reaction = min(int(numpy.searchsorted(cumulative, target, side="right")), len(cumulative) - 1)
+        while propensities[reaction] <= 0.0:
+            reaction -= 1
+        counts = self.counts[numpy.newaxis, :].copy()
+        self.net.apply(counts, numpy.array([reaction]))
+        self.counts = numpy.maximum(counts[0], 0.0)
+        self._integral = 0.0
+        self._target = self.rng.expovariate(1.0)
+        self._partition()
+        seen = self.net.seen
+        reactants = [seen[i] for i in self.net.reactants[reaction]]
+        products = [seen[i] for i in self.net.products[reaction]]
+        return Event(self.time, reactants, products, float(self.net.rates[reaction]))
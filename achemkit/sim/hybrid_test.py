@@ -0,0 +1,82 @@
+"""
+This is the test harness for :py:mod:`achemkit.sim.hybrid`.
+"""
+
+import unittest
+import math
+
+import achemkit
+from achemkit import OrderedFrozenBag
+
+try:
+    import numpy
+    from achemkit.sim.hybrid import ReactorHybrid
+except ImportError:
+    numpy = None
+
+@unittest.skipIf(numpy is None, "requires NumPy")
+class TestReactorHybrid(unittest.TestCase):
+    
+    def setUp(self): 
+        #abundant food interconverting quickly, consumed by rare species
+        self.rates = {(OrderedFrozenBag(["F"]), OrderedFrozenBag(["G"])):1.0,
+                      (OrderedFrozenBag(["G"]), OrderedFrozenBag(["F"])):1.0,
+                      (OrderedFrozenBag(["F", "X"]), OrderedFrozenBag(["F", "Y"])):1e-5}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.mols = ("F",) * 8000 + ("G",) * 2000 + ("X",) * 100
+        
+    def test_partition(self):
+        reactor = ReactorHybrid(self.net, self.mols, 42, threshold=1000)
+        fast = [reactor.net.reactants[i] + reactor.net.products[i] for i in reactor.fast]
+        index = reactor.net.index
+        self.assertEqual(sorted(fast), sorted([(index["F"], index["G"]), (index["G"], index["F"])]))
+        
+    def test_slow_events(self):
+        reactor = ReactorHybrid(self.net, self.mols, 42, threshold=1000)
+        events = list(reactor.do(1.0))
+        self.assertTrue(len(events) > 0)
+        self.assertTrue(reactor.steps > 0)
+        for event in events:
+            self.assertEqual(event.reactants, OrderedFrozenBag(["F", "X"]))
+            self.assertEqual(event.products, OrderedFrozenBag(["F", "Y"]))
+            self.assertTrue(0.0 < event.time <= 1.0)
+        self.assertEqual(sorted(events), events)
+        self.assertEqual(reactor.time, 1.0)
+        populations = reactor.populations()
+        self.assertAlmostEqual(populations["F"] + populations["G"], 10000.0, places=3)
+        self.assertEqual(populations["X"] + populations["Y"], 100)
+        self.assertEqual(populations["Y"], len(events))
+        
+    def test_coupling(self):
+        """
+        Slow reactions see the fast species change, so the expected number of 
+        rare molecules left is known exactly.
+        """
+        time = 5.0
+        integral = 5000 * time + 1500 * (1 - math.exp(-2 * time))
+        expected = 100 * math.exp(-1e-5 * integral)
+        for method in ("ode", "langevin"):
+            left = []
+            for seed in xrange(40):
+                reactor = ReactorHybrid(self.net, self.mols, seed, threshold=1000, method=method, maxstep=0.05)
+                for event in reactor.do(time):
+                    pass
+                left.append(reactor.counts[reactor.net.index["X"]])
+            self.assertAlmostEqual(sum(left) / len(left), expected, delta=2.5)
+        
+    def test_exact(self):
+        """
+        With nothing fast, this is exact stochastic simulation.
+        """
+        net = achemkit.ReactionNetwork({(OrderedFrozenBag(["A"]), OrderedFrozenBag(["B"])):1.0})
+        left = []
+        for seed in xrange(40):
+            reactor = ReactorHybrid(net, ("A",) * 100, seed)
+            events = list(reactor.do(1.0))
+            self.assertEqual(reactor.fast, ())
+            left.append(100 - len(events))
+        self.assertAlmostEqual(sum(left) / 40.0, 100 * math.exp(-1.0), delta=2.5)
+        
+    def test_achem(self):
+        reactor = ReactorHybrid(achemkit.AChemReactionNetwork(self.net), self.mols, 42, threshold=1000)
+        self.assertEqual(len(reactor.fast), 2)
@@ -0,0 +1,211 @@
+"""
+Low-overhead instrumentation of a running :py:class:`achemkit.Reactor`, to
+see its throughput and where its time goes without attaching a profiler.
+
+An :py:class:`Instrumentation` attached to a reactor counts every reaction
+(or step, for stepwise reactors), and times one in every `sample` of them. A
+timed reaction is split into:
+
+select
+    From the start of the reaction to the call of the AChem, i.e. choosing
+    the reactants.
+
+react
+    The call of :py:meth:`achemkit.achem.AChem.react` (or
+    :py:meth:`~achemkit.achem.AChem.react_many` or
+    :py:meth:`~achemkit.achem.AChem.all_reactions`).
+
+bookkeeping
+    From the return of the AChem to the start of the next reaction, i.e.
+    updating the populations and yielding the event.
+
+Every `interval` seconds a dictionary of metrics is passed to a callback
+and/or written as a line of JSON to a stream, e.g.::
+
+    {"walltime": 10.0, "time": 52113.0, "events": 52112, "rate": 5302.1,
+     "population": 1000, "select": 4.1e-05, "react": 9.3e-05,
+     "bookkeeping": 4.2e-05, "samples": 521}
+
+where "rate" is reactions per second since the previous report and the
+timers are the mean seconds per sampled reaction.
+
+When no instrumentation is attached the only cost is a check in the loop of
+:py:meth:`achemkit.Reactor.do`. Calls to the AChem made by other processes,
+e.g. from a process-based :py:class:`~achemkit.sim.executor.Executor`, are not
+timed.
+"""
+
+import time
+import json
+
+def _unwrapped(achem):
+    """
+    Internal function used when pickling a :py:class:`TimedAChem`, so that
+    other processes get the AChem it wraps.
+    """
+    return achem
+
+
+class TimedAChem(object):
+    """
+    Wrapper around an :py:class:`achemkit.achem.AChem` that times calls made
+    during reactions sampled by an :py:class:`Instrumentation`. Other
+    attributes are those of the wrapped AChem.
+    """
+
+    def __init__(self, achem, instrumentation):
+        self.achem = achem
+        self.instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        if name in ("achem", "instrumentation"):
+            raise AttributeError(name)
+        return getattr(self.achem, name)
+
+    def __reduce__(self):
+        return (_unwrapped, (self.achem,))
+
+    def _call(self, method, *args):
+        """
+        Internal function to call a method of the wrapped AChem, timing it if
+        the current reaction is sampled.
+        """
+        instrumentation = self.instrumentation
+        if not instrumentation.sampling:
+            return method(*args)
+        instrumentation.sampling = False
+        start = time.time()
+        result = method(*args)
+        instrumentation._phases(start, time.time())
+        return result
+
+    def react(self, reactants, *rng):
+        return self._call(self.achem.react, reactants, *rng)
+
+    def react_many(self, reactantslist, *rng):
+        return self._call(self.achem.react_many, reactantslist, *rng)
+
+    def all_reactions(self, reactants):
+        return self._call(self.achem.all_reactions, reactants)
+
+
+class Instrumentation(object):
+    """
+    Sampled counters and timers for a reactor, with periodic reports.
+
+    ``events`` is the number of reactions or steps since the start of the
+    current call of :py:meth:`achemkit.Reactor.do`, ``timers`` is a
+    dictionary of phase name to total seconds over ``samples`` sampled
+    reactions, and ``last`` is the most recent report.
+    """
+
+    def __init__(self, interval=1.0, callback=None, stream=None, sample=100):
+        """
+        :param interval: Seconds between reports.
+        :param callback: If given, called with the dictionary of metrics of
+                         each report.
+        :param stream: If given, file object to write each report to as a line
+                       of JSON.
+        :param sample: Time one in this many reactions. The clock is only read
+                       for these, so reports may be late by up to this many
+                       reactions.
+        """
+        self.interval = interval
+        self.callback = callback
+        self.stream = stream
+        self.sample = max(int(sample), 1)
+        self.last = None
+        self.sampling = False
+        self.start()
+
+    def attach(self, reactor):
+        """
+        Instrument `reactor`, wrapping its AChem in a :py:class:`TimedAChem`.
+        """
+        reactor.instrumentation = self
+        if not isinstance(reactor.achem, TimedAChem):
+            reactor.achem = TimedAChem(reactor.achem, self)
+
+    def detach(self, reactor):
+        """
+        Stop instrumenting `reactor`.
+        """
+        reactor.instrumentation = None
+        if isinstance(reactor.achem, TimedAChem):
+            reactor.achem = reactor.achem.achem
+
+    def start(self):
+        """
+        Reset the counters and timers. Called by the reactor at the start of
+        each call of :py:meth:`achemkit.Reactor.do`.
+        """
+        now = time.time()
+        self.events = 0
+        self.samples = 0
+        self.timers = {"select": 0.0, "react": 0.0, "bookkeeping": 0.0}
+        self.sampling = False
+        self._started = now
+        self._reported = now
+        self._reportedevents = 0
+        self._tickstart = None
+        self._reactend = None
+
+    def _phases(self, start, end):
+        """
+        Internal function called by :py:class:`TimedAChem` with the start and
+        end of a timed call in a sampled reaction.
+        """
+        self.timers["select"] += start - self._tickstart
+        self.timers["react"] += end - start
+        self._reactend = end
+
+    def tick(self, reactor):
+        """
+        Count a reaction or step of `reactor`, and time or report if due.
+        """
+        self.events += 1
+        if self._tickstart is not None:
+            #end of a sampled reaction
+            if self._reactend is not None:
+                self.timers["bookkeeping"] += time.time() - self._reactend
+                self.samples += 1
+            self._tickstart = None
+            self.sampling = False
+        if self.events % self.sample == 0:
+            now = time.time()
+            if now - self._reported >= self.interval:
+                self.report(reactor, now)
+            self._tickstart = time.time()
+            self._reactend = None
+            self.sampling = True
+
+    def report(self, reactor, now=None):
+        """
+        Report the current metrics of `reactor` to the callback and stream.
+
+        :rtype: dictionary of metrics.
+        """
+        if now is None:
+            now = time.time()
+        elapsed = now - self._reported
+        if elapsed > 0.0:
+            rate = (self.events - self._reportedevents) / elapsed
+        else:
+            rate = 0.0
+        metrics = {"walltime": now - self._started,
+                   "time": getattr(reactor, "time", None),
+                   "events": self.events,
+                   "rate": rate,
+                   "population": reactor.population_size(),
+                   "samples": self.samples}
+        for name, total in self.timers.iteritems():
+            metrics[name] = total / self.samples if self.samples else None
+        self._reported = now
+        self._reportedevents = self.events
+        self.last = metrics
+        if self.callback is not None:
+            self.callback(metrics)
+        if self.stream is not None:
+            self.stream.write(json.dumps(metrics, sort_keys=True) + "\n")
+            self.stream.flush()
+        return metrics
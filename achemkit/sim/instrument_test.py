@@ -0,0 +1,55 @@
+"""
+This is the test harness for :py:mod:`achemkit.sim.instrument`.
+
+"""
+
+import json
+import pickle
+import unittest
+import StringIO
+
+import achemkit
+from achemkit import OrderedFrozenBag
+from achemkit.sim.instrument import Instrumentation, TimedAChem
+
+class TestInstrumentation(unittest.TestCase):
+
+    def setUp(self):
+        rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])): 1.0,
+                 (OrderedFrozenBag(["C", "C"]), OrderedFrozenBag(["A", "B"])): 1.0}
+        self.achem = achemkit.AChemReactionNetwork(achemkit.ReactionNetwork(rates))
+        self.mols = ["A"] * 20 + ["B"] * 10 + ["C"] * 10
+
+    def test_reports(self):
+        reports = []
+        stream = StringIO.StringIO()
+        instrumentation = Instrumentation(0.0, reports.append, stream, sample=10)
+        reactor = achemkit.ReactorItterative(self.achem, self.mols, 42)
+        instrumentation.attach(reactor)
+        events = list(reactor.do(1000))
+        self.assertEqual(instrumentation.events, len(events))
+        #reports are only made when the clock is read
+        self.assertEqual(len(reports), len(events) // 10)
+        self.assertEqual(reports[-1]["events"], 990)
+        self.assertEqual(reports[-1]["population"], len(self.mols))
+        self.assertTrue(reports[-1]["react"] > 0.0)
+        self.assertTrue(reports[-1]["samples"] > 0)
+        lines = stream.getvalue().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], json.loads(json.dumps(reports)))
+
+    def test_unchanged(self):
+        #instrumenting does not change the results
+        expected = list(achemkit.ReactorStepwise(self.achem, self.mols, 42).do(10))
+        reactor = achemkit.ReactorStepwise(self.achem, self.mols, 42)
+        instrumentation = Instrumentation(sample=1)
+        instrumentation.attach(reactor)
+        self.assertEqual(list(reactor.do(10)), expected)
+        self.assertEqual(instrumentation.samples, 9)
+        instrumentation.detach(reactor)
+        self.assertTrue(reactor.achem is self.achem)
+        self.assertTrue(reactor.instrumentation is None)
+
+    def test_pickle(self):
+        timed = TimedAChem(self.achem, Instrumentation())
+        self.assertEqual(timed.noreactants, self.achem.noreactants)
+        self.assertTrue(isinstance(pickle.loads(pickle.dumps(timed, 2)), achemkit.AChemReactionNetwork))
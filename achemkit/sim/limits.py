@@ -0,0 +1,116 @@
+"""
+Run controls that stop a :py:class:`achemkit.Reactor` before it reaches the
+end of the simulated time given to :py:meth:`achemkit.Reactor.do`.
+
+Assign a :py:class:`RunLimits` to the ``limits`` attribute of a reactor. It is
+checked at the same points as a checkpointer (see
+:py:mod:`achemkit.sim.checkpoint`), where the state of the reactor is
+consistent. When a limit is reached, :py:meth:`achemkit.Reactor.do` returns
+and the reason is in ``stopreason`` of the reactor, one of:
+
+"walltime"
+    More than the given number of seconds of wall-clock time passed.
+
+"events"
+    More than the given number of reactions (or steps, for stepwise
+    reactors) happened.
+
+"population"
+    The number of molecules exceeded the maximum.
+
+"steady"
+    The populations did not change over several checks.
+
+"cycle"
+    The populations returned to those of an earlier check.
+
+Nothing about the reactor is changed when it stops, so calling ``do(0)``
+afterwards continues towards the original end time. Limits are counted from
+the start of each call.
+"""
+
+import time
+import collections
+
+class RunLimits(object):
+    """
+    Limits on a single call of :py:meth:`achemkit.Reactor.do`.
+
+    Steady states and cycles are detected by comparing
+    :py:meth:`achemkit.Reactor.fingerprint` every `every` checks, which is
+    exact up to hash collisions. In a stochastic reactor the populations may
+    repeat by chance, so these are best used with stepwise reactors or large
+    values of `steady`.
+    """
+
+    def __init__(self, walltime=None, events=None, population=None, steady=None, cycles=False,
+                 every=1, history=1000):
+        """
+        :param walltime: Maximum number of seconds of wall-clock time.
+        :param events: Maximum number of reactions or steps.
+        :param population: Maximum number of molecules.
+        :param steady: Stop if the fingerprint is the same for this many
+                       consecutive comparisons.
+        :param cycles: If True, stop if the fingerprint is the same as one of
+                       the previous `history` comparisons.
+        :param every: Number of checks between comparisons of fingerprints.
+        :param history: Number of fingerprints to remember for cycles.
+        """
+        self.walltime = walltime
+        self.events = events
+        self.population = population
+        self.steady = steady
+        self.cycles = cycles
+        self.every = every
+        self.history = history
+        self.start()
+
+    def start(self):
+        """
+        Start counting towards the limits again. Called by the reactor at the
+        start of each call of :py:meth:`achemkit.Reactor.do`.
+        """
+        self.count = 0
+        self._started = time.time()
+        self._fingerprints = collections.deque()
+        self._seen = collections.defaultdict(int)
+        self._unchanged = 0
+
+    def check(self, reactor):
+        """
+        Count a reaction or step of `reactor` and check the limits.
+
+        :rtype: reason to stop, or None to continue.
+        """
+        if self.events is not None and self.count >= self.events:
+            return "events"
+        self.count += 1
+        if self.walltime is not None and time.time() - self._started > self.walltime:
+            return "walltime"
+        if self.population is not None and reactor.population_size() > self.population:
+            return "population"
+        if (self.steady is not None or self.cycles) and self.count % self.every == 0:
+            return self._compare(reactor.fingerprint())
+        return None
+
+    def _compare(self, fingerprint):
+        """
+        Internal function to compare a fingerprint against previous ones.
+        """
+        fingerprints = self._fingerprints
+        if fingerprints and fingerprints[-1] == fingerprint:
+            self._unchanged += 1
+            if self.steady is not None and self._unchanged >= self.steady:
+                return "steady"
+        else:
+            self._unchanged = 0
+            if self.cycles and self._seen[fingerprint] > 0:
+                return "cycle"
+        fingerprints.append(fingerprint)
+        self._seen[fingerprint] += 1
+        if len(fingerprints) > self.history:
+            old = fingerprints.popleft()
+            self._seen[old] -= 1
+            if self._seen[old] == 0:
+                del self._seen[old]
+        return None
@@ -0,0 +1,69 @@
+"""
+This is the test harness for :py:mod:`achemkit.sim.limits`.
+
+"""
+
+import unittest
+
+import achemkit
+from achemkit import OrderedFrozenBag
+from achemkit.sim.limits import RunLimits
+
+def make_achem(reactions):
+    rates = dict(((OrderedFrozenBag(reactants), OrderedFrozenBag(products)), 1.0)
+                 for reactants, products in reactions)
+    return achemkit.AChemReactionNetwork(achemkit.ReactionNetwork(rates))
+
+class TestRunLimits(unittest.TestCase):
+
+    def setUp(self):
+        self.achem = make_achem([("AB", "BC"), ("CC", "AB")])
+        self.mols = ["A"] * 20 + ["B"] * 10 + ["C"] * 10
+
+    def test_events(self):
+        expected = list(achemkit.ReactorItterative(self.achem, self.mols, 42).do(100))
+        reactor = achemkit.ReactorItterative(self.achem, self.mols, 42)
+        reactor.limits = RunLimits(events=30)
+        first = list(reactor.do(100))
+        self.assertEqual(len(first), 30)
+        self.assertEqual(reactor.stopreason, "events")
+        #limits count from the start of each call
+        second = list(reactor.do(0))
+        self.assertEqual(len(second), 30)
+        reactor.limits = None
+        rest = list(reactor.do(0))
+        self.assertEqual(reactor.stopreason, None)
+        self.assertEqual(first + second + rest, expected)
+
+    def test_walltime(self):
+        reactor = achemkit.ReactorItterative(self.achem, self.mols, 42)
+        reactor.limits = RunLimits(walltime=0.05)
+        events = list(reactor.do(10 ** 9))
+        self.assertEqual(reactor.stopreason, "walltime")
+        self.assertTrue(0 < len(events) < 10 ** 9)
+
+    def test_population(self):
+        achem = make_achem([("AB", "ABB")])
+        reactor = achemkit.ReactorGillespieLike(achem, ["A", "B"], 42)
+        reactor.limits = RunLimits(population=50)
+        list(reactor.do(10 ** 9))
+        self.assertEqual(reactor.stopreason, "population")
+        self.assertEqual(reactor.population_size(), 51)
+
+    def test_steady(self):
+        #nothing can react, so every collision is elastic
+        achem = make_achem([("AD", "DD")])
+        reactor = achemkit.ReactorStepwise(achem, self.mols, 42)
+        reactor.limits = RunLimits(steady=3)
+        list(reactor.do(100))
+        self.assertEqual(reactor.stopreason, "steady")
+        self.assertEqual(reactor.time, 3.0)
+
+    def test_cycle(self):
+        achem = make_achem([("A", "B"), ("B", "A")])
+        reactor = achemkit.ReactorStepwise(achem, ["A"] * 10, 42)
+        reactor.limits = RunLimits(cycles=True)
+        list(reactor.do(100))
+        self.assertEqual(reactor.stopreason, "cycle")
+        self.assertEqual(reactor.time, 2.0)
+        self.assertEqual(reactor.mols, ("A",) * 10)
@@ -0,0 +1,134 @@
+"""
+Exact stochastic simulation (Gillespie's direct method) of many replicates of
+the same :py:class:`~achemkit.reactionnet.ReactionNetwork` at once, using NumPy
+(http://numpy.scipy.org/).
+
+Rather than simulating each replicate with its own Python loop, every
+replicate advances by one reaction per iteration, and the selection of
+reactions and the update of molecule counts is done with array operations
+across all replicates. This is much faster than running a
+:py:class:`achemkit.Reactor` many times for small and medium networks.
+"""
+
+import numpy
+
+from achemkit.reactionnetarray import ArrayReactionNetwork
+
+class LockstepSSA(object):
+    """
+    Many replicates of a :py:class:`~achemkit.reactionnet.ReactionNetwork`
+    simulated in lockstep.
+
+    The state is held in ``counts``, an array of shape (replicates, species)
+    with species in the order of ``net.seen``, and ``times``, an array of the
+    current time of each replicate.
+    """
+
+    def __init__(self, net, mols, replicates, seed=None):
+        """
+        :param net: :py:class:`~achemkit.reactionnet.ReactionNetwork` or
+                    :py:class:`~achemkit.reactionnetarray.ArrayReactionNetwork`.
+        :param mols: Initial molecules of every replicate.
+        :param replicates: Number of replicates.
+        :param seed: Seed for :py:class:`numpy.random.RandomState`, or an
+                     instance of it.
+        """
+        if not isinstance(net, ArrayReactionNetwork):
+            net = ArrayReactionNetwork.from_reactionnetwork(net)
+        self.net = net
+        self.counts = numpy.tile(net.counts(mols), (replicates, 1))
+        self.times = numpy.zeros(replicates)
+        self.maxtime = 0.0
+        self.events = 0
+        if isinstance(seed, numpy.random.RandomState):
+            self.rng = seed
+        else:
+            self.rng = numpy.random.RandomState(seed)
+
+    def _step(self, active):
+        """
+        Internal function that advances each of the `active` replicates by one
+        reaction, or to the end time if there are no more reactions before it.
+
+        :rtype: tuple of the replicates that reacted, and the counts of those
+                replicates before they reacted.
+        """
+        propensities = self.net.propensities(self.counts[active])
+        cumulative = propensities.cumsum(axis=1)
+        total = cumulative[:, -1]
+
+        #replicates with nothing left to react stop here
+        alive = total > 0.0
+        self.times[active[~alive]] = self.maxtime
+        active = active[alive]
+        cumulative = cumulative[alive]
+        total = total[alive]
+
+        intervals = self.rng.exponential(1.0, len(active)) / total
+        targets = self.rng.random_sample(len(active)) * total
+        reactions = (cumulative <= targets[:, numpy.newaxis]).sum(axis=1)
+        reactions = numpy.minimum(reactions, len(self.net) - 1)
+
+        newtimes = self.times[active] + intervals
+        #the next reaction is after the end, so stop at the end
+        fire = newtimes < self.maxtime
+        self.times[active] = numpy.where(fire, newtimes, self.maxtime)
+        active = active[fire]
+        before = self.counts[active]
+        self.net.apply(self.counts, reactions[fire], active)
+        self.events += len(active)
+        return active, before
+
+    def do(self, time, interval=None):
+        """
+        Simulate every replicate for `time` more time.
+
+        :param float time: Time to simulate.
+        :param float interval: If given, molecule counts are sampled at this
+                               interval.
+        :rtype: If `interval` is given, a tuple of (sample times, samples)
+                where samples is an array of shape (times, replicates,
+                species). Otherwise None.
+        """
+        starttime = self.maxtime
+        self.maxtime += time
+        if len(self.net) == 0:
+            self.times[:] = self.maxtime
+        replicates = len(self.times)
+        if interval is not None:
+            sampletimes = numpy.arange(starttime, self.maxtime + interval / 2.0, interval)
+            samples = numpy.empty((len(sampletimes), replicates, len(self.net.seen)), dtype=self.counts.dtype)
+            nextsample = numpy.zeros(replicates, dtype=numpy.intp)
+
+        active = numpy.flatnonzero(self.times < self.maxtime)
+        while len(active) > 0:
+            reacted, before = self._step(active)
+            if interval is not None:
+                self._sample(samples, sampletimes, nextsample, reacted, before)
+            active = numpy.flatnonzero(self.times < self.maxtime)
+
+        if interval is not None:
+            #counts do not change after the last reaction
+            self._sample(samples, sampletimes, nextsample, numpy.arange(replicates), self.counts, True)
+            return sampletimes, samples
+
+    def _sample(self, samples, sampletimes, nextsample, rows, counts, final=False):
+        """
+        Internal function to record `counts` of replicates `rows` for every
+        sample time that they have now passed.
+        """
+        rows = numpy.asarray(rows)
+        counts = numpy.asarray(counts)
+        while len(rows) > 0:
+            pending = nextsample[rows] < len(sampletimes)
+            rows = rows[pending]
+            counts = counts[pending]
+            if len(rows) == 0:
+                break
+            passed = self.times[rows] >= sampletimes[nextsample[rows]]
+            if not final:
+                passed &= self.times[rows] > sampletimes[nextsample[rows]]
+            rows = rows[passed]
+            counts = counts[passed]
+            samples[nextsample[rows], rows] = counts
+            nextsample[rows] += 1
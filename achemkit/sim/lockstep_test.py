@@ -0,0 +1,53 @@
+"""
+This is the test harness for :py:mod:`achemkit.sim.lockstep`.
+"""
+
+import unittest
+import random
+
+import achemkit
+from achemkit import OrderedFrozenBag
+
+try:
+    import numpy
+    from achemkit.sim.lockstep import LockstepSSA
+except ImportError:
+    numpy = None
+
+@unittest.skipIf(numpy is None, "requires NumPy")
+class TestLockstepSSA(unittest.TestCase):
+    
+    def setUp(self): 
+        self.rates = {(OrderedFrozenBag(["A"]), OrderedFrozenBag(["B"])):1.0}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.mols = ("A",) * 100
+        
+    def test_conservation(self):
+        ssa = LockstepSSA(self.net, self.mols, 10, seed=42)
+        sampletimes, samples = ssa.do(2.0, 0.5)
+        self.assertEqual(list(sampletimes), [0.0, 0.5, 1.0, 1.5, 2.0])
+        self.assertEqual(samples.shape, (5, 10, 2))
+        self.assertTrue((samples.sum(axis=2) == 100).all())
+        self.assertTrue((samples[0, :, 0] == 100).all())
+        self.assertTrue((ssa.times == 2.0).all())
+        
+    def test_decay(self):
+        """
+        First-order decay has an exactly known mean.
+        """
+        ssa = LockstepSSA(self.net, self.mols, 200, seed=42)
+        sampletimes, samples = ssa.do(1.0, 1.0)
+        self.assertAlmostEqual(samples[-1, :, 0].mean(), 100 * numpy.exp(-1.0), delta=1.5)
+        
+    def test_exhausted(self):
+        ssa = LockstepSSA(self.net, self.mols, 3, seed=42)
+        ssa.do(100.0)
+        self.assertEqual(ssa.counts.tolist(), [[0, 100]] * 3)
+        self.assertEqual(ssa.events, 300)
+        
+    def test_reproducible(self):
+        first = LockstepSSA(self.net, self.mols, 5, seed=42)
+        first.do(0.5)
+        second = LockstepSSA(self.net, self.mols, 5, seed=42)
+        second.do(0.5)
+        self.assertEqual(first.counts.tolist(), second.counts.tolist())
@@ -0,0 +1,300 @@
+"""
+Deterministic mean-field simulation of a
+:py:class:`~achemkit.reactionnet.ReactionNetwork` by integrating mass-action
+ordinary differential equations, using NumPy (http://numpy.scipy.org/) alone.
+
+The network is compiled once into index arrays (see
+:py:class:`~achemkit.reactionnetarray.ArrayReactionNetwork`) so that the
+right-hand side of the equations is evaluated with a handful of array
+operations, however many reactions there are.
+
+Two adaptive steppers are provided: an explicit Dormand-Prince 5(4) method for
+non-stiff problems, and a linearly-implicit Rosenbrock method (ROS2) for stiff
+problems. By default integration starts with the explicit method and switches
+to the implicit method if stiffness is detected.
+"""
+
+import math
+
+import numpy
+
+from achemkit.reactionnetarray import ArrayReactionNetwork
+
+#Dormand-Prince 5(4) coefficients
+_DOPRI_A = ((),
+            (1.0/5,),
+            (3.0/40, 9.0/40),
+            (44.0/45, -56.0/15, 32.0/9),
+            (19372.0/6561, -25360.0/2187, 64448.0/6561, -212.0/729),
+            (9017.0/3168, -355.0/33, 46732.0/5247, 49.0/176, -5103.0/18656),
+            (35.0/384, 0.0, 500.0/1113, 125.0/192, -2187.0/6784, 11.0/84))
+_DOPRI_E = (71.0/57600, 0.0, -71.0/16695, 71.0/1920, -17253.0/339200, 22.0/525, -1.0/40)
+
+#ROS2 coefficient
+_ROS2_GAMMA = 1.0 + 1.0 / math.sqrt(2.0)
+
+class MassActionODE(object):
+    """
+    Mass-action ordinary differential equations of a reaction network.
+
+    Concentrations are arrays with molecular species in the order of
+    ``seen``. The rate of each reaction is as given by
+    :py:meth:`~achemkit.reactionnetarray.ArrayReactionNetwork.rate_law`.
+
+    After :py:meth:`integrate`, the attributes ``steps``, ``rejected``,
+    ``evaluations`` and ``stiff`` describe the work done.
+    """
+
+    def __init__(self, net):
+        """
+        :param net: :py:class:`~achemkit.reactionnet.ReactionNetwork` or
+                    :py:class:`~achemkit.reactionnetarray.ArrayReactionNetwork`.
+        """
+        if not isinstance(net, ArrayReactionNetwork):
+            net = ArrayReactionNetwork.from_reactionnetwork(net)
+        self.net = net
+        self.seen = net.seen
+        nspecies = len(net.seen)
+
+        #sparse stoichiometry as flat (reaction, species, change) entries
+        keep = net.change_species < nspecies
+        self._change_reaction = numpy.nonzero(keep)[0]
+        self._change_species = net.change_species[keep]
+        self._change_counts = net.change_counts[keep].astype(numpy.float64)
+
+        #padded reactant arrays, with a padding concentration of one
+        factorials = numpy.array([math.factorial(x) for x in xrange(net.maxorder + 1)], dtype=numpy.float64)
+        self._reactant_species = net.reactant_species
+        self._reactant_exponents = net.reactant_counts.astype(numpy.float64)
+        self._reactant_factorials = factorials[net.reactant_counts]
+        self._nspecies = nspecies
+
+        self.steps = 0
+        self.rejected = 0
+        self.evaluations = 0
+        self.stiff = False
+
+    def _padded(self, concentrations):
+        """
+        Internal function to append the padding concentration.
+        """
+        return numpy.append(concentrations, 1.0)
+
+    def rates(self, concentrations):
+        """
+        Rate of every reaction at the given concentrations.
+        """
+        c = self._padded(concentrations)[self._reactant_species]
+        terms = c ** self._reactant_exponents / self._reactant_factorials
+        return self.net.rates * terms.prod(axis=1)
+
+    def derivative(self, concentrations):
+        """
+        Rate of change of every concentration.
+        """
+        self.evaluations += 1
+        rates = self.rates(concentrations)
+        return numpy.bincount(self._change_species,
+                              weights=rates[self._change_reaction] * self._change_counts,
+                              minlength=self._nspecies)
+
+    def jacobian(self, concentrations):
+        """
+        Matrix of partial derivatives of :py:meth:`derivative` where entry
+        [i, j] is the derivative of species i with respect to species j.
+        """
+        c = self._padded(concentrations)[self._reactant_species]
+        exponents = self._reactant_exponents
+        terms = c ** exponents / self._reactant_factorials
+        #derivative of each reactant term with respect to its own species
+        dterms = exponents * c ** numpy.maximum(exponents - 1.0, 0.0) / self._reactant_factorials
+        #partial derivative of each reaction rate with respect to each of its
+        #reactant species is the rate constant times that derivative times the
+        #terms of its other reactant species
+        partials = numpy.empty(terms.shape)
+        for j in xrange(terms.shape[1]):
+            others = terms.copy()
+            others[:, j] = dterms[:, j]
+            partials[:, j] = others.prod(axis=1)
+        partials *= self.net.rates[:, numpy.newaxis]
+
+        #combine with every species changed by the same reaction
+        nspecies = self._nspecies
+        rows = numpy.broadcast_to(self.net.change_species[:, :, numpy.newaxis], 
+                                  self.net.change_species.shape + (terms.shape[1],))
+        columns = numpy.broadcast_to(self._reactant_species[:, numpy.newaxis, :], rows.shape)
+        values = self.net.change_counts[:, :, numpy.newaxis] * partials[:, numpy.newaxis, :]
+        jacobian = numpy.bincount((rows * (nspecies + 1) + columns).ravel(), weights=values.ravel(),
+                                  minlength=(nspecies + 1) ** 2)
+        return jacobian.reshape((nspecies + 1, nspecies + 1))[:nspecies, :nspecies]
+
+    def _norm(self, error, y0, y1, rtol, atol):
+        """
+        Internal function for the scaled root-mean-square norm of an error.
+        """
+        scale = atol + rtol * numpy.maximum(numpy.abs(y0), numpy.abs(y1))
+        return math.sqrt(numpy.mean((error / scale) ** 2)) if len(error) else 0.0
+
+    def _dopri_step(self, y, f, h):
+        """
+        Internal function for one Dormand-Prince step.
+
+        :rtype: tuple of (new y, new f, error estimate, stiffness estimate).
+        """
+        k = [f]
+        for i in xrange(1, 7):
+            yi = y + h * sum(a * kj for a, kj in zip(_DOPRI_A[i], k) if a != 0.0)
+            if i == 5:
+                y6 = yi
+            k.append(self.derivative(yi))
+        y1 = yi
+        error = h * sum(e * kj for e, kj in zip(_DOPRI_E, k) if e != 0.0)
+        #estimate of h * the largest eigenvalue, from Hairer & Wanner
+        dy = numpy.linalg.norm(y1 - y6)
+        if dy > 0.0:
+            hlambda = h * numpy.linalg.norm(k[6] - k[5]) / dy
+        else:
+            hlambda = 0.0
+        return y1, k[6], error, hlambda
+
+    def _rosenbrock_step(self, y, f, h):
+        """
+        Internal function for one ROS2 step, with the Rosenbrock-Euler method
+        as an embedded error estimate.
+
+        :rtype: tuple of (new y, new f, error estimate).
+        """
+        w = numpy.eye(self._nspecies) - _ROS2_GAMMA * h * self.jacobian(y)
+        winverse = numpy.linalg.inv(w)
+        k1 = winverse.dot(f)
+        k2 = winverse.dot(self.derivative(y + h * k1) - 2.0 * k1)
+        y1 = y + 1.5 * h * k1 + 0.5 * h * k2
+        error = 0.5 * h * (k1 + k2)
+        return y1, self.derivative(y1), error
+
+    def integrate(self, concentrations, times, method="auto", rtol=1e-6, atol=1e-9, maxsteps=1000000):
+        """
+        Integrate from the given initial concentrations.
+
+        :param concentrations: Initial concentrations, as an array in the order
+                               of ``seen`` or a dictionary of molecular species
+                               to concentration.
+        :param times: Increasing sequence of times to report concentrations at.
+                      Integration starts from the first of these.
+        :param method: "dopri" for non-stiff, "rosenbrock" for stiff, or "auto"
+                       to switch from the former to the latter if needed.
+        :param rtol: Relative error tolerance per step.
+        :param atol: Absolute error tolerance per step.
+        :param maxsteps: Maximum number of steps before giving up.
+        :rtype: Array of shape (times, species) of concentrations.
+        """
+        if method not in ("auto", "dopri", "rosenbrock"):
+            raise ValueError("unknown method ("+repr(method)+")")
+        if isinstance(concentrations, dict):
+            y = numpy.zeros(self._nspecies)
+            for mol, value in concentrations.iteritems():
+                y[self.net.index[mol]] = value
+        else:
+            y = numpy.array(concentrations, dtype=numpy.float64)
+        times = numpy.asarray(times, dtype=numpy.float64)
+        result = numpy.empty((len(times), self._nspecies))
+        if len(times) == 0:
+            return result
+        result[0] = y
+
+        self.steps = 0
+        self.rejected = 0
+        self.evaluations = 0
+        self.stiff = (method == "rosenbrock")
+        t = times[0]
+        end = times[-1]
+        f = self.derivative(y)
+        #initial step size, from Hairer, Norsett & Wanner
+        scale = atol + rtol * numpy.abs(y)
+        d0 = math.sqrt(numpy.mean((y / scale) ** 2)) if self._nspecies else 0.0
+        d1 = math.sqrt(numpy.mean((f / scale) ** 2)) if self._nspecies else 0.0
+        if d0 < 1e-5 or d1 < 1e-5:
+            h = 1e-6
+        else:
+            h = 0.01 * d0 / d1
+        h = min(h, end - t) if end > t else 0.0
+        nextout = 1
+        stiffcount = 0
+        nonstiffcount = 0
+
+        while nextout < len(times):
+            if self.steps + self.rejected >= maxsteps:
+                raise RuntimeError("too many steps ({0}) at time {1}".format(maxsteps, t))
+            h = min(h, end - t)
+            if self.stiff:
+                y1, f1, error = self._rosenbrock_step(y, f, h)
+                order = 2.0
+            else:
+                y1, f1, error, hlambda = self._dopri_step(y, f, h)
+                order = 5.0
+            norm = self._norm(error, y, y1, rtol, atol)
+            if norm <= 1.0 and numpy.all(numpy.isfinite(y1)):
+                #accepted, so interpolate any outputs within this step
+                t1 = t + h
+                while nextout < len(times) and times[nextout] <= t1:
+                    result[nextout] = _hermite(t, y, f, t1, y1, f1, times[nextout])
+                    nextout += 1
+                t, y, f = t1, y1, f1
+                self.steps += 1
+                if method == "auto" and not self.stiff:
+                    if hlambda > 3.25:
+                        nonstiffcount = 0
+                        stiffcount += 1
+                        if stiffcount >= 15:
+                            self.stiff = True
+                    else:
+                        nonstiffcount += 1
+                        if nonstiffcount >= 6:
+                            stiffcount = 0
+            else:
+                self.rejected += 1
+            if not numpy.isfinite(norm):
+                factor = 0.2
+            elif norm == 0.0:
+                factor = 5.0
+            else:
+                factor = min(5.0, max(0.2, 0.9 * norm ** (-1.0 / order)))
+            h *= factor
+            if t < end and h < 1e-14 * max(abs(t), 1.0):
+                raise RuntimeError("step size too small at time {0}".format(t))
+        return result
+
+
+def _hermite(t0, y0, f0, t1, y1, f1, t):
+    """
+    Internal function for cubic Hermite interpolation within a step.
+    """
+    h = t1 - t0
+    if h <= 0.0:
+        return y1.copy()
+    s = (t - t0) / h
+    h00 = (1 + 2 * s) * (1 - s) ** 2
+    h10 = s * (1 - s) ** 2
+    h01 = s * s * (3 - 2 * s)
+    h11 = s * s * (s - 1)
+    return h00 * y0 + h10 * h * f0 + h01 * y1 + h11 * h * f1
+
+
+def ode_timeseries(net, concentrations, time, interval=1.0, **kwargs):
+    """
+    Integrate the mass-action equations of a reaction network and return
+    the concentrations at every `interval` up to `time`.
+
+    Additional keyword arguments are passed to :py:meth:`MassActionODE.integrate`.
+
+    :rtype: dictionary of time to dictionary of molecular species to
+            concentration, suitable for
+            :py:func:`achemkit.utils.datafile.data_to_file`.
+    """
+    ode = MassActionODE(net)
+    times = numpy.arange(0.0, time + interval / 2.0, interval)
+    values = ode.integrate(concentrations, times, **kwargs)
+    data = {}
+    for t, row in zip(times, values):
+        data[float(t)] = dict(zip(ode.seen, (float(x) for x in row)))
+    return data
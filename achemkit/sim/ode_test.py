@@ -0,0 +1,71 @@
+"""
+This is the test harness for :py:mod:`achemkit.sim.ode`.
+"""
+
+import unittest
+import math
+
+import achemkit
+from achemkit import OrderedFrozenBag
+
+try:
+    import numpy
+    from achemkit.sim.ode import MassActionODE, ode_timeseries
+except ImportError:
+    numpy = None
+
+@unittest.skipIf(numpy is None, "requires NumPy")
+class TestMassActionODE(unittest.TestCase):
+    
+    def setUp(self): 
+        #reversible dimerisation
+        self.rates = {(OrderedFrozenBag(["A", "A"]), OrderedFrozenBag(["B"])):2.0,
+                      (OrderedFrozenBag(["B"]), OrderedFrozenBag(["A", "A"])):1.0}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.ode = MassActionODE(self.net)
+        
+    def test_derivative(self):
+        #A + A -> B at 2.0 * a**2 / 2
+        derivative = self.ode.derivative(numpy.array([3.0, 1.0]))
+        self.assertEqual(list(derivative), [-2 * 9.0 + 2 * 1.0, 9.0 - 1.0])
+        
+    def test_jacobian(self):
+        y = numpy.array([3.0, 1.0])
+        jacobian = self.ode.jacobian(y)
+        step = 1e-6
+        for j in xrange(2):
+            dy = numpy.zeros(2)
+            dy[j] = step
+            numeric = (self.ode.derivative(y + dy) - self.ode.derivative(y - dy)) / (2 * step)
+            for i in xrange(2):
+                self.assertAlmostEqual(jacobian[i, j], numeric[i], places=5)
+                
+    def test_equilibrium(self):
+        for method in ("dopri", "rosenbrock", "auto"):
+            values = self.ode.integrate({"A": 2.0}, [0.0, 0.5, 20.0], method=method, rtol=1e-8, atol=1e-10)
+            a, b = values[-1]
+            #mass is conserved
+            self.assertAlmostEqual(a + 2 * b, 2.0, places=4)
+            #forward and backward rates balance
+            self.assertAlmostEqual(a * a, b, places=4)
+            
+    def test_decay(self):
+        net = achemkit.ReactionNetwork({(OrderedFrozenBag(["A"]), OrderedFrozenBag([])):1.0})
+        data = ode_timeseries(net, {"A": 1.0}, 2.0, 0.5)
+        self.assertEqual(sorted(data), [0.0, 0.5, 1.0, 1.5, 2.0])
+        for t in data:
+            self.assertAlmostEqual(data[t]["A"], math.exp(-t), places=5)
+            
+    def test_stiff(self):
+        """
+        Robertson's stiff chemical kinetics problem.
+        """
+        net = achemkit.ReactionNetwork({(OrderedFrozenBag(["A"]), OrderedFrozenBag(["B"])):0.04,
+                                        (OrderedFrozenBag(["B", "B"]), OrderedFrozenBag(["B", "C"])):6e7,
+                                        (OrderedFrozenBag(["B", "C"]), OrderedFrozenBag(["A", "C"])):1e4})
+        ode = MassActionODE(net)
+        values = ode.integrate({"A": 1.0}, [0.0, 40.0], rtol=1e-5, atol=1e-10)
+        self.assertTrue(ode.stiff)
+        self.assertAlmostEqual(values[-1].sum(), 1.0, places=5)
+        #reference value from Hairer & Wanner
+        self.assertAlmostEqual(values[-1][0], 0.7158, places=3)
@@ -0,0 +1,400 @@
+"""
+Containers for the molecules held within a :py:class:`achemkit.Reactor`.
+
+Rather than storing every molecule individually, a :py:class:`Population`
+stores the number of molecules of each molecular species. Random molecules
+are drawn through a cumulative-weight (Fenwick) tree, so drawing and updating
+cost O(log S) where S is the number of molecular species, regardless of the
+total number of molecules.
+
+A :py:class:`ReactiveIndex` can additionally track how many ways each reactive
+collection of reactants can be drawn from a :py:class:`Population`, so that
+elastic collisions can be skipped over rather than simulated individually.
+"""
+
+import math
+
+class WeightTree(object):
+    """
+    Binary indexed (Fenwick) tree of non-negative weights, addressed by slot.
+
+    Supports changing the weight of a slot and finding the slot at a given
+    cumulative weight, both in O(log n) time. Slots are appended as needed;
+    the underlying storage doubles in size when full.
+    """
+    __slots__ = ["_weights", "_tree", "_size", "total"]
+
+    def __init__(self, weights=()):
+        self._weights = list(weights)
+        self._size = 1
+        while self._size < len(self._weights):
+            self._size *= 2
+        self._rebuild()
+
+    def _rebuild(self):
+        """
+        Internal function that rebuilds the tree from the slot weights in O(n).
+        """
+        tree = [0] * (self._size + 1)
+        for i, weight in enumerate(self._weights):
+            tree[i + 1] = weight
+        for i in xrange(1, self._size + 1):
+            parent = i + (i & -i)
+            if parent <= self._size:
+                tree[parent] += tree[i]
+        self._tree = tree
+        self.total = sum(self._weights)
+
+    def __len__(self):
+        return len(self._weights)
+
+    def __getitem__(self, slot):
+        return self._weights[slot]
+
+    def append(self, weight=0):
+        """
+        Add a new slot at the end of the tree with the given weight.
+
+        :rtype: index of the new slot.
+        """
+        self._weights.append(0)
+        if len(self._weights) > self._size:
+            self._size *= 2
+            self._rebuild()
+        slot = len(self._weights) - 1
+        if weight:
+            self.add(slot, weight)
+        return slot
+
+    def add(self, slot, delta):
+        """
+        Change the weight of a slot by `delta`.
+        """
+        self._weights[slot] += delta
+        self.total += delta
+        i = slot + 1
+        while i <= self._size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def set(self, slot, weight):
+        """
+        Change the weight of a slot to `weight`.
+        """
+        delta = weight - self._weights[slot]
+        if delta:
+            self.add(slot, delta)
+
+    def find(self, target):
+        """
+        Return the slot where the cumulative weight first exceeds `target`.
+
+        `target` must be at least zero and less than :py:attr:`total`.
+        """
+        slot = 0
+        step = self._size
+        while step > 0:
+            nextslot = slot + step
+            if nextslot <= self._size and self._tree[nextslot] <= target:
+                slot = nextslot
+                target -= self._tree[nextslot]
+            step //= 2
+        #rounding with float weights can walk past the last non-empty slot
+        while slot >= len(self._weights) or self._weights[slot] <= 0:
+            slot -= 1
+        return slot
+
+    def sample(self, rng):
+        """
+        Select a slot at random in proportion to its weight.
+
+        :param rng: Instance of :py:class:`random.Random`.
+        """
+        if self.total <= 0:
+            raise ValueError("no weight to sample from")
+        if isinstance(self.total, float):
+            return self.find(rng.random() * self.total)
+        else:
+            return self.find(int(rng.random() * self.total))
+
+
+class Population(object):
+    """
+    Multiset of molecules stored as molecular species and counts.
+
+    Iterating over a :py:class:`Population` gives every molecule, including
+    duplicates, so it can be used wherever a tuple of molecules was used.
+
+    Molecular species are kept in the order they were first added, rather than
+    using a dictionary, because dictionary ordering is machine-dependant and
+    would prevent reproducibility for the same random seed.
+    """
+
+    def __init__(self, mols=()):
+        """
+        :param mols: Itterable of molecules to start with.
+        """
+        self._slots = {}
+        self._species = []
+        self._counts = WeightTree()
+        for mol in mols:
+            self.add(mol)
+
+    def _slot(self, mol):
+        """
+        Internal function that gets the slot of a molecular species, creating
+        it if needed.
+        """
+        try:
+            return self._slots[mol]
+        except KeyError:
+            slot = self._counts.append(0)
+            self._slots[mol] = slot
+            self._species.append(mol)
+            return slot
+
+    def add(self, mol, count=1):
+        """
+        Add `count` molecules of species `mol`.
+        """
+        self._counts.add(self._slot(mol), count)
+
+    def update(self, mols):
+        """
+        Add each molecule in an itterable of molecules.
+        """
+        for mol in mols:
+            self._counts.add(self._slot(mol), 1)
+
+    def remove(self, mol, count=1):
+        """
+        Remove `count` molecules of species `mol`.
+
+        Raises :py:class:`ValueError` if there are not enough to remove.
+        """
+        slot = self._slots.get(mol)
+        if slot is None or self._counts[slot] < count:
+            raise ValueError("not enough {0} to remove".format(repr(mol)))
+        self._counts.add(slot, -count)
+
+    def count(self, mol):
+        """
+        Number of molecules of species `mol`.
+        """
+        slot = self._slots.get(mol)
+        if slot is None:
+            return 0
+        return self._counts[slot]
+
+    @property
+    def species(self):
+        """
+        Tuple of all molecular species with at least one molecule, in the
+        order they were first added.
+        """
+        return tuple(mol for mol in self._species if self._counts[self._slots[mol]] > 0)
+
+    def counts(self):
+        """
+        Dictionary of molecular species to number of molecules.
+        """
+        return dict((mol, self._counts[self._slots[mol]]) for mol in self.species)
+
+    def slots(self):
+        """
+        Every molecular species that has been added, in the order they were
+        first added, and the number of molecules of each, including species
+        with none left.
+
+        :rtype: tuple of (list of molecular species, list of numbers).
+        """
+        return list(self._species), list(self._counts._weights)
+
+    @classmethod
+    def from_slots(cls, species, counts):
+        """
+        Create a population from the output of :py:meth:`slots`, which draws
+        the same molecules as the original for the same random numbers.
+        """
+        population = cls()
+        population._species = list(species)
+        population._slots = dict((mol, slot) for slot, mol in enumerate(population._species))
+        population._counts = WeightTree(counts)
+        return population
+
+    def choice(self, rng):
+        """
+        Pick a single molecule at random without removing it.
+
+        :param rng: Instance of :py:class:`random.Random`.
+        """
+        return self._species[self._counts.sample(rng)]
+
+    def take(self, count, rng):
+        """
+        Remove `count` molecules chosen uniformly at random and return them as
+        a tuple in the order they were chosen.
+
+        :param rng: Instance of :py:class:`random.Random`.
+        """
+        if count > len(self):
+            raise ValueError("not enough molecules to take {0}".format(count))
+        taken = []
+        for i in xrange(count):
+            slot = self._counts.sample(rng)
+            self._counts.add(slot, -1)
+            taken.append(self._species[slot])
+        return tuple(taken)
+
+    def sample(self, count, rng):
+        """
+        Choose `count` molecules uniformly at random without replacement, but
+        leave them in the population.
+
+        :param rng: Instance of :py:class:`random.Random`.
+        """
+        taken = self.take(count, rng)
+        self.update(taken)
+        return taken
+
+    def __len__(self):
+        return self._counts.total
+
+    def __contains__(self, mol):
+        return self.count(mol) > 0
+
+    def __iter__(self):
+        for slot, mol in enumerate(self._species):
+            for i in xrange(self._counts[slot]):
+                yield mol
+
+    def __repr__(self):
+        return "{0}({1})".format(self.__class__.__name__, repr(tuple(self)))
+
+
+def choose(n, k):
+    """
+    Number of ways to choose `k` items from `n` items, as an integer.
+    """
+    if k < 0 or k > n:
+        return 0
+    ways = 1
+    for i in xrange(k):
+        ways = (ways * (n - i)) // (i + 1)
+    return ways
+
+
+class ReactiveIndex(object):
+    """
+    Tracks the number of ways each reactive collection of reactants can be
+    drawn from a :py:class:`Population`.
+
+    Any collision between reactants not in this index is assumed to be
+    elastic. This is used to jump directly to the next reactive collision,
+    see :py:meth:`next_reactive`.
+    """
+
+    def __init__(self, population, reactants):
+        """
+        :param population: :py:class:`Population` to track.
+        :param reactants: Itterable of reactant collections that may react, e.g.
+                          from :py:meth:`achemkit.achem.AChem.reactive_reactants`.
+        """
+        self.population = population
+        self._trees = {}
+        self._entries = []
+        self._byspecies = {}
+        seen = set()
+        for bag in reactants:
+            key = tuple(sorted(bag))
+            if key in seen:
+                continue
+            seen.add(key)
+            multiplicities = {}
+            for mol in key:
+                multiplicities[mol] = multiplicities.get(mol, 0) + 1
+            size = len(key)
+            if size not in self._trees:
+                self._trees[size] = WeightTree()
+            slot = self._trees[size].append(0)
+            index = len(self._entries)
+            self._entries.append((key, tuple(multiplicities.items()), size, slot))
+            for mol in multiplicities:
+                self._byspecies.setdefault(mol, []).append(index)
+        self._bysizeslot = dict(((size, slot), index) for index, (key, multiplicities, size, slot) in enumerate(self._entries))
+        self.refresh(self._byspecies.keys())
+
+    def _ways(self, multiplicities):
+        """
+        Internal function for the number of ways to draw the given species
+        multiplicities from the population.
+        """
+        ways = 1
+        for mol, count in multiplicities:
+            ways *= choose(self.population.count(mol), count)
+            if ways == 0:
+                break
+        return ways
+
+    def refresh(self, mols):
+        """
+        Update the reactive collections involving any of the provided
+        molecular species. Must be called after the population changes.
+        """
+        indexes = set()
+        for mol in mols:
+            indexes.update(self._byspecies.get(mol, ()))
+        for index in indexes:
+            key, multiplicities, size, slot = self._entries[index]
+            self._trees[size].set(slot, self._ways(multiplicities))
+
+    def probability(self, size):
+        """
+        Probability that a collision of `size` random molecules is reactive.
+        """
+        if size not in self._trees:
+            return 0.0
+        total = choose(len(self.population), size)
+        if total == 0:
+            return 0.0
+        return self._trees[size].total / float(total)
+
+    def next_reactive(self, sizes, rng):
+        """
+        Determine how many elastic collisions happen before the next reactive
+        collision, and which reactants take part in it.
+
+        The reactants are not removed from the population.
+
+        :param sizes: Dictionary of number of reactants to probability of a
+                      collision having that many, e.g. from
+                      :py:func:`achemkit.utils.utils.get_probabilities`.
+        :param rng: Instance of :py:class:`random.Random`.
+        :rtype: tuple of (number of elastic collisions, tuple of reactants).
+                If no reactive collision is possible, returns (None, None).
+        """
+        weights = {}
+        for size in sizes:
+            weight = sizes[size] * self.probability(size)
+            if weight > 0.0:
+                weights[size] = weight
+        p = sum(weights.values())
+        if p <= 0.0:
+            return None, None
+        if p >= 1.0:
+            skipped = 0
+        else:
+            #geometric distribution of failures before the first success
+            skipped = int(math.log(1.0 - rng.random()) / math.log(1.0 - p))
+
+        target = rng.random() * p
+        for size in sorted(weights):
+            target -= weights[size]
+            if target < 0.0:
+                break
+        slot = self._trees[size].sample(rng)
+        key = self._entries[self._bysizeslot[size, slot]][0]
+        #molecules are drawn in a random order
+        reactants = list(key)
+        rng.shuffle(reactants)
+        return skipped, tuple(reactants)
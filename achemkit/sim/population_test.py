@@ -0,0 +1,175 @@
+"""
+This is the test harness for :py:mod:`achemkit.sim.population`.
+
+Includes statistical comparisons against the tuple-based sampling that the
+pair-sampling reactors used previously.
+"""
+
+import unittest
+import random
+
+import achemkit
+from achemkit import OrderedFrozenBag
+from achemkit.sim.population import Population, WeightTree, ReactiveIndex
+
+def tuple_take(mols, count, rng):
+    """
+    Reference implementation of taking molecules from a tuple, as previously
+    done by :py:class:`achemkit.ReactorGillespieLike`.
+    """
+    reactants = rng.sample(mols, count)
+    for x in reactants:
+        i = mols.index(x)
+        mols = mols[:i] + mols[i+1:]
+    return mols, tuple(reactants)
+
+def tuple_itterative(achem, mols, steps, rng):
+    """
+    Reference implementation of the reaction loop previously used by
+    :py:class:`achemkit.ReactorItterative`.
+    """
+    mols = tuple(mols)
+    for i in xrange(steps):
+        mols = tuple(rng.sample(mols, len(mols)))
+        reactants = OrderedFrozenBag(mols[:2])
+        mols = mols[2:]
+        mols += tuple(achem.react(reactants))
+    return mols
+
+def frequencies(items):
+    freqs = {}
+    for item in items:
+        freqs[item] = freqs.get(item, 0) + 1
+    total = float(len(items))
+    return dict((item, freqs[item] / total) for item in freqs)
+
+class TestWeightTree(unittest.TestCase):
+
+    def test_find(self):
+        tree = WeightTree((3, 0, 2, 5))
+        self.assertEqual(tree.total, 10)
+        self.assertEqual([tree.find(x) for x in xrange(10)], [0, 0, 0, 2, 2, 3, 3, 3, 3, 3])
+
+    def test_append(self):
+        tree = WeightTree()
+        for i in xrange(10):
+            tree.append(i)
+        self.assertEqual(tree.total, 45)
+        self.assertEqual(tree.find(0), 1)
+        self.assertEqual(tree.find(44), 9)
+        tree.set(9, 0)
+        self.assertEqual(tree.find(35), 8)
+
+    def test_float(self):
+        tree = WeightTree((0.1, 0.2, 0.0))
+        self.assertEqual(tree.find(0.05), 0)
+        self.assertEqual(tree.find(0.3), 1)
+
+
+class TestPopulation(unittest.TestCase):
+
+    def setUp(self):
+        self.mols = ("A",)*10 + ("B",)*5 + ("C",)*3
+        self.pop = Population(self.mols)
+        self.rng = random.Random(42)
+
+    def test_counts(self):
+        self.assertEqual(len(self.pop), len(self.mols))
+        self.assertEqual(self.pop.counts(), {"A":10, "B":5, "C":3})
+        self.assertEqual(tuple(self.pop), self.mols)
+        self.assertEqual(self.pop.species, ("A", "B", "C"))
+
+    def test_remove(self):
+        self.pop.remove("C", 3)
+        self.assertTrue("C" not in self.pop)
+        self.assertEqual(self.pop.species, ("A", "B"))
+        self.assertRaises(ValueError, self.pop.remove, "C")
+        self.assertRaises(ValueError, self.pop.remove, "D")
+
+    def test_take(self):
+        taken = self.pop.take(5, self.rng)
+        self.assertEqual(len(taken), 5)
+        self.assertEqual(len(self.pop), len(self.mols) - 5)
+        self.pop.update(taken)
+        self.assertEqual(tuple(self.pop), self.mols)
+        self.assertRaises(ValueError, self.pop.take, len(self.mols)+1, self.rng)
+
+    def test_slots(self):
+        self.pop.remove("B", 5)
+        self.assertEqual(self.pop.slots(), (["A", "B", "C"], [10, 0, 3]))
+        copy = Population.from_slots(*self.pop.slots())
+        self.assertEqual(copy.counts(), self.pop.counts())
+        self.assertEqual(copy.take(5, random.Random(1)), self.pop.take(5, random.Random(1)))
+        copy.add("D")
+        self.assertEqual(copy.slots()[0], ["A", "B", "C", "D"])
+        self.assertEqual(copy.count("D"), 1)
+
+    def test_take_equivalence(self):
+        """
+        Pairs taken from a :py:class:`Population` should be distributed as
+        pairs taken from a tuple.
+        """
+        repeats = 20000
+        pairs = [OrderedFrozenBag(self.pop.sample(2, self.rng)) for i in xrange(repeats)]
+        reference = [OrderedFrozenBag(tuple_take(self.mols, 2, self.rng)[1]) for i in xrange(repeats)]
+        pairs = frequencies(pairs)
+        reference = frequencies(reference)
+        self.assertEqual(set(pairs), set(reference))
+        for pair in reference:
+            self.assertAlmostEqual(pairs[pair], reference[pair], delta=0.02)
+
+
+class TestReactiveIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.pop = Population(("A",)*10 + ("B",)*5 + ("C",)*3)
+        self.index = ReactiveIndex(self.pop, (OrderedFrozenBag(("A", "B")), OrderedFrozenBag(("C", "C"))))
+        self.rng = random.Random(42)
+
+    def test_probability(self):
+        self.assertAlmostEqual(self.index.probability(2), (10*5 + 3) / (18*17/2.0))
+        self.assertEqual(self.index.probability(3), 0.0)
+
+    def test_refresh(self):
+        self.pop.remove("C", 2)
+        self.index.refresh(("C",))
+        self.assertAlmostEqual(self.index.probability(2), (10*5) / (16*15/2.0))
+        self.pop.remove("B", 5)
+        self.index.refresh(("B",))
+        self.assertEqual(self.index.next_reactive({2:1.0}, self.rng), (None, None))
+
+    def test_next_reactive(self):
+        reactants = [OrderedFrozenBag(self.index.next_reactive({2:1.0}, self.rng)[1]) for i in xrange(5000)]
+        reactants = frequencies(reactants)
+        self.assertAlmostEqual(reactants[OrderedFrozenBag(("A", "B"))], 50 / 53.0, delta=0.02)
+
+
+class TestReactorEquivalence(unittest.TestCase):
+
+    def setUp(self):
+        self.rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])):1.0}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.mols = ("A",)*10 + ("B",)*10
+        self.achem = achemkit.AChemReactionNetwork(self.net)
+        self.rng = random.Random(42)
+
+    def test_itterative(self):
+        """
+        Mean number of C after a fixed number of steps should match the
+        tuple-based implementation.
+        """
+        repeats = 300
+        steps = 10
+        found = []
+        expected = []
+        for i in xrange(repeats):
+            reactor = achemkit.ReactorItterative(self.achem, self.mols, self.rng)
+            events = tuple(reactor.do(steps))
+            found.append(reactor.mols.count("C"))
+            mols = tuple_itterative(self.achem, self.mols, len(events), self.rng)
+            expected.append(mols.count("C"))
+        self.assertEqual(len(reactor.mols), len(self.mols))
+        self.assertAlmostEqual(sum(found) / float(repeats), sum(expected) / float(repeats), delta=0.5)
+
+if __name__=="__main__":
+    unittest.main()
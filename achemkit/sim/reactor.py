@@ -8,21 +8,47 @@ Rather than using this directly, subclasses should be created that implement
 and :py:class:`achemkit.ReactorStepwise` for examples.
 """
 
+import gzip
+import itertools
 import collections
-
-import umpf
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle as pickle
 
 from achemkit import OrderedFrozenBag
+from achemkit.bucket import EventBatch
+from achemkit.sim import checkpoint
     
 class Reactor(object):
     """
     Abstract class that defines common features useful for mixing algorithms.
+    
+    If ``checkpointer`` is set to a 
+    :py:class:`achemkit.sim.checkpoint.Checkpointer`, reactors that support
+    :py:meth:`get_state` checkpoint themselves while :py:meth:`do` runs.
+    
+    If ``limits`` is set to a :py:class:`achemkit.sim.limits.RunLimits`, 
+    :py:meth:`do` may stop early, with the reason in ``stopreason``. This is 
+    None if the last call of :py:meth:`do` stopped for any other reason.
+    
+    If ``instrumentation`` is set, by 
+    :py:meth:`achemkit.sim.instrument.Instrumentation.attach`, :py:meth:`do`
+    reports its progress to it.
+    
+    If ``replay`` is set to a :py:class:`achemkit.sim.replay.ReplayRecorder`,
+    :py:meth:`do` records markers that events can later be replayed from.
     """
     def __init__(self, achem, mols):
         """
         :param achem: py:class:`achemkit.achem.AChem` object or equivalent.
         :param mols: Initial molecules
         """
+        self.checkpointer = None
+        self.limits = None
+        self.stopreason = None
+        self.instrumentation = None
+        self.replay = None
         self.achem = achem
         self.mols = mols
             
@@ -32,6 +58,206 @@ class Reactor(object):
         take parameters as needed.
         """
         raise NotImplementedError, "Reactor is an abstract class"
+        
+    def run(self, time, sink, batchsize=None, columnar=False):
+        """
+        Simulate as :py:meth:`do` does, but pass every reaction to an event 
+        sink rather than yielding :py:class:`achemkit.Event` objects.
+        
+        :param time: As for :py:meth:`do`.
+        :param sink: :py:class:`achemkit.sim.sink.Sink` or equivalent, such as 
+                     a :py:class:`achemkit.sim.sink.MultiSink` to feed several
+                     at once. It is not closed at the end.
+        :param batchsize: If given, pass reactions to the sink in batches of
+                          this many from :py:meth:`do_batches`.
+        :param columnar: As for :py:meth:`do_batches`.
+        :rtype: number of reactions.
+        """
+        count = 0
+        if batchsize is not None:
+            batch = sink.batch
+            for reactions in self.do_batches(time, batchsize, columnar):
+                batch(reactions)
+                count += len(reactions)
+            return count
+        event = sink.event
+        for reaction in self._reactions(time):
+            event(*reaction)
+            count += 1
+        return count
+        
+    def do_batches(self, time, batchsize=10000, columnar=False):
+        """
+        Simulate as :py:meth:`do` does, but yield reactions in batches 
+        rather than one :py:class:`achemkit.Event` at a time. The last batch
+        may be smaller.
+        
+        :param time: As for :py:meth:`do`.
+        :param batchsize: Number of reactions in each batch.
+        :param columnar: If True, each batch is an 
+                         :py:class:`achemkit.bucket.EventBatch` of times and 
+                         reaction ids. Otherwise each batch is a list of tuples 
+                         of (time, reactants, products, rate constant).
+        :rtype: yields lists or :py:class:`achemkit.bucket.EventBatch` objects.
+        """
+        reactions = self._reactions(time)
+        if not columnar:
+            while True:
+                batch = list(itertools.islice(reactions, batchsize))
+                if not batch:
+                    return
+                yield batch
+        #reaction ids by reaction as given, then by reaction regardless of order
+        ids = {}
+        canonical = {}
+        table = []
+        while True:
+            times = []
+            batchids = []
+            for eventtime, reactants, products, rateconstant in itertools.islice(reactions, batchsize):
+                key = (tuple(reactants), tuple(products), rateconstant)
+                i = ids.get(key)
+                if i is None:
+                    reaction = (OrderedFrozenBag(reactants), OrderedFrozenBag(products), rateconstant)
+                    i = canonical.get(reaction)
+                    if i is None:
+                        i = len(table)
+                        canonical[reaction] = i
+                        table.append(reaction)
+                    ids[key] = i
+                times.append(eventtime)
+                batchids.append(i)
+            if not times:
+                return
+            yield EventBatch(table, times, batchids)
+        
+    def _reactions(self, time):
+        """
+        Internal function to simulate as :py:meth:`do` does, yielding tuples of
+        (time, reactants, products, rate constant) rather than 
+        :py:class:`achemkit.Event` objects.
+        
+        Subclasses can override this, and implement :py:meth:`do` with it, to
+        avoid creating an :py:class:`achemkit.Event` for every reaction when
+        :py:meth:`run` is used.
+        """
+        for e in self.do(time):
+            yield e.time, e.reactants, e.products, e.rateconstant
+        
+    def get_state(self):
+        """
+        Compact description of the current state of this reactor, without the
+        :py:class:`achemkit.achem.AChem` or other settings given when it was 
+        created. 
+        
+        This is an abstract method that should be implemented by subclasses
+        that support checkpoints. The state must be a dictionary of picklable
+        values that are not shared with the reactor, and lists or sets of
+        molecular species or counts should be used where possible so that
+        :py:func:`achemkit.sim.checkpoint.diff_state` can describe changes
+        to them compactly.
+        
+        :rtype: dictionary of names to values.
+        """
+        raise NotImplementedError, "{0} does not support checkpoints".format(self.__class__.__name__)
+        
+    def set_state(self, state):
+        """
+        Replace the state of this reactor with one from :py:meth:`get_state`.
+        
+        This is an abstract method that should be implemented by subclasses
+        that support checkpoints.
+        """
+        raise NotImplementedError, "{0} does not support checkpoints".format(self.__class__.__name__)
+        
+    def resume(self, filename):
+        """
+        Replace the state of this reactor with the latest checkpoint written
+        by a :py:class:`achemkit.sim.checkpoint.Checkpointer`.
+        
+        The reactor should have been created with the same 
+        :py:class:`achemkit.achem.AChem` and settings as the one that was 
+        checkpointed. The end time of the interrupted call of :py:meth:`do`
+        is restored, so calling ``do(0)`` finishes it.
+        
+        :param filename: Name of the checkpoint file.
+        """
+        checkpointed = checkpoint.read_checkpoint(filename)
+        if checkpointed is None:
+            raise ValueError("no checkpoint in "+repr(filename))
+        classname, state = checkpointed
+        if classname != self.__class__.__name__:
+            raise ValueError("checkpoint is of a {0} not a {1}".format(classname, self.__class__.__name__))
+        self.set_state(state)
+        
+    def add_mols(self, mols):
+        """
+        Add molecules to this reactor, e.g. migrating from another.
+        
+        This is an abstract method that should be implemented by subclasses
+        that support it.
+        """
+        raise NotImplementedError, "{0} does not support adding molecules".format(self.__class__.__name__)
+        
+    def take_mols(self, count, rng):
+        """
+        Remove `count` molecules chosen uniformly at random from this reactor.
+        
+        This is an abstract method that should be implemented by subclasses
+        that support it.
+        
+        :param rng: Instance of :py:class:`random.Random`.
+        :rtype: tuple of molecules removed.
+        """
+        raise NotImplementedError, "{0} does not support taking molecules".format(self.__class__.__name__)
+        
+    def population_size(self):
+        """
+        Number of molecules in this reactor.
+        """
+        return len(self.mols)
+        
+    def fingerprint(self):
+        """
+        Hash of the number of molecules of each molecular species, that is 
+        the same whenever the populations are.
+        """
+        counts = collections.defaultdict(int)
+        for mol in self.mols:
+            counts[mol] += 1
+        return hash(frozenset(counts.iteritems()))
+        
+    def _begin(self):
+        """
+        Internal function called by :py:meth:`do` when it starts.
+        """
+        self.stopreason = None
+        if self.limits is not None:
+            self.limits.start()
+        if self.instrumentation is not None:
+            self.instrumentation.start()
+        
+    def _tick(self):
+        """
+        Internal function called by :py:meth:`do` at points where the state 
+        is consistent, to give the checkpointer a chance to save it, count
+        progress and check any limits.
+        
+        :rtype: True if :py:meth:`do` should stop.
+        """
+        if self.checkpointer is not None:
+            self.checkpointer.tick(self)
+        if self.instrumentation is not None:
+            self.instrumentation.tick(self)
+        if self.limits is not None:
+            self.stopreason = self.limits.check(self)
+            if self.stopreason is not None:
+                return True
+        #only counted if this event goes ahead, so stopping and continuing
+        #does not count it twice
+        if self.replay is not None:
+            self.replay.tick(self)
+        return False
     
     def to_disk(self, filename):
         """
@@ -39,7 +265,9 @@ class Reactor(object):
         
         :param filename: Name of file to write to.
         """
-        pickle.dump(self, open(filename, "w+b"), 2)
+        outfile = open(filename, "wb")
+        pickle.dump(self, outfile, 2)
+        outfile.close()
         
     def to_disk_gz(self, filename):
         """
@@ -48,7 +276,9 @@ class Reactor(object):
         
         :param filename: Name of file to write to.
         """
-        pickle.dump(self, gzip.GzipFile(filename+".gz", "w+b"), 2)
+        outfile = gzip.GzipFile(filename+".gz", "wb")
+        pickle.dump(self, outfile, 2)
+        outfile.close()
         
     @staticmethod
     def from_disk(filename):
@@ -58,7 +288,7 @@ class Reactor(object):
         
         :param filename: Path to read from.
         """
-        return pickle.load(open(filename, "r+b"))
+        return pickle.load(open(filename, "rb"))
             
     @staticmethod
     def from_disk_gz(filename):
@@ -68,5 +298,5 @@ class Reactor(object):
         
         :param filename: Path to read from.
         """
-        return pickle.load(gzip.GzipFile(filename+".gz", "r+b"))
+        return pickle.load(gzip.GzipFile(filename+".gz", "rb"))
     
@@ -1,6 +1,78 @@
+import random
 import unittest
 
+import achemkit
 import achemkit.sim.reactor
+from achemkit import OrderedFrozenBag
+from achemkit.bucket import EventBatch
+from achemkit.sim.executor import PoolExecutor
 
-class TestDummy(unittest.TestCase):
-    pass
+class TestBatches(unittest.TestCase):
+
+    def setUp(self):
+        rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])): 1.0,
+                 (OrderedFrozenBag(["C", "C"]), OrderedFrozenBag(["A"])): 1.0}
+        self.achem = achemkit.AChemReactionNetwork(achemkit.ReactionNetwork(rates))
+        self.mols = ["A"] * 20 + ["B"] * 10 + ["C"] * 10
+        self.events = list(self.reactor().do(100))
+
+    def reactor(self):
+        return achemkit.ReactorItterative(self.achem, self.mols, 42)
+
+    def test_lists(self):
+        batches = list(self.reactor().do_batches(100, 30))
+        self.assertEqual([len(batch) for batch in batches[:-1]], [30] * (len(batches) - 1))
+        self.assertEqual(achemkit.Bucket.from_batches(batches).events, self.events)
+
+    def test_columnar(self):
+        batches = list(self.reactor().do_batches(100, 30, columnar=True))
+        for batch in batches:
+            self.assertTrue(isinstance(batch, EventBatch))
+            #every batch shares the table of reactions
+            self.assertTrue(batch.reactions is batches[0].reactions)
+        self.assertEqual(sum((batch.events() for batch in batches), []), self.events)
+        #reactions in a different order have the same id
+        table = batches[0].reactions
+        self.assertEqual(len(table), len(set((r, p) for r, p, k in table)))
+
+    def test_fallback(self):
+        #reactors without their own _reactions use do
+        reactor = achemkit.ReactorEnumerate(self.achem, ["A", "B"])
+        events = [achemkit.Event(*reaction) for batch in reactor.do_batches(10, 2) for reaction in batch]
+        self.assertEqual(events, list(achemkit.ReactorEnumerate(self.achem, ["A", "B"]).do(10)))
+
+
+class TestDivergent(unittest.TestCase):
+
+    def setUp(self):
+        #competing products, so outcomes are random
+        rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["A", "C"])): 1.0,
+                 (OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])): 1.0,
+                 (OrderedFrozenBag(["A", "C"]), OrderedFrozenBag(["A", "B"])): 1.0,
+                 (OrderedFrozenBag(["A", "C"]), OrderedFrozenBag(["C", "C"])): 1.0}
+        self.achem = achemkit.AChemReactionNetwork(achemkit.ReactionNetwork(rates))
+        self.mols = ["A"] * 20 + ["B"] * 20
+
+    def events(self, reactorclass, globalseed, **kwargs):
+        #the shared generator of the random module must not matter
+        random.seed(globalseed)
+        return list(reactorclass(self.achem, self.mols, 42, **kwargs).do(50))
+
+    def test_reactors(self):
+        for reactorclass in (achemkit.ReactorItterative, achemkit.ReactorGillespieLike,
+                             achemkit.ReactorStepwise):
+            self.assertEqual(self.events(reactorclass, 1), self.events(reactorclass, 2))
+        self.assertEqual(self.events(achemkit.ReactorItterative, 1, skipelastic=True),
+                         self.events(achemkit.ReactorItterative, 2, skipelastic=True))
+
+    def test_cached(self):
+        cached = achemkit.CachedAChem(self.achem)
+        random.seed(1)
+        events = list(achemkit.ReactorItterative(cached, self.mols, 42).do(50))
+        self.assertEqual(events, self.events(achemkit.ReactorItterative, 2))
+
+    def test_executor(self):
+        serial = self.events(achemkit.ReactorStepwise, 1, batchsize=3)
+        with PoolExecutor(2) as executor:
+            parallel = self.events(achemkit.ReactorStepwise, 2, batchsize=3, executor=executor)
+        self.assertEqual(serial, parallel)
@@ -0,0 +1,140 @@
+"""
+Recording of the number of molecules of each molecular species over time
+during a simulation, using NumPy (http://numpy.scipy.org/).
+
+Unlike :py:meth:`achemkit.Bucket.get_mol_counts`, which re-derives
+populations from the whole event history afterwards, a
+:py:class:`PopulationRecorder` is an event sink (see
+:py:mod:`achemkit.sim.sink`) that keeps the current populations as reactions
+happen and copies them into a preallocated array when a sample is due. The
+array grows geometrically, in both samples and molecular species, so the cost
+of recording is a row copy per sample.
+
+For example::
+
+    recorder = PopulationRecorder(mols, interval=10.0)
+    reactor.run(1000, recorder)
+    recorder.finish(1000)
+    recorder.to_file(open("populations.txt", "w"))
+"""
+
+import numpy
+
+from achemkit.sim.sink import IntervalSink
+from achemkit.utils.datafile import data_to_file
+
+class PopulationRecorder(IntervalSink):
+    """
+    Event sink that records populations every `interval` units of time, or
+    whenever they change.
+
+    After recording, ``times`` is an array of the time of each sample and
+    ``populations`` is an array of shape (samples, species) of the number of
+    molecules of each molecular species in ``species`` at that time. With an
+    interval, the sample at each multiple of the interval includes all
+    reactions up to and including that time, as for
+    :py:class:`achemkit.sim.sink.PopulationSink`.
+    """
+
+    def __init__(self, mols, interval=None, end=None, capacity=1024):
+        """
+        :param mols: Initial molecules.
+        :param interval: Time between samples from time zero. If None, a sample
+                         is recorded after every reaction that changes the
+                         populations, i.e. that is not elastic.
+        :param end: If given, no samples are recorded after this time.
+        :param capacity: Number of samples to allocate room for initially.
+        """
+        super(PopulationRecorder, self).__init__(interval, end)
+        self.species = []
+        self.index = {}
+        self._counts = numpy.zeros(16, dtype=numpy.int64)
+        self._times = numpy.empty(max(capacity, 1))
+        self._data = numpy.zeros((max(capacity, 1), 16), dtype=numpy.int64)
+        self._size = 0
+        for mol in mols:
+            self._counts[self._column(mol)] += 1
+        if interval is None:
+            self._sample(0.0)
+
+    def _column(self, mol):
+        """
+        Internal function to get the column of a molecular species, adding it
+        if needed.
+        """
+        try:
+            return self.index[mol]
+        except KeyError:
+            column = len(self.species)
+            if column >= len(self._counts):
+                #grow geometrically, new species had none before
+                self._counts = numpy.concatenate((self._counts, numpy.zeros_like(self._counts)))
+                self._data = numpy.concatenate((self._data, numpy.zeros_like(self._data)), axis=1)
+            self.index[mol] = column
+            self.species.append(mol)
+            return column
+
+    def _sample(self, time):
+        """
+        Internal function to record the current populations as a sample.
+        """
+        if self._size >= len(self._times):
+            self._times = numpy.concatenate((self._times, numpy.empty_like(self._times)))
+            self._data = numpy.concatenate((self._data, numpy.zeros_like(self._data)))
+        self._times[self._size] = time
+        self._data[self._size] = self._counts
+        self._size += 1
+
+    def record(self, time, populations=None):
+        """
+        Record a sample now, regardless of the interval.
+
+        :param time: Time of the sample.
+        :param populations: If given, dictionary of molecular species to
+                            number of molecules to use as the current
+                            populations, e.g. from a reactor that does not
+                            report every reaction.
+        """
+        if populations is not None:
+            self._counts[:] = 0
+            for mol, count in populations.iteritems():
+                self._counts[self._column(mol)] = count
+        self._sample(time)
+
+    def event(self, time, reactants, products, rateconstant=None):
+        self._sample_before(time)
+        #columns may be added, which replaces the counts array
+        for mol in reactants:
+            column = self._column(mol)
+            self._counts[column] -= 1
+        for mol in products:
+            column = self._column(mol)
+            self._counts[column] += 1
+        if self.interval is None and sorted(reactants) != sorted(products):
+            self._sample(time)
+
+    @property
+    def times(self):
+        return self._times[:self._size]
+
+    @property
+    def populations(self):
+        return self._data[:self._size, :len(self.species)]
+
+    def data(self):
+        """
+        Samples as a dictionary of time to dictionary of molecular species to
+        number of molecules, as for :py:meth:`achemkit.Bucket.get_mol_counts`.
+        If several samples have the same time, the last is used.
+        """
+        data = {}
+        for time, row in zip(self.times, self.populations):
+            data[float(time)] = dict(zip(self.species, (int(x) for x in row)))
+        return data
+
+    def to_file(self, outfile):
+        """
+        Write the samples to a file with
+        :py:func:`achemkit.utils.datafile.data_to_file`.
+        """
+        data_to_file(self.data(), outfile)
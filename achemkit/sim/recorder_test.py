@@ -0,0 +1,69 @@
+"""
+This is the test harness for :py:mod:`achemkit.sim.recorder`.
+
+"""
+
+import unittest
+import StringIO
+
+import achemkit
+from achemkit import OrderedFrozenBag
+from achemkit.sim.sink import PopulationSink
+from achemkit.utils.datafile import data_from_file
+
+try:
+    import numpy
+    from achemkit.sim.recorder import PopulationRecorder
+except ImportError:
+    numpy = None
+
+@unittest.skipIf(numpy is None, "requires NumPy")
+class TestPopulationRecorder(unittest.TestCase):
+
+    def setUp(self):
+        rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])): 1.0,
+                 (OrderedFrozenBag(["C", "C"]), OrderedFrozenBag(["A", "D"])): 1.0}
+        self.achem = achemkit.AChemReactionNetwork(achemkit.ReactionNetwork(rates))
+        self.mols = ["A"] * 20 + ["B"] * 10
+
+    def reactor(self):
+        return achemkit.ReactorItterative(self.achem, self.mols, 42)
+
+    def test_interval(self):
+        #small capacity so the buffer has to grow
+        recorder = PopulationRecorder(self.mols, 10.0, capacity=2)
+        self.reactor().run(300, recorder)
+        recorder.finish(300)
+        reference = PopulationSink(self.mols, 10.0)
+        self.reactor().run(300, reference)
+        reference.finish(300)
+        self.assertEqual(list(recorder.times), sorted(reference.data))
+        for time, populations in recorder.data().iteritems():
+            for mol in recorder.species:
+                self.assertEqual(populations[mol], reference.data[time].get(mol, 0))
+        self.assertEqual(recorder.populations.shape, (31, 4))
+
+    def test_change(self):
+        recorder = PopulationRecorder(self.mols)
+        events = list(self.reactor().do(300))
+        recorder.batch((e.time, e.reactants, e.products, e.rateconstant) for e in events)
+        changes = [e for e in events if e.reactants != e.products]
+        self.assertEqual(len(recorder.times), len(changes) + 1)
+        self.assertEqual(list(recorder.times[1:]), [e.time for e in changes])
+        #the total number of molecules is conserved by these reactions
+        self.assertTrue((recorder.populations.sum(axis=1) == len(self.mols)).all())
+
+    def test_record(self):
+        recorder = PopulationRecorder(["A"], 1.0)
+        recorder.record(0.5, {"A": 3, "B": 2})
+        self.assertEqual(recorder.data(), {0.5: {"A": 3, "B": 2}})
+
+    def test_file(self):
+        recorder = PopulationRecorder(self.mols, 50.0)
+        self.reactor().run(100, recorder)
+        recorder.finish(100)
+        outfile = StringIO.StringIO()
+        recorder.to_file(outfile)
+        data = data_from_file(StringIO.StringIO(outfile.getvalue()))
+        self.assertEqual(sorted(data), ["0.0", "100.0", "50.0"])
+        self.assertEqual(data["0.0"]["A"], "20")
@@ -0,0 +1,168 @@
+"""
+Deterministic replay of part of a long simulation, without running it again
+from the start.
+
+A :py:class:`ReplayRecorder` assigned to the ``replay`` attribute of a
+:py:class:`achemkit.Reactor` records a marker every `every` events: the number
+of the event, the time, and the compact state of the reactor from
+:py:meth:`achemkit.Reactor.get_state`, which includes the state of its random
+number generator. Events are numbered from zero in the order the reactor
+reaches them, counting each reaction (or step, for stepwise reactors) as
+:py:class:`achemkit.sim.limits.RunLimits` does. For
+:py:class:`achemkit.ReactorItterative` and
+:py:class:`achemkit.ReactorGillespieLike` without skipping elastic collisions
+this is the position of the event in the output of
+:py:meth:`achemkit.Reactor.do`.
+
+:py:func:`replay` then restores the nearest marker at or before an event and
+simulates only from there, so the cost of reaching any event is at most
+`every` events. The replay runs on past the end of the call of
+:py:meth:`achemkit.Reactor.do` the marker was recorded in, so it also reaches
+events of later calls. Reactors whose steps depend on the time left in a call,
+such as :py:class:`achemkit.sim.hybrid.ReactorHybrid` or
+:py:class:`achemkit.ReactorItterative` skipping elastic collisions, are not
+replayed exactly across the end of a call.
+
+For example::
+
+    reactor = achemkit.ReactorItterative(achem, mols, 42)
+    reactor.replay = ReplayRecorder(100000, "run.markers")
+    for event in reactor.do(10**9):
+        ...
+
+and later::
+
+    reactor = achemkit.ReactorItterative(achem, [])
+    events = list(replay(reactor, read_markers("run.markers"), 987654321, 10))
+"""
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle as pickle
+
+from achemkit.sim.limits import RunLimits
+
+class ReplayRecorder(object):
+    """
+    Records replay markers of a reactor as it runs.
+
+    ``count`` is the number of events counted so far, over all calls of
+    :py:meth:`achemkit.Reactor.do`. If no file is given, ``markers`` is a list
+    of the markers recorded, as tuples of (event number, time, state).
+    """
+
+    def __init__(self, every=100000, filename=None):
+        """
+        :param every: Number of events between markers.
+        :param filename: If given, markers are appended to this file, which is
+                         replaced, instead of kept in memory. Read them back
+                         with :py:func:`read_markers`.
+        """
+        self.every = max(int(every), 1)
+        self.filename = filename
+        self.markers = []
+        self.count = 0
+        self._outfile = None
+
+    def tick(self, reactor):
+        """
+        Count an event of `reactor`, recording a marker first if one is due.
+        """
+        if self.count % self.every == 0:
+            self.mark(reactor)
+        self.count += 1
+
+    def mark(self, reactor):
+        """
+        Record a marker of `reactor` now, before the next event.
+        """
+        marker = (self.count, getattr(reactor, "time", None), reactor.get_state())
+        if self.filename is None:
+            self.markers.append(marker)
+            return
+        if self._outfile is None:
+            self._outfile = open(self.filename, "wb")
+            pickle.dump(reactor.__class__.__name__, self._outfile, 2)
+        pickle.dump(marker, self._outfile, 2)
+        self._outfile.flush()
+
+    def close(self):
+        """
+        Close the file of markers, if any.
+        """
+        if self._outfile is not None:
+            self._outfile.close()
+            self._outfile = None
+
+
+def read_markers(filename):
+    """
+    Read the markers written by a :py:class:`ReplayRecorder`. A marker that was
+    only partly written, e.g. because the process was interrupted, is ignored.
+
+    :rtype: yields tuples of (event number, time, state) in order.
+    """
+    infile = open(filename, "rb")
+    try:
+        try:
+            pickle.load(infile)
+            while True:
+                yield pickle.load(infile)
+        except (EOFError, pickle.UnpicklingError, ValueError):
+            return
+    finally:
+        infile.close()
+
+def marker_class(filename):
+    """
+    Name of the class of reactor that the markers in `filename` are of.
+    """
+    infile = open(filename, "rb")
+    try:
+        return pickle.load(infile)
+    finally:
+        infile.close()
+
+def replay(reactor, markers, index, count=1):
+    """
+    Replay events from a marker.
+
+    :param reactor: Reactor created with the same
+                    :py:class:`achemkit.achem.AChem` and settings as the one
+                    that was recorded. Its state is replaced.
+    :param markers: Iterable of markers in order, e.g. ``markers`` of a
+                    :py:class:`ReplayRecorder` or from
+                    :py:func:`read_markers`.
+    :param index: Number of the first event to replay.
+    :param count: Number of events to replay.
+    :rtype: yields :py:class:`achemkit.Event` objects of events `index` to
+            ``index + count - 1``, fewer if no further reaction is possible.
+    """
+    nearest = None
+    for marker in markers:
+        if marker[0] > index:
+            break
+        nearest = marker
+    if nearest is None:
+        raise ValueError("no marker at or before event "+repr(index))
+    markerindex, markertime, state = nearest
+    reactor.set_state(state)
+    #events may be from later calls of do than the marker, so only the
+    #number of events limits the replay
+    reactor.maxtime = float("inf")
+
+    limits = reactor.limits
+    try:
+        #simulate up to the event without creating events
+        reactor.limits = RunLimits(events=index - markerindex)
+        for reaction in reactor._reactions(0):
+            pass
+        if reactor.stopreason != "events":
+            #finished before the event
+            return
+        reactor.limits = RunLimits(events=count)
+        for event in reactor.do(0):
+            yield event
+    finally:
+        reactor.limits = limits
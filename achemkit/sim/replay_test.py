@@ -0,0 +1,101 @@
+"""
+This is the test harness for :py:mod:`achemkit.sim.replay`.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import achemkit
+from achemkit import OrderedFrozenBag
+from achemkit.sim.limits import RunLimits
+from achemkit.sim.replay import ReplayRecorder, replay, read_markers, marker_class
+
+class TestReplay(unittest.TestCase):
+
+    def setUp(self):
+        self.rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])): 1.0,
+                      (OrderedFrozenBag(["C", "C"]), OrderedFrozenBag(["A"])): 1.0}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.achem = achemkit.AChemReactionNetwork(self.net)
+        self.mols = ["A"] * 20 + ["B"] * 10 + ["C"] * 10
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_markers(self):
+        reactor = achemkit.ReactorItterative(self.achem, self.mols, 42)
+        reactor.replay = ReplayRecorder(50)
+        events = list(reactor.do(200))
+        self.assertEqual(reactor.replay.count, len(events))
+        self.assertEqual([marker[0] for marker in reactor.replay.markers], [0, 50, 100, 150])
+        self.assertEqual(reactor.replay.markers[2][1], events[100].time)
+
+    def test_replay(self):
+        for reactorclass in (achemkit.ReactorItterative, achemkit.ReactorGillespieLike):
+            reactor = reactorclass(self.achem, self.mols, 42)
+            reactor.replay = ReplayRecorder(50)
+            events = list(reactor.do(200))
+            markers = reactor.replay.markers
+            for index, count in ((0, 1), (120, 10), (149, 3)):
+                replayed = list(replay(reactorclass(self.achem, []), markers, index, count))
+                self.assertEqual(replayed, events[index:index + count])
+            #the replay continues past the end of the recorded run
+            replayed = list(replay(reactorclass(self.achem, []), markers, len(events) - 2, 5))
+            self.assertEqual(len(replayed), 5)
+            self.assertEqual(replayed[:2], events[-2:])
+
+    def test_interrupted(self):
+        #stopping and continuing does not disturb the numbering
+        reactor = achemkit.ReactorItterative(self.achem, self.mols, 42)
+        reactor.replay = ReplayRecorder(10)
+        reactor.limits = RunLimits(events=25)
+        events = list(reactor.do(100))
+        events.extend(reactor.do(0))
+        reactor.limits = None
+        events.extend(reactor.do(0))
+        self.assertEqual(reactor.replay.count, len(events))
+        replayed = list(replay(achemkit.ReactorItterative(self.achem, []), reactor.replay.markers, 33, 4))
+        self.assertEqual(replayed, events[33:37])
+
+    def test_calls(self):
+        #events of later calls of do are reached from earlier markers
+        for reactorclass in (achemkit.ReactorItterative, achemkit.ReactorGillespieLike,
+                             achemkit.ReactorStepwise):
+            reactor = reactorclass(self.achem, self.mols, 42)
+            reactor.replay = ReplayRecorder(64)
+            events = list(reactor.do(100))
+            events.extend(reactor.do(100))
+            events.extend(reactor.do(100))
+            if reactorclass is not achemkit.ReactorStepwise:
+                for index in (60, 120, 250):
+                    replayed = list(replay(reactorclass(self.achem, []), reactor.replay.markers, index, 3))
+                    self.assertEqual(replayed, events[index:index + 3])
+            else:
+                #each step is one event for the markers
+                replayed = list(replay(reactorclass(self.achem, []), reactor.replay.markers, 120, 3))
+                self.assertEqual(replayed, [event for event in events if 120 <= event.time <= 122])
+
+    def test_file(self):
+        filename = os.path.join(self.directory, "run.markers")
+        reactor = achemkit.ReactorItterative(self.achem, self.mols, 42)
+        reactor.replay = ReplayRecorder(30, filename)
+        events = list(reactor.do(100))
+        reactor.replay.close()
+        self.assertEqual(reactor.replay.markers, [])
+        self.assertEqual(marker_class(filename), "ReactorItterative")
+        self.assertEqual(len(list(read_markers(filename))), 4)
+        #a partly written marker is ignored
+        data = open(filename, "rb").read()
+        open(filename, "wb").write(data[:-10])
+        markers = list(read_markers(filename))
+        self.assertEqual([marker[0] for marker in markers], [0, 30, 60])
+        replayed = list(replay(achemkit.ReactorItterative(self.achem, []), markers, 95, 5))
+        self.assertEqual(replayed[:len(events) - 95], events[95:])
+        self.assertEqual(len(replayed), 5)
+
+    def test_missing(self):
+        reactor = achemkit.ReactorItterative(self.achem, [])
+        self.assertRaises(ValueError, list, replay(reactor, [], 10))
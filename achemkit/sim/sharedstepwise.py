@@ -0,0 +1,320 @@
+"""
+Stepwise simulation of large populations held in shared memory, using NumPy
+(http://numpy.scipy.org/).
+
+Like :py:class:`achemkit.ReactorStepwise`, every molecule reacts once per
+step. Here, though, the population is an array of molecular species ids in
+memory shared with the worker processes of an
+:py:class:`~achemkit.sim.executor.Executor`. Each step the parent process
+shuffles the array and divides it into collections of reactants. Each worker
+reads a slice of reactant collections directly from the shared array and
+writes their products back in place. Only products that do not fit in the
+slice, and molecular species that are new, are sent back to the parent. The
+parent gives new species ids and compacts the products into the population
+for the next step.
+
+The shared arrays are :py:func:`multiprocessing.sharedctypes.RawArray` objects,
+so worker processes must be started after the reactor is created (as is the
+case for all of the executors in :py:mod:`achemkit.sim.executor`) on a
+platform where they are forked.
+"""
+
+import random
+import itertools
+import threading
+import multiprocessing.sharedctypes
+
+import numpy
+
+from achemkit import OrderedFrozenBag
+from achemkit import Reactor
+from achemkit import Event
+from achemkit.utils.utils import get_probabilities
+from achemkit.achem import react_many_with
+from achemkit.sim.executor import get_executor, resolve
+
+#species tables of workers, by handle key, extended as new species appear
+_tables = {}
+#worker threads in the same process create and extend tables one at a time
+_tableslock = threading.Lock()
+
+def _react_slice(handle, first, last, base, newspecies, seed):
+    """
+    Internal function run by a worker to react collections of reactants
+    `first` up to `last` and write their products in place. An AChem that
+    uses a random number generator draws from one seeded with `seed`.
+
+    `newspecies` are the molecular species with ids from `base` onwards.
+
+    :rtype: tuple of (first collection, number of products written in place,
+            list of product ids that did not fit, list of novel species).
+            Novel species have negative ids, -1 for the first and so on.
+    """
+    achem, population, products, offsets, productcounts, species = resolve(handle)
+    with _tableslock:
+        if handle.key not in _tables:
+            _tables[handle.key] = (list(species), dict((mol, i) for i, mol in enumerate(species)))
+        table, index = _tables[handle.key]
+        for i, mol in enumerate(newspecies):
+            if base + i == len(table):
+                table.append(mol)
+                index[mol] = base + i
+
+    starts = offsets[first:last + 1]
+    start = starts[0]
+    end = starts[-1]
+    ids = population[start:end]
+    reactantslist = [OrderedFrozenBag(table[i] for i in ids[a - start:b - start])
+                     for a, b in itertools.izip(starts, starts[1:])]
+
+    position = start
+    overflow = []
+    novel = {}
+    for group, thisproducts in enumerate(react_many_with(achem, reactantslist, random.Random(seed))):
+        productcounts[first + group] = len(thisproducts)
+        for mol in thisproducts:
+            i = index.get(mol)
+            if i is None:
+                if mol not in novel:
+                    novel[mol] = -1 - len(novel)
+                i = novel[mol]
+            if position < end:
+                products[position] = i
+                position += 1
+            else:
+                overflow.append(i)
+    novel = sorted(novel, key=novel.get, reverse=True)
+    return first, position - start, overflow, novel
+
+
+class ReactorStepwiseShared(Reactor):
+    """
+    Reactor object that reacts all molecules in parallel, with the
+    population in shared memory.
+
+    Unlike :py:class:`achemkit.ReactorStepwise`, molecules left over when the
+    population is divided into collections of reactants carry over to the next
+    step.
+    """
+
+    def __init__(self, achem, mols, rngseed=None, batchsize=10000, executor=None, events=True, maxnew=1000):
+        """
+        :param achem: :py:class:`achemkit.achem.AChem` object or equivalent.
+        :param mols: Molecules to start from.
+        :param rngseed: Instance of :py:class:`numpy.random.RandomState` or
+                        seed for it.
+        :param batchsize: Number of reactant collections in each task.
+        :param executor: :py:class:`achemkit.sim.executor.Executor` to react
+                         batches with. Defaults to serial.
+        :param events: If False, :py:meth:`do` does not yield events, which
+                       saves building a molecule-level description of every
+                       reaction.
+        :param maxnew: Number of new species sent with every task before the
+                       species table is shared with workers again.
+        """
+        if isinstance(rngseed, numpy.random.RandomState):
+            self.rng = rngseed
+        else:
+            if isinstance(rngseed, random.Random):
+                rngseed = rngseed.getrandbits(32)
+            self.rng = numpy.random.RandomState(rngseed)
+        self.executor = get_executor(executor)
+        self.batchsize = batchsize
+        self.events = events
+        self.maxnew = maxnew
+        self.maxtime = 0.0
+        self.time = 0.0
+        self.handle = None
+        #sets the population through the mols property
+        super(ReactorStepwiseShared, self).__init__(achem, mols)
+
+    def _allocate(self, capacity):
+        """
+        Internal function to create shared arrays with room for `capacity`
+        molecules.
+        """
+        self.capacity = capacity
+        self._population = multiprocessing.sharedctypes.RawArray("l", capacity)
+        self._products = multiprocessing.sharedctypes.RawArray("l", capacity)
+        self._offsets = multiprocessing.sharedctypes.RawArray("l", capacity + 1)
+        self._productcounts = multiprocessing.sharedctypes.RawArray("l", capacity)
+        self.population = numpy.ctypeslib.as_array(self._population)
+        self._release()
+
+    def _release(self):
+        """
+        Internal function to release the arrays and species table last shared
+        with workers, and the species table built from them in this process.
+        """
+        if self.handle is not None:
+            self.executor.unshare(self.handle)
+            with _tableslock:
+                _tables.pop(self.handle.key, None)
+            self.handle = None
+
+    def _share(self):
+        """
+        Internal function to share the arrays and species table with workers.
+        """
+        self._release()
+        self._shared = len(self.species)
+        self.handle = self.executor.share((self.achem, self._population, self._products, self._offsets,
+                                           self._productcounts, tuple(self.species)))
+
+    def _get_mols(self):
+        return tuple(self.species[i] for i in self.population[:self.size])
+
+    def _set_mols(self, mols):
+        mols = tuple(mols)
+        self.species = []
+        self.index = {}
+        ids = []
+        for mol in mols:
+            if mol not in self.index:
+                self.index[mol] = len(self.species)
+                self.species.append(mol)
+            ids.append(self.index[mol])
+        self._allocate(max(len(ids), 1))
+        self.size = len(ids)
+        self.population[:self.size] = ids
+
+    mols = property(_get_mols, _set_mols, doc="""
+        Tuple of the current molecules. This is slow for large populations;
+        ``population[:size]`` holds the same as species ids, which index
+        ``species``.
+        """)
+
+    def get_state(self):
+        name, keys, position, hasgauss, gauss = self.rng.get_state()
+        return {"species": list(self.species),
+                "population": self.population[:self.size].tolist(),
+                "time": self.time,
+                "maxtime": self.maxtime,
+                "rng": (name, keys.tolist(), position, hasgauss, gauss)}
+
+    def set_state(self, state):
+        self.species = list(state["species"])
+        self.index = dict((mol, i) for i, mol in enumerate(self.species))
+        population = state["population"]
+        self._allocate(max(len(population), 1))
+        self.size = len(population)
+        self.population[:self.size] = population
+        self.time = state["time"]
+        self.maxtime = state["maxtime"]
+        name, keys, position, hasgauss, gauss = state["rng"]
+        self.rng.set_state((name, numpy.array(keys, dtype=numpy.uint32), position, hasgauss, gauss))
+
+    def population_size(self):
+        return self.size
+
+    def fingerprint(self):
+        return hash(numpy.bincount(self.population[:self.size], minlength=len(self.species)).tostring())
+
+    def _sizes(self):
+        """
+        Internal function to choose the number of reactants of each collection
+        and fill in the shared offsets of each.
+
+        :rtype: number of collections.
+        """
+        probabilities = get_probabilities(self.achem.noreactants)
+        values = sorted(probabilities)
+        if min(values) <= 0:
+            raise ValueError("collections must have at least one reactant")
+        if len(values) == 1:
+            count = self.size // values[0]
+            offsets = numpy.arange(count + 1) * values[0]
+        else:
+            sizes = self.rng.choice(values, self.size // min(values) + 1, p=[probabilities[x] for x in values])
+            offsets = numpy.concatenate(([0], numpy.cumsum(sizes)))
+            count = numpy.searchsorted(offsets, self.size, side="right") - 1
+            offsets = offsets[:count + 1]
+        numpy.ctypeslib.as_array(self._offsets)[:count + 1] = offsets
+        return count
+
+    def do(self, time):
+        """
+        Assign all molecules to a collection of reactants. Use the combined
+        collections of products as the new molecules.
+
+        :param float time: Time to simulate, at a rate of one step per unit.
+        :rtype: yields :py:class:`achemkit.Event` objects, unless created
+                with `events` False.
+        """
+        self.maxtime += time
+        self._begin()
+        while self.time < self.maxtime:
+            if self._tick():
+                break
+            for event in self._step():
+                yield event
+            self.time += 1.0
+
+    def _step(self):
+        """
+        Internal function to carry out a single step.
+
+        :rtype: list of :py:class:`achemkit.Event` objects.
+        """
+        if self.handle is None or len(self.species) - self._shared > self.maxnew:
+            self._share()
+        self.rng.shuffle(self.population[:self.size])
+        count = self._sizes()
+        offsets = numpy.ctypeslib.as_array(self._offsets)
+        groupedsize = int(offsets[count])
+
+        firsts = range(0, count, self.batchsize)
+        lasts = [min(first + self.batchsize, count) for first in firsts]
+        newspecies = tuple(self.species[self._shared:])
+        #each slice has its own generator, so outcomes do not depend on which
+        #worker reacts it
+        seeds = [int(seed) for seed in self.rng.randint(0, 2**31 - 1, len(firsts))]
+        results = self.executor.map(_react_slice, itertools.repeat(self.handle), firsts, lasts,
+                                    itertools.repeat(self._shared), itertools.repeat(newspecies), seeds)
+        results = dict((result[0], result[1:]) for result in results)
+
+        products = numpy.ctypeslib.as_array(self._products)
+        productcounts = numpy.ctypeslib.as_array(self._productcounts)
+        pieces = []
+        events = []
+        for first, last in itertools.izip(firsts, lasts):
+            written, overflow, novel = results[first]
+            start = int(offsets[first])
+            #give new species their ids
+            remap = numpy.empty(len(novel), dtype=products.dtype)
+            for i, mol in enumerate(novel):
+                if mol not in self.index:
+                    self.index[mol] = len(self.species)
+                    self.species.append(mol)
+                remap[i] = self.index[mol]
+            stream = numpy.concatenate((products[start:start + written],
+                                        numpy.array(overflow, dtype=products.dtype)))
+            if len(novel) > 0:
+                placeholders = stream < 0
+                stream[placeholders] = remap[-1 - stream[placeholders]]
+            pieces.append(stream)
+            if self.events:
+                events.extend(self._events(first, last, stream, offsets, productcounts))
+        #left over molecules carry on to the next step
+        pieces.append(self.population[groupedsize:self.size].copy())
+        newpopulation = numpy.concatenate(pieces) if pieces else numpy.zeros(0, dtype=products.dtype)
+
+        if len(newpopulation) > self.capacity:
+            self._allocate(2 * len(newpopulation))
+        self.size = len(newpopulation)
+        self.population[:self.size] = newpopulation
+        return events
+
+    def _events(self, first, last, stream, offsets, productcounts):
+        """
+        Internal function to describe the reactions of collections `first` up
+        to `last` as :py:class:`achemkit.Event` objects.
+        """
+        species = self.species
+        position = 0
+        for group in xrange(first, last):
+            reactants = [species[i] for i in self.population[offsets[group]:offsets[group + 1]]]
+            size = productcounts[group]
+            products = [species[i] for i in stream[position:position + size]]
+            position += size
+            yield Event(self.time, reactants, products)
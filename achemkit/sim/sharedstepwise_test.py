@@ -0,0 +1,101 @@
+"""
+This is the test harness for :py:mod:`achemkit.sim.sharedstepwise`.
+"""
+
+import random
+import unittest
+
+import achemkit
+from achemkit import OrderedFrozenBag
+from achemkit.sim.executor import PoolExecutor, SerialExecutor, ThreadExecutor
+
+try:
+    import numpy
+    from achemkit.sim import sharedstepwise
+    from achemkit.sim.sharedstepwise import ReactorStepwiseShared
+except ImportError:
+    numpy = None
+
+@unittest.skipIf(numpy is None, "requires NumPy")
+class TestStepwiseShared(unittest.TestCase):
+    
+    def setUp(self): 
+        #one reaction grows the population, one makes a new species
+        self.rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C", "C"])):1.0,
+                      (OrderedFrozenBag(["C", "C"]), OrderedFrozenBag(["D"])):1.0}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.achem = achemkit.AChemReactionNetwork(self.net)
+        self.mols = ("A",) * 50 + ("B",) * 51
+        
+    def check(self, reactor, steps):
+        events = list(reactor.do(steps))
+        bucket = achemkit.Bucket(events)
+        self.assertTrue(set(bucket.reactionnet.reactions) <= set(self.net.reactions))
+        #replay events to check the population is consistent
+        counts = dict.fromkeys(self.net.seen, 0)
+        for mol in self.mols:
+            counts[mol] += 1
+        for event in events:
+            for mol in event.reactants:
+                counts[mol] -= 1
+            for mol in event.products:
+                counts[mol] += 1
+        for mol in reactor.mols:
+            counts[mol] -= 1
+        self.assertEqual(set(counts.values()), set([0]))
+        return events
+        
+    def test_serial(self):
+        reactor = ReactorStepwiseShared(self.achem, self.mols, 42, batchsize=7)
+        self.assertEqual(sorted(reactor.mols), sorted(self.mols))
+        events = self.check(reactor, 5)
+        self.assertTrue(len(events) > 0)
+        self.assertEqual(reactor.time, 5.0)
+        #new species have been found
+        self.assertTrue("D" in reactor.species)
+        #the population grew beyond its initial size
+        self.assertTrue(reactor.size > len(self.mols))
+        #the odd molecule is carried over rather than lost
+        self.assertEqual(reactor.mols.count("B"), 51)
+        
+    def test_pool(self):
+        with PoolExecutor(2, ordered=False) as executor:
+            reactor = ReactorStepwiseShared(self.achem, self.mols, 42, batchsize=7, executor=executor, maxnew=0)
+            self.check(reactor, 5)
+            
+    def test_reshare(self):
+        #sharing again releases what was shared before
+        executor = SerialExecutor()
+        before = set(sharedstepwise._tables)
+        reactor = ReactorStepwiseShared(self.achem, self.mols, 42, batchsize=7, executor=executor, maxnew=0)
+        for i in xrange(5):
+            list(reactor.do(1))
+            self.assertTrue(len(executor.shared) <= 1)
+            self.assertTrue(set(sharedstepwise._tables) - before <= set(executor.shared))
+        self.assertTrue(reactor.size > len(self.mols))
+            
+    def test_noevents(self):
+        first = ReactorStepwiseShared(self.achem, self.mols, 42, events=False)
+        self.assertEqual(list(first.do(3)), [])
+        second = ReactorStepwiseShared(self.achem, self.mols, 42)
+        list(second.do(3))
+        self.assertEqual(first.mols, second.mols)
+
+    def test_divergent(self):
+        #competing products, so outcomes depend on the random numbers
+        rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["A", "C"])): 1.0,
+                 (OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])): 1.0}
+        achem = achemkit.AChemReactionNetwork(achemkit.ReactionNetwork(rates))
+        random.seed(1)
+        first = list(ReactorStepwiseShared(achem, self.mols, 42, batchsize=7).do(3))
+        random.seed(2)
+        with PoolExecutor(2) as executor:
+            second = list(ReactorStepwiseShared(achem, self.mols, 42, batchsize=7, executor=executor).do(3))
+        self.assertEqual(first, second)
+
+    def test_threads(self):
+        #worker threads extend the same species table
+        expected = list(ReactorStepwiseShared(self.achem, self.mols, 42, batchsize=3).do(5))
+        with ThreadExecutor(4, persistent=True) as executor:
+            reactor = ReactorStepwiseShared(self.achem, self.mols, 42, batchsize=3, executor=executor)
+            self.assertEqual(self.check(reactor, 5), expected)
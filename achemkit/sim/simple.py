@@ -5,207 +5,579 @@ This contains a number of simple simulation classes, based on subclasses of
 Also contains some convenience functions for these reactors.
 """
 
+import os
 import random
 import itertools
+import collections
+import math
 try:
     import cPickle as pickle
 except ImportError:
     import pickle as pickle
 
-
-import umpf
-    
-from achemkit.utils.utils import get_sample
-from achemkit import OrderedFrozenBag
+from achemkit.utils.sampler import make_sampler
+from achemkit.achem import react_with, react_many_with
+from achemkit import OrderedFrozenBag, FrozenBag
 from achemkit import Reactor
 from achemkit import Event
 from achemkit import Bucket
+from achemkit.sim.population import Population, ReactiveIndex
+from achemkit.sim.executor import get_executor, resolve
+from achemkit.utils import diskset
 
 class ReactorEnumerate(Reactor):
     """
     Reactor object designed to exaustively enumerate all possible reactant 
     collections, adding new reactant collections as novel products appear.
+    
+    Enumeration is breadth-first. Each wave tests every collection of 
+    reactants that was made possible by the molecular species discovered in 
+    the previous wave, and these tests are done in parallel by the executor.
+    
+    Statistics are kept as attributes:
+    
+    depth
+        Number of waves started.
+        
+    wavesizes
+        List of the number of reactant collections tested in each wave.
+        
+    novelty
+        List of the number of new molecular species discovered in each wave.
+        
+    Collections of reactants waiting to be tested are in ``untested`` as 
+    tuples of (depth, reactants).
+    
+    If a `directory` is given, the molecular species, the reactant collections
+    already seen and those waiting to be tested are kept on disk using
+    :py:mod:`achemkit.utils.diskset`, so enumeration is limited by disk space 
+    rather than memory. Progress is saved after every `chunksize` reactant 
+    collections, and creating a reactor with the same directory resumes from 
+    the last save. Reactions found after the last save may be found again 
+    when resuming.
     """
-    def __init__(self, achem, mols):
+    def __init__(self, achem, mols, executor=None, directory=None, chunksize=10000):
         """
         :param achem: :py:class:`achemkit.achem.AChem` object or equivalent.
         :param mols: Initial molecular species.
+        :param executor: :py:class:`achemkit.sim.executor.Executor` to 
+                         determine products with. Defaults to serial.
+        :param directory: Directory to keep enumeration state in, or None to
+                          keep it in memory.
+        :param chunksize: Number of reactant collections given to the 
+                          executor at once.
         """
         super(ReactorEnumerate, self).__init__(achem, mols)
-        self.maxmols = len(mols)
-        self.mols = []
-        self.tested = []
-        self.untested = []
-                
-        for mol in mols:
-            self.add_mol(mol)
+        self.executor = get_executor(executor)
+        self.directory = directory
+        self.chunksize = chunksize
+        
+        noreactants = self.achem.noreactants
+        try:
+            noreactants = set(noreactants)
+        except TypeError:
+            #not an itterable, single number
+            noreactants = set([noreactants])
+        self.noreactants = tuple(sorted(noreactants))
+        
+        state = None
+        if directory is None:
+            self.mols = []
+            self.known = set()
+            self.tested = set()
+            self.untested = collections.deque()
+        else:
+            if not os.path.exists(directory):
+                os.makedirs(directory)
+            state = diskset.read_state(os.path.join(directory, "state"))
+            if state is None:
+                state = {}
+            self.mols = diskset.DiskList(os.path.join(directory, "mols"), state.get("mols"))
+            self.known = diskset.DiskSet(os.path.join(directory, "known"), state.get("known"))
+            self.tested = diskset.DiskSet(os.path.join(directory, "tested"), state.get("tested"), key=_bag_key)
+            self.untested = diskset.DiskQueue(os.path.join(directory, "untested"), state.get("untested"))
+        if state:
+            self.depth = state["depth"]
+            self.wavesizes = state["wavesizes"]
+            self.novelty = state["novelty"]
+            self.maxmols = state["maxmols"]
+        else:
+            self.depth = 0
+            self.wavesizes = []
+            self.novelty = []
+            for mol in mols:
+                self.add_mol(mol)
+            self.maxmols = len(self.mols)
+            self.sync()
             
     def add_mol(self, mol):
         """
         Internal utility function used to ensure molecular species have the
         relevant reaction combinations added.
         
+        Each collection of reactants is added once, when the last of its 
+        molecular species to be discovered is added. This includes 
+        collections with repeats of a molecular species, e.g. A + A.
+        
         :param mol: Molecular species to add to reactor.
+        :rtype: True if the molecular species is new.
+        """
+        if mol in self.known:
+            return False
+        self.known.add(mol)
+        self.mols.append(mol)
+        for i in self.noreactants:
+            if isinstance(self.mols, list):
+                combinations = itertools.combinations_with_replacement(self.mols, i-1)
+            else:
+                combinations = _multisets(self.mols, i-1)
+            for others in combinations:
+                reactants = OrderedFrozenBag((mol,)+others)
+                if reactants not in self.tested:
+                    self.tested.add(reactants)
+                    self.untested.append((self.depth + 1, reactants))
+        return True
+        
+    def sync(self):
+        """
+        Save progress, if enumeration state is kept on disk.
+        """
+        if self.directory is None:
+            return
+        diskset.write_state(os.path.join(self.directory, "state"), self.get_state())
+        for container in (self.mols, self.known, self.tested, self.untested):
+            container.cleanup()
+            
+    def get_state(self):
+        """
+        State of the enumeration. If it is kept on disk, this makes it durable
+        and only describes the files it is in.
+        """
+        if self.directory is None:
+            state = {"mols": list(self.mols),
+                     "tested": set(self.tested),
+                     "untested": list(self.untested)}
+        else:
+            state = {"mols": self.mols.state(),
+                     "known": self.known.state(),
+                     "tested": self.tested.state(),
+                     "untested": self.untested.state()}
+        state.update({"depth": self.depth,
+                      "wavesizes": list(self.wavesizes),
+                      "novelty": list(self.novelty),
+                      "maxmols": self.maxmols})
+        return state
+        
+    def set_state(self, state):
+        if self.directory is None:
+            self.mols = list(state["mols"])
+            self.known = set(self.mols)
+            self.tested = set(state["tested"])
+            self.untested = collections.deque(state["untested"])
+        else:
+            for container in (self.mols, self.known, self.tested, self.untested):
+                container.close()
+            directory = self.directory
+            self.mols = diskset.DiskList(os.path.join(directory, "mols"), state["mols"])
+            self.known = diskset.DiskSet(os.path.join(directory, "known"), state["known"])
+            self.tested = diskset.DiskSet(os.path.join(directory, "tested"), state["tested"], key=_bag_key)
+            self.untested = diskset.DiskQueue(os.path.join(directory, "untested"), state["untested"])
+        self.depth = state["depth"]
+        self.wavesizes = list(state["wavesizes"])
+        self.novelty = list(state["novelty"])
+        self.maxmols = state["maxmols"]
+            
+    def close(self):
+        """
+        Save progress and close any files.
+        """
+        if self.directory is not None:
+            self.sync()
+            for container in (self.mols, self.known, self.tested, self.untested):
+                container.close()
+        
+    def statistics(self):
         """
-        if mol not in self.mols:
-            self.mols.append(mol)
-            noreactants = self.achem.noreactants
-            try:
-                noreactants = set(noreactants)
-            except TypeError:
-                #not an itterable, single number
-                noreactants = set([noreactants])
-            for i in noreactants:
-                for others in itertools.combinations(self.mols, i-1):
-                    reactants = (mol,)+others
-                    reactants = OrderedFrozenBag(reactants)
-                    assert reactants not in self.tested
-                    self.untested.append(reactants)
+        Summary of the enumeration so far.
+        
+        :rtype: dictionary of statistic name to value.
+        """
+        return {"depth": self.depth,
+                "species": len(self.mols),
+                "tested": len(self.tested) - len(self.untested),
+                "untested": len(self.untested),
+                "wavesizes": list(self.wavesizes),
+                "novelty": list(self.novelty)}
         
     def do(self, count):
         """
         Enumerate all possible reactant collections and determine products
         via :py:meth:`achemkit.achem.AChem.all_reactions`.
         
-        Uses :py:mod:`umpf` for parallelism.
+        Uses the executor of this reactor for parallelism. The time of each
+        event is the depth of the wave it was found in.
         
         :param integer count: Maximum number of additional molecular species to 
                               discover.
         :rtype: yields :py:class:`achemkit.Event` objects.
         """
         self.maxmols += count
+        self._begin()
+        achem = self.executor.share(self.achem)
         while len(self.mols) < self.maxmols and len(self.untested) > 0:
-            untested = tuple(self.untested)
-            self.untested = []
-            results = umpf.map(self.achem.all_reactions, untested)
-            while len(self.mols) < self.maxmols:
-                try:
-                    reactions = results.next()
-                except StopIteration:
+            if self._tick():
+                break
+            #take a chunk from the current wave
+            chunk = []
+            while len(chunk) < self.chunksize and len(self.untested) > 0:
+                depth, reactants = self.untested.popleft()
+                if depth > self.depth:
+                    if chunk:
+                        #finish the current wave first
+                        self.untested.extendleft([(depth, reactants)])
+                        break
+                    #start the next wave
+                    self.depth = depth
+                    self.wavesizes.append(0)
+                    self.novelty.append(0)
+                chunk.append(reactants)
+                
+            done = set()
+            for reactants, reactions in self.executor.map(reactions_of, itertools.repeat(achem), chunk):
+                done.add(reactants)
+                for reaction in reactions:
+                    thisreactants, products = reaction
+                    yield Event(float(self.depth), thisreactants, products, reactions[reaction])
+                    for product in products:
+                        if self.add_mol(product):
+                            self.novelty[-1] += 1
+                if len(self.mols) >= self.maxmols:
                     break
-                else:
-                    for reaction in reactions:
-                        reactants, products = reaction
-                        e = Event(0.0, reactants, products, reactions[reaction])
-                        yield e
-                        for product in products:
-                            self.add_mol(product)
-
+            #if stopped part way, the rest is kept for later
+            rest = [(self.depth, x) for x in chunk if x not in done]
+            self.untested.extendleft(reversed(rest))
+            self.wavesizes[-1] += len(done)
+            self.sync()
+                
 class ReactorItterative(Reactor):
     """
     Reactor object that proceeds one reaction at a time.
     """
-    def __init__(self, achem, mols, rngseed=None):
+    def __init__(self, achem, mols, rngseed=None, skipelastic=False, elasticrecords=False):
         """
         :param achem: :py:class:`achemkit.achem.AChem` object or equivalent.
         :param mols: Molecules to start from.
         :param rngseed: Instance of :py:class:`random.Random` or seed for 
                         :py:class:`random.Random`
+        :param skipelastic: If True, jump directly from one reactive collision
+                            to the next using 
+                            :py:meth:`achemkit.achem.AChem.reactive_reactants`.
+                            Elastic collisions are counted in ``elastic`` 
+                            rather than yielded.
+        :param elasticrecords: If True when skipping elastic collisions, each 
+                               run of them is recorded in ``elasticruns`` as a 
+                               tuple of (time the run ended, number of 
+                               collisions), rather than only counted.
         """
         super(ReactorItterative, self).__init__(achem, mols)
+        self.mols = Population(mols)
         self.maxtime = 0.0
         self.time = 1.0
         if isinstance(rngseed, random.Random):
             self.rng = rngseed
         else:
             self.rng = random.Random(rngseed)
+        self.elastic = 0
+        self.elasticruns = None
+        if elasticrecords:
+            self.elasticruns = []
+        self.reactive = None
+        if skipelastic:
+            self.reactive = ReactiveIndex(self.mols, achem.reactive_reactants())
+        
+    def get_state(self):
+        species, counts = self.mols.slots()
+        return {"species": species, 
+                "counts": counts, 
+                "time": self.time, 
+                "maxtime": self.maxtime, 
+                "elastic": self.elastic, 
+                "rng": self.rng.getstate()}
         
+    def set_state(self, state):
+        self.mols = Population.from_slots(state["species"], state["counts"])
+        self.time = state["time"]
+        self.maxtime = state["maxtime"]
+        self.elastic = state["elastic"]
+        self.rng.setstate(state["rng"])
+        if self.reactive is not None:
+            self.reactive = ReactiveIndex(self.mols, self.achem.reactive_reactants())
+        
+    def fingerprint(self):
+        return hash(frozenset(self.mols.counts().iteritems()))
+        
+    def add_mols(self, mols):
+        mols = tuple(mols)
+        self.mols.update(mols)
+        if self.reactive is not None:
+            self.reactive.refresh(set(mols))
+            
+    def take_mols(self, count, rng):
+        taken = self.mols.take(count, rng)
+        if self.reactive is not None:
+            self.reactive.refresh(set(taken))
+        return taken
         
     def do(self, time):
         """
         Repeatedly determine a random collection of reactants and replace them 
         with the products generated by :py:meth:`achemkit.achem.AChem.react`.
                 
-        Uses :py:mod:`umpf` for parallelism.
-        
         :param float time: Time to simulate, at a rate of one reaction per unit.
         :rtype: yields :py:class:`achemkit.Event` objects.
         """
+        for reaction in self._reactions(time):
+            yield Event(*reaction)
+            
+    def _reactions(self, time):
         self.maxtime += time
+        self._begin()
+        recorded = self.elastic
         while self.time < self.maxtime:
-            self.mols = tuple(self.rng.sample(self.mols, len(self.mols)))
-            
+            if self._tick():
+                break
             noreactants = 2
-            reactants = OrderedFrozenBag(self.mols[:noreactants])
-            self.mols = self.mols[noreactants:]
+            if len(self.mols) < noreactants:
+                #not enough molecules left to react
+                break
             
-            products = self.achem.react(reactants)
-            self.mols += tuple(products)
+            if self.reactive is None:
+                reactants = OrderedFrozenBag(self.mols.take(noreactants, self.rng))
+            else:
+                skipped, reactants = self.reactive.next_reactive({noreactants:1.0}, self.rng)
+                remaining = self.maxtime - self.time
+                if skipped is None or skipped >= remaining:
+                    if math.isinf(remaining):
+                        #nothing can ever react again
+                        break
+                    remaining = int(math.ceil(remaining))
+                    #only elastic collisions before the end of this call
+                    #the skip will be redrawn next time, which is fine
+                    #because the geometric distribution is memoryless
+                    self.elastic += remaining
+                    self.time += remaining
+                    break
+                self.elastic += skipped
+                self.time += skipped
+                for mol in reactants:
+                    self.mols.remove(mol)
+                reactants = OrderedFrozenBag(reactants)
             
-            e = Event(self.time, reactants, products)
-            yield e
+            products = react_with(self.achem, reactants, self.rng)
+            self.mols.update(products)
+            
+            if self.reactive is not None:
+                self.reactive.refresh(set(reactants).union(products))
+                if OrderedFrozenBag(products) == reactants:
+                    #reactive collection can still collide elastically
+                    self.elastic += 1
+                    self.time += 1.0
+                    continue
+            
+            if self.elasticruns is not None and self.elastic > recorded:
+                self.elasticruns.append((self.time, self.elastic - recorded))
+                recorded = self.elastic
+            yield self.time, reactants, products, None
             self.time += 1.0
+        if self.elasticruns is not None and self.elastic > recorded:
+            self.elasticruns.append((self.time, self.elastic - recorded))
             
                 
 class ReactorStepwise(Reactor):
     """
     Reactor object that reacts all molecules in parallel.
     """
-    def __init__(self, achem, mols, rngseed=None):
+    def __init__(self, achem, mols, rngseed=None, batchsize=1000, executor=None):
         """
         :param achem: :py:class:`achemkit.achem.AChem` object or equivalent.
         :param mols: Molecules to start from.
         :param rngseed: Instance of :py:class:`random.Random` or seed for 
                         :py:class:`random.Random`
+        :param batchsize: Number of reactant collections passed to each call
+                          of :py:meth:`achemkit.achem.AChem.react_many`.
+        :param executor: :py:class:`achemkit.sim.executor.Executor` to 
+                         react batches with. Defaults to serial.
         """
         super(ReactorStepwise, self).__init__(achem, mols)
+        self.executor = get_executor(executor)
         self.maxtime = 0.0
         self.time = 0.0
         if isinstance(rngseed, random.Random):
             self.rng = rngseed
         else:
             self.rng = random.Random(rngseed)
+        self.batchsize = batchsize
+        
+    def get_state(self):
+        species = []
+        index = {}
+        ids = []
+        for mol in self.mols:
+            if mol not in index:
+                index[mol] = len(species)
+                species.append(mol)
+            ids.append(index[mol])
+        return {"species": species, 
+                "ids": ids, 
+                "time": self.time, 
+                "maxtime": self.maxtime, 
+                "rng": self.rng.getstate()}
         
+    def add_mols(self, mols):
+        self.mols = self.mols + tuple(mols)
+        
+    def take_mols(self, count, rng):
+        chosen = set(rng.sample(xrange(len(self.mols)), count))
+        taken = tuple(mol for i, mol in enumerate(self.mols) if i in chosen)
+        self.mols = tuple(mol for i, mol in enumerate(self.mols) if i not in chosen)
+        return taken
+        
+    def set_state(self, state):
+        species = state["species"]
+        self.mols = tuple(species[i] for i in state["ids"])
+        self.time = state["time"]
+        self.maxtime = state["maxtime"]
+        self.rng.setstate(state["rng"])
         
     def do(self, time):
         """
         Assign all molecules to a collection of reactants. Use the combined
         collections of products as the new molecules.
+        
+        Reactant collections are passed to 
+        :py:meth:`achemkit.achem.AChem.react_many` in batches.
                 
-        Uses :py:mod:`umpf` for parallelism.
+        Uses the executor of this reactor for parallelism. If it is unordered, 
+        events within a step may be in any order.
         
         :param float time: Time to simulate, at a rate of one step per unit.
         :rtype: yields :py:class:`achemkit.Event` objects.
         """
+        for reaction in self._reactions(time):
+            yield Event(*reaction)
+            
+    def _reactions(self, time):
         self.maxtime += time
+        self._begin()
+        sizes = make_sampler(self.achem.noreactants)
         while self.time < self.maxtime:
+            if self._tick():
+                break
             self.mols = tuple(self.rng.sample(self.mols, len(self.mols)))
-            newmols = ()
+            newmols = []
             allreactants = []
-            while len(self.mols) > 0:
-                noreactants = get_sample(self.achem.noreactants)
-                if noreactants <= len(self.mols):
-                    reactants = self.mols[:noreactants]
-                    self.mols = self.mols[noreactants:]                
+            i = 0
+            while i < len(self.mols):
+                noreactants = sizes.sample(self.rng)
+                if i + noreactants <= len(self.mols):
+                    reactants = self.mols[i:i+noreactants]
+                    i += noreactants
                     allreactants.append(OrderedFrozenBag(reactants))
                 else:
                     break
                     
-            allproducts = umpf.map(self.achem.react, allreactants)
-            results = itertools.izip(allreactants, allproducts)
-            for reactants, products in results:
-                e = Event(self.time, reactants, products)
-                newmols += tuple(products)
-                yield e
+            batches = [allreactants[j:j+self.batchsize] for j in xrange(0, len(allreactants), self.batchsize)]
+            achem = self.executor.share(self.achem)
+            #each batch has its own generator, so outcomes do not depend on
+            #which worker reacts it
+            seeds = [self.rng.getrandbits(64) for batch in batches]
+            results = self.executor.map(react_batch, itertools.repeat(achem), batches, seeds)
+            for reactants, products in itertools.chain.from_iterable(results):
+                newmols.extend(products)
+                yield self.time, reactants, products, None
                 
-            self.mols = newmols
+            self.mols = tuple(newmols)
             self.time += 1.0
             
-def sim_enumerate(achem, mols, maxmols):
+def react_many(achem, reactantslist, seed=None):
+    """
+    Calls :py:meth:`achemkit.achem.AChem.react_many` on the provided
+    :py:class:`achemkit.achem.AChem` object. 
+    
+    This is a function so that it can be passed to other processes.
+    `achem` may be a :py:class:`~achemkit.sim.executor.Handle`. If `seed` is 
+    given, an AChem that uses a random number generator draws from one with 
+    that seed.
+    """
+    rng = None
+    if seed is not None:
+        rng = random.Random(seed)
+    return react_many_with(resolve(achem), reactantslist, rng)
+
+def react_batch(achem, reactantslist, seed=None):
+    """
+    As :py:func:`react_many` but returns a list of (reactants, products) 
+    pairs, so that batches can be completed in any order.
+    
+    `achem` may be a :py:class:`~achemkit.sim.executor.Handle`.
+    """
+    return zip(reactantslist, react_many(achem, reactantslist, seed))
+    
+def _bag_key(reactants):
+    """
+    Internal function to identify a collection of reactants regardless of 
+    order.
+    """
+    return repr(FrozenBag(reactants))
+    
+def _multisets(mols, count, start=0):
+    """
+    Internal function equivalent to :py:func:`itertools.combinations_with_replacement`
+    for a :py:class:`achemkit.utils.diskset.DiskList`, without reading it all 
+    into memory.
+    """
+    if count == 0:
+        yield ()
+        return
+    for i, mol in enumerate(mols.iter_from(start), start):
+        for others in _multisets(mols, count - 1, i):
+            yield (mol,) + others
+    
+def reactions_of(achem, reactants):
+    """
+    As :py:func:`all_reactions` but returns a tuple of (reactants, reactions)
+    so that reactant collections can be completed in any order.
+    """
+    return reactants, resolve(achem).all_reactions(reactants)
+
+def all_reactions(achem, reactants):
+    """
+    Calls :py:meth:`achemkit.achem.AChem.all_reactions` on the provided
+    :py:class:`achemkit.achem.AChem` object. 
+    
+    This is a function so that it can be passed to other processes.
+    `achem` may be a :py:class:`~achemkit.sim.executor.Handle`.
+    """
+    return resolve(achem).all_reactions(reactants)
+            
+def sim_enumerate(achem, mols, maxmols, directory=None):
     """
     Wrapper for :py:class:`ReactorEnumerate`
     to return :py:class:`Event` objects.
     """
-    sim = ReactorEnumerate(achem, mols)
-    for e in sim.do(maxmols):
-        yield e
+    sim = ReactorEnumerate(achem, mols, directory=directory)
+    try:
+        for e in sim.do(maxmols):
+            yield e
+    finally:
+        sim.close()
         
-def sim_itterative(achem, mols, maxtime, rng = None):
+def sim_itterative(achem, mols, maxtime, rng = None, skipelastic=False):
     """
     Wrapper for :py:class:`ReactorItterative`
     to return :py:class:`Event` objects.
     """
-    sim = ReactorItterative(achem, mols, rng)
+    sim = ReactorItterative(achem, mols, rng, skipelastic)
     for e in sim.do(maxtime):
         yield e
     
@@ -219,12 +591,12 @@ def sim_stepwise(achem, mols, maxtime, rng=None):
     for e in sim.do(maxtime):
         yield e
 
-def net_enumerate(achem, mols, maxmols, rng=None):
+def net_enumerate(achem, mols, maxmols, rng=None, directory=None):
     """
     Wrapper for :py:func:`sim_enumerate`
     to return a :py:class:`ReactionNetwork` object.
     """
-    events = sim_enumerate(achem, mols, maxmols)
+    events = sim_enumerate(achem, mols, maxmols, directory)
     bucket = Bucket(events)
     net = bucket.reactionnet
     return net
@@ -8,9 +8,12 @@ sys.path.append(".")
 
 import unittest
 import random
+import shutil
+import tempfile
 
 import achemkit
 from achemkit import OrderedFrozenBag
+from achemkit.sim.sink import NetworkSink
 
         
 class TestItterative(unittest.TestCase):
@@ -45,5 +48,125 @@ class TestEnumerate(TestItterative):
         buck = achemkit.Bucket(events)
         self.assertEqual(buck.reactionnet.reactions, self.net.reactions)
         
+class TestEnumerateWaves(unittest.TestCase):
+    
+    def setUp(self): 
+        self.rates = {(OrderedFrozenBag(["A", "A"]), OrderedFrozenBag(["B"])):1.0,
+                      (OrderedFrozenBag(["B", "B"]), OrderedFrozenBag(["C"])):1.0,
+                      (OrderedFrozenBag(["A", "C"]), OrderedFrozenBag(["D"])):1.0}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.achem = achemkit.AChemReactionNetwork(self.net)
+        
+    def test_waves(self):
+        reactor = achemkit.ReactorEnumerate(self.achem, ["A"])
+        events = list(reactor.do(10))
+        self.assertEqual(achemkit.Bucket(events).reactionnet, self.net)
+        self.assertEqual([event.time for event in events], [1.0, 2.0, 3.0])
+        self.assertEqual(reactor.mols, ["A", "B", "C", "D"])
+        self.assertEqual(reactor.depth, 4)
+        self.assertEqual(reactor.wavesizes, [1, 2, 3, 4])
+        self.assertEqual(reactor.novelty, [1, 1, 1, 0])
+        #every pair, including self-pairs, is tested exactly once
+        self.assertEqual(len(reactor.tested), 10)
+        self.assertEqual(reactor.statistics()["untested"], 0)
+        
+    def test_limit(self):
+        reactor = achemkit.ReactorEnumerate(self.achem, ["A", "B"])
+        self.assertEqual(len(list(reactor.do(1))), 2)
+        self.assertEqual(reactor.mols, ["A", "B", "C"])
+        statistics = reactor.statistics()
+        self.assertEqual(statistics["depth"], 1)
+        self.assertEqual(statistics["tested"] + statistics["untested"], 6)
+        events = list(reactor.do(10))
+        self.assertEqual(reactor.mols, ["A", "B", "C", "D"])
+        self.assertEqual(len(events), 1)
+        self.assertEqual(reactor.statistics()["tested"], 10)
+
+class TestEnumerateDisk(unittest.TestCase):
+    
+    def setUp(self):
+        self.rates = {(OrderedFrozenBag(["A", "A"]), OrderedFrozenBag(["B"])):1.0,
+                      (OrderedFrozenBag(["B", "B"]), OrderedFrozenBag(["C"])):1.0,
+                      (OrderedFrozenBag(["A", "C"]), OrderedFrozenBag(["D"])):1.0}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.achem = achemkit.AChemReactionNetwork(self.net)
+        self.directory = tempfile.mkdtemp()
+        
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        
+    def test_disk(self):
+        reactor = achemkit.ReactorEnumerate(self.achem, ["A"], directory=self.directory, chunksize=2)
+        events = list(reactor.do(10))
+        self.assertEqual(achemkit.Bucket(events).reactionnet, self.net)
+        self.assertEqual(list(reactor.mols), ["A", "B", "C", "D"])
+        self.assertEqual(reactor.wavesizes, [1, 2, 3, 4])
+        self.assertEqual(reactor.novelty, [1, 1, 1, 0])
+        reactor.close()
+        
+    def test_resume(self):
+        reactor = achemkit.ReactorEnumerate(self.achem, ["A"], directory=self.directory, chunksize=2)
+        events = list(reactor.do(2))
+        self.assertEqual(len(reactor.mols), 3)
+        reactor.close()
+        reactor = achemkit.ReactorEnumerate(self.achem, ["A"], directory=self.directory, chunksize=2)
+        self.assertEqual(list(reactor.mols), ["A", "B", "C"])
+        events += list(reactor.do(10))
+        self.assertEqual(achemkit.Bucket(events).reactionnet, self.net)
+        self.assertEqual(list(reactor.mols), ["A", "B", "C", "D"])
+        self.assertEqual(reactor.statistics()["tested"], 10)
+        self.assertEqual(reactor.statistics()["untested"], 0)
+        reactor.close()
+        
+class TestItterativeSkipElastic(unittest.TestCase):
+    
+    def setUp(self): 
+        self.rates = {(achemkit.OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])):0.1}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.mols = [mol for mol in self.net.seen*10]
+        self.achem = achemkit.AChemReactionNetwork(self.net)
+        
+    def test_skipelastic(self):
+        events = achemkit.sim_itterative(self.achem, self.mols, 50, skipelastic=True)
+        buck = achemkit.Bucket(events)
+        self.assertEqual(set(buck.reactionnet.reactions), set(self.net.reactions))
+        
+    def test_skipelastic_equivalence(self):
+        """
+        Skipping elastic collisions should give the same number of reactive
+        collisions on average.
+        """
+        rng = random.Random(42)
+        repeats = 200
+        skipped = []
+        counted = []
+        for i in xrange(repeats):
+            reactor = achemkit.ReactorItterative(self.achem, self.mols, rng, skipelastic=True)
+            skipped.append(len(tuple(reactor.do(20))))
+            self.assertEqual(reactor.time, 20.0)
+            self.assertEqual(reactor.elastic + skipped[-1], 19)
+            events = achemkit.sim_itterative(self.achem, self.mols, 20, rng)
+            counted.append(len([e for e in events if e.reactants != e.products]))
+        self.assertAlmostEqual(sum(skipped) / float(repeats), sum(counted) / float(repeats), delta=0.5)
+        
+    def test_elasticrecords(self):
+        plain = achemkit.ReactorItterative(self.achem, self.mols, 42, skipelastic=True)
+        expected = list(plain.do(50))
+        reactor = achemkit.ReactorItterative(self.achem, self.mols, 42, skipelastic=True, elasticrecords=True)
+        events = list(reactor.do(50))
+        self.assertEqual(events, expected)
+        self.assertTrue(reactor.elasticruns)
+        self.assertEqual(sum(count for runtime, count in reactor.elasticruns), reactor.elastic)
+        self.assertEqual(reactor.elastic, plain.elastic)
+        times = [runtime for runtime, count in reactor.elasticruns]
+        self.assertEqual(times, sorted(times))
+        #the event stream only holds reactions
+        self.assertEqual(set(achemkit.Bucket(events).reactionnet.reactions), set(self.net.reactions))
+        reactor = achemkit.ReactorItterative(self.achem, self.mols, 1, skipelastic=True, elasticrecords=True)
+        sink = NetworkSink()
+        reactor.run(500, sink)
+        self.assertTrue(len(reactor.elasticruns) > 1)
+        self.assertEqual(set(sink.reactionnet.reactions), set(self.net.reactions))
+        
 if __name__=="__main__":
     unittest.main()
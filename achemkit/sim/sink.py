@@ -0,0 +1,385 @@
+"""
+Event sinks that consume the reactions of a simulation as they happen, rather
+than collecting every :py:class:`achemkit.Event` in memory first.
+
+Give a sink to :py:meth:`achemkit.Reactor.run`, which calls
+:py:meth:`Sink.event` for every reaction with its time, reactants, products
+and rate constant, or :py:meth:`Sink.batch` for batches of reactions. Reactors
+that support it do so without creating an :py:class:`achemkit.Event` object
+for each reaction.
+
+:py:class:`TextLogSink`
+    Writes a bucket log file, see :ref:`bucket_file_format`.
+
+:py:class:`BinaryLogSink`
+    Writes a compact binary log, read back by :py:func:`read_binary_log`.
+
+:py:class:`NetworkSink`
+    Accumulates the :py:class:`achemkit.ReactionNetwork` of the reactions
+    seen, as :py:attr:`achemkit.Bucket.reactionnet` does.
+
+:py:class:`PopulationSink`
+    Records the number of molecules of each species at regular intervals.
+
+:py:class:`CountSink`
+    Counts how many times each reaction happened.
+
+:py:class:`MultiSink`
+    Passes every reaction to several sinks, so one simulation can feed them
+    all.
+"""
+
+import math
+import struct
+import collections
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle as pickle
+
+from achemkit import OrderedFrozenBag
+from achemkit import ReactionNetwork
+from achemkit import Event
+from achemkit.bucket import event_to_line, EventBatch
+
+_SPECIES = struct.Struct("<cII")
+_EVENT = struct.Struct("<cdIId")
+_ID = struct.Struct("<I")
+
+class Sink(object):
+    """
+    Abstract class that defines the interface of event sinks.
+
+    Sinks can be used in a ``with`` statement, which calls :py:meth:`close`
+    at the end.
+    """
+
+    def event(self, time, reactants, products, rateconstant=None):
+        """
+        Consume a single reaction.
+
+        This is an abstract method that must be implemented by subclasses.
+
+        :param float time: Time of the reaction.
+        :param reactants: Sequence of molecules consumed.
+        :param products: Sequence of molecules produced.
+        :param rateconstant: Rate constant of the reaction, if known.
+        """
+        raise NotImplementedError, "Sink is an abstract class"
+
+    def batch(self, reactions):
+        """
+        Consume a batch of reactions from :py:meth:`achemkit.Reactor.do_batches`,
+        either a list of tuples of (time, reactants, products, rate constant)
+        or an :py:class:`achemkit.bucket.EventBatch`.
+
+        Subclasses can override this to handle a whole batch at once.
+        """
+        event = self.event
+        for reaction in reactions:
+            event(*reaction)
+
+    def close(self):
+        """
+        Finish consuming reactions, e.g. by flushing any files.
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def _open(outfile, mode):
+    """
+    Internal function to open a file if given a filename.
+
+    :rtype: tuple of (file object, True if it was opened here).
+    """
+    if isinstance(outfile, basestring):
+        return open(outfile, mode), True
+    return outfile, False
+
+
+class TextLogSink(Sink):
+    """
+    Writes reactions to a bucket log file, see :ref:`bucket_file_format`, as
+    read by :py:meth:`achemkit.Bucket.from_file`.
+    """
+
+    def __init__(self, outfile):
+        """
+        :param outfile: Filename or file object to write to. A file object is
+                        not closed by :py:meth:`close`.
+        """
+        self.outfile, self._owned = _open(outfile, "w")
+        self._write = self.outfile.write
+
+    def event(self, time, reactants, products, rateconstant=None):
+        self._write(event_to_line(time, reactants, products, rateconstant))
+
+    def close(self):
+        if self._owned:
+            self.outfile.close()
+        else:
+            self.outfile.flush()
+
+
+class BinaryLogSink(Sink):
+    """
+    Writes reactions to a compact binary log.
+
+    Each molecular species is written once, pickled, the first time it is
+    seen and numbered. After that it is written as its number, so a reaction
+    takes a few bytes per molecule however large the molecules are. The
+    numbers of reactants and products are each written as 32-bit unsigned
+    integers.
+    """
+
+    def __init__(self, outfile):
+        """
+        :param outfile: Filename or file object to write to. A file object is
+                        not closed by :py:meth:`close`.
+        """
+        self.outfile, self._owned = _open(outfile, "wb")
+        self._write = self.outfile.write
+        self._ids = {}
+
+    def _id(self, mol):
+        """
+        Internal function to get the number of a molecular species, writing it
+        out if it is new.
+        """
+        try:
+            return self._ids[mol]
+        except KeyError:
+            i = len(self._ids)
+            self._ids[mol] = i
+            data = pickle.dumps(mol, 2)
+            self._write(_SPECIES.pack("S", i, len(data)))
+            self._write(data)
+            return i
+
+    def event(self, time, reactants, products, rateconstant=None):
+        ids = [self._id(mol) for mol in reactants]
+        ids.extend(self._id(mol) for mol in products)
+        if rateconstant is None:
+            rateconstant = float("nan")
+        self._write(_EVENT.pack("E", time, len(reactants), len(products), rateconstant))
+        self._write(struct.pack("<{0}I".format(len(ids)), *ids))
+
+    def close(self):
+        if self._owned:
+            self.outfile.close()
+        else:
+            self.outfile.flush()
+
+
+def read_binary_log(infile):
+    """
+    Read a log written by :py:class:`BinaryLogSink`.
+
+    :param infile: Filename or file object to read from.
+    :rtype: yields :py:class:`achemkit.Event` objects, e.g. for
+            :py:class:`achemkit.Bucket`.
+    """
+    infile, owned = _open(infile, "rb")
+    species = []
+    while True:
+        tag = infile.read(1)
+        if tag == "":
+            break
+        if tag == "S":
+            i, length = struct.unpack("<II", infile.read(_SPECIES.size - 1))
+            assert i == len(species)
+            species.append(pickle.loads(infile.read(length)))
+        elif tag == "E":
+            time, noreactants, noproducts, rateconstant = struct.unpack("<dIId", infile.read(_EVENT.size - 1))
+            count = noreactants + noproducts
+            ids = struct.unpack("<{0}I".format(count), infile.read(_ID.size * count))
+            if math.isnan(rateconstant):
+                rateconstant = None
+            yield Event(time, [species[i] for i in ids[:noreactants]],
+                        [species[i] for i in ids[noreactants:]], rateconstant)
+        else:
+            raise ValueError("invalid binary log record ("+repr(tag)+")")
+    if owned:
+        infile.close()
+
+
+class NetworkSink(Sink):
+    """
+    Accumulates the reaction network of the reactions seen.
+
+    As for :py:attr:`achemkit.Bucket.reactionnet`, reactions without a rate
+    constant have a rate of the number of times they happened.
+    """
+
+    def __init__(self):
+        self.rates = {}
+
+    def event(self, time, reactants, products, rateconstant=None):
+        reaction = (OrderedFrozenBag(reactants), OrderedFrozenBag(products))
+        if rateconstant is None:
+            self.rates[reaction] = self.rates.get(reaction, 0) + 1
+        elif reaction not in self.rates:
+            self.rates[reaction] = rateconstant
+        else:
+            assert self.rates[reaction] == rateconstant
+
+    @property
+    def reactionnet(self):
+        """
+        :py:class:`achemkit.ReactionNetwork` of the reactions seen so far.
+        """
+        return ReactionNetwork(self.rates)
+
+
+class CountSink(Sink):
+    """
+    Counts how many times each reaction happened.
+
+    ``counts`` is a dictionary of (reactants, products) to number of times,
+    where reactants and products are :py:class:`achemkit.OrderedFrozenBag`
+    objects.
+    """
+
+    def __init__(self):
+        self.counts = collections.defaultdict(int)
+        self.total = 0
+
+    def event(self, time, reactants, products, rateconstant=None):
+        self.counts[OrderedFrozenBag(reactants), OrderedFrozenBag(products)] += 1
+        self.total += 1
+
+    def batch(self, reactions):
+        if not isinstance(reactions, EventBatch):
+            return super(CountSink, self).batch(reactions)
+        #count ids, then look up each reaction once
+        ids = collections.defaultdict(int)
+        for i in reactions.ids:
+            ids[i] += 1
+        for i, count in ids.iteritems():
+            reactants, products, rateconstant = reactions.reactions[i]
+            self.counts[reactants, products] += count
+        self.total += len(reactions)
+
+
+class IntervalSink(Sink):
+    """
+    Abstract class of sinks that take a sample every `interval` units of time,
+    from time zero. The sample at each time includes all reactions up to and
+    including that time.
+
+    Subclasses implement :py:meth:`_sample`, and call :py:meth:`_sample_before`
+    with the time of each reaction before applying it.
+    """
+
+    def __init__(self, interval=1.0, end=None):
+        """
+        :param interval: Time between samples. If None, no interval samples
+                         are taken.
+        :param end: If given, no samples are taken after this time.
+        """
+        self.interval = interval
+        self.end = end
+        self._samples = 0
+
+    def _due(self, time, inclusive):
+        """
+        Internal function for whether the next sample is at or before `time`.
+        """
+        if self.interval is None:
+            return False
+        sampletime = self._samples * self.interval
+        if self.end is not None and sampletime > self.end:
+            return False
+        if inclusive:
+            return sampletime <= time
+        return sampletime < time
+
+    def _sample(self, time):
+        """
+        Internal function to take a sample of the current state at `time`.
+
+        This is an abstract method that must be implemented by subclasses.
+        """
+        raise NotImplementedError, "IntervalSink is an abstract class"
+
+    def _sample_before(self, time):
+        """
+        Internal function to take the samples due before a reaction at `time`.
+        """
+        #the previous reaction was the last before any samples due
+        while self._due(time, False):
+            self._sample(self._samples * self.interval)
+            self._samples += 1
+
+    def finish(self, time):
+        """
+        Take any samples up to and including `time`, e.g. the end of the
+        simulation, that are not yet taken.
+        """
+        while self._due(time, True):
+            self._sample(self._samples * self.interval)
+            self._samples += 1
+
+
+class PopulationSink(IntervalSink):
+    """
+    Records the number of molecules of each molecular species every
+    `interval` units of time, from time zero.
+
+    ``data`` is a dictionary of time to dictionary of molecular species to
+    number of molecules, as for :py:meth:`achemkit.Bucket.get_mol_counts`,
+    suitable for :py:func:`achemkit.utils.datafile.data_to_file`. The numbers
+    at each time include all reactions up to and including that time.
+    """
+
+    def __init__(self, mols, interval=1.0, end=None):
+        """
+        :param mols: Initial molecules.
+        :param interval: Time between samples.
+        :param end: If given, no samples are recorded after this time.
+        """
+        super(PopulationSink, self).__init__(interval, end)
+        self.counts = {}
+        for mol in mols:
+            self.counts[mol] = self.counts.get(mol, 0) + 1
+        self.data = {}
+
+    def _sample(self, time):
+        self.data[time] = dict(self.counts)
+
+    def event(self, time, reactants, products, rateconstant=None):
+        self._sample_before(time)
+        counts = self.counts
+        for mol in reactants:
+            counts[mol] -= 1
+        for mol in products:
+            counts[mol] = counts.get(mol, 0) + 1
+
+
+class MultiSink(Sink):
+    """
+    Passes every reaction to each of several sinks, in order.
+    """
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+        self._events = [sink.event for sink in sinks]
+
+    def event(self, time, reactants, products, rateconstant=None):
+        for event in self._events:
+            event(time, reactants, products, rateconstant)
+
+    def batch(self, reactions):
+        for sink in self.sinks:
+            sink.batch(reactions)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
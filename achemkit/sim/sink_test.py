@@ -0,0 +1,112 @@
+"""
+This is the test harness for :py:mod:`achemkit.sim.sink`.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import StringIO
+
+import achemkit
+from achemkit import OrderedFrozenBag
+from achemkit.sim.sink import TextLogSink, BinaryLogSink, read_binary_log
+from achemkit.sim.sink import NetworkSink, CountSink, PopulationSink, MultiSink
+
+
+class TestSinks(unittest.TestCase):
+
+    def setUp(self):
+        self.rates = {(OrderedFrozenBag(["A", "B"]), OrderedFrozenBag(["B", "C"])): 1.0,
+                      (OrderedFrozenBag(["C", "C"]), OrderedFrozenBag(["A"])): 1.0}
+        self.net = achemkit.ReactionNetwork(self.rates)
+        self.achem = achemkit.AChemReactionNetwork(self.net)
+        self.mols = ["A"] * 20 + ["B"] * 10 + ["C"] * 10
+        self.events = list(achemkit.ReactorItterative(self.achem, self.mols, 42).do(200))
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def reactor(self):
+        return achemkit.ReactorItterative(self.achem, self.mols, 42)
+
+    def test_text(self):
+        outfile = StringIO.StringIO()
+        sink = TextLogSink(outfile)
+        self.assertEqual(self.reactor().run(200, sink), len(self.events))
+        sink.close()
+        bucket = achemkit.Bucket.from_string(outfile.getvalue())
+        self.assertEqual(bucket.events, self.events)
+
+    def test_binary(self):
+        filename = os.path.join(self.directory, "events.bin")
+        with BinaryLogSink(filename) as sink:
+            self.reactor().run(200, sink)
+        self.assertEqual(list(read_binary_log(filename)), self.events)
+        rated = achemkit.Event(1.5, ["A"], [], 0.25)
+        outfile = StringIO.StringIO()
+        sink = BinaryLogSink(outfile)
+        sink.event(rated.time, rated.reactants, rated.products, rated.rateconstant)
+        events = list(read_binary_log(StringIO.StringIO(outfile.getvalue())))
+        self.assertEqual(events, [rated])
+        self.assertEqual(events[0].rateconstant, 0.25)
+        #more than 255 reactants or products
+        large = achemkit.Event(2.0, ["A"] * 300, ["B"] * 70000)
+        outfile = StringIO.StringIO()
+        sink = BinaryLogSink(outfile)
+        sink.event(large.time, large.reactants, large.products)
+        self.assertEqual(list(read_binary_log(StringIO.StringIO(outfile.getvalue()))), [large])
+
+    def test_network(self):
+        sink = NetworkSink()
+        self.reactor().run(200, sink)
+        self.assertEqual(sink.reactionnet, achemkit.Bucket(self.events).reactionnet)
+
+    def test_count(self):
+        sink = CountSink()
+        self.reactor().run(200, sink)
+        self.assertEqual(sink.total, len(self.events))
+        for reaction in self.rates:
+            self.assertTrue(sink.counts[reaction] > 0)
+        self.assertEqual(sum(sink.counts.values()), sink.total)
+
+    def test_batches(self):
+        for columnar in (False, True):
+            counter = CountSink()
+            network = NetworkSink()
+            self.reactor().run(200, MultiSink(counter, network), 32, columnar)
+            reference = CountSink()
+            self.reactor().run(200, reference)
+            self.assertEqual(counter.counts, reference.counts)
+            self.assertEqual(counter.total, reference.total)
+            self.assertEqual(network.reactionnet, achemkit.Bucket(self.events).reactionnet)
+
+    def test_population(self):
+        sink = PopulationSink(self.mols, 10.0)
+        self.reactor().run(200, sink)
+        sink.finish(200)
+        expected = achemkit.Bucket(self.events).get_mol_counts(self.mols, 10.0)
+        self.assertEqual(sorted(sink.data), sorted(expected))
+        for time in expected:
+            for mol in expected[time]:
+                self.assertEqual(sink.data[time].get(mol, 0), expected[time][mol])
+
+    def test_multi(self):
+        counter = CountSink()
+        network = NetworkSink()
+        sink = MultiSink(counter, network)
+        self.reactor().run(200, sink)
+        sink.close()
+        self.assertEqual(counter.total, len(self.events))
+        self.assertEqual(network.reactionnet, achemkit.Bucket(self.events).reactionnet)
+
+    def test_reactors(self):
+        #reactors without their own implementation use their events
+        for reactor in (achemkit.ReactorGillespieLike(self.achem, self.mols, 42),
+                        achemkit.ReactorStepwise(self.achem, self.mols, 42),
+                        achemkit.ReactorEnumerate(self.achem, ["A", "B"])):
+            sink = CountSink()
+            reactor.run(10, sink)
+            self.assertTrue(sink.total > 0)
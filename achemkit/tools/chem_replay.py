@@ -0,0 +1,40 @@
+"""
+
+This is a command-line tool for replaying events of a simulation of a `.chem` reaction network from the markers recorded by a :py:class:`~achemkit.sim.replay.ReplayRecorder`, see :py:mod:`achemkit.sim.replay`.
+
+The reactor is created with its default settings, which must be those of the recorded simulation.
+
+"""
+
+import sys
+import argparse
+
+import achemkit
+from achemkit import ReactionNetwork, AChemReactionNetwork
+from achemkit.sim.replay import replay, read_markers, marker_class
+from achemkit.sim.sink import TextLogSink
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays events of a simulation from recorded markers.")
+    parser.add_argument("chem", help="reaction network the simulation used, in .chem format")
+    parser.add_argument("markers", help="file of markers written by a ReplayRecorder")
+    parser.add_argument("-e", "--event", action="store", type=int, help="number of the first event to replay", default=0)
+    parser.add_argument("-n", "--count", action="store", type=int, help="number of events to replay", default=1)
+    parser.add_argument("-o", "--outfile", action="store", help="write to OUTFILE in .log format (if ommited, use stdout)", metavar="OUTFILE")
+    args = parser.parse_args()
+
+    achem = AChemReactionNetwork(ReactionNetwork.from_filename(args.chem))
+    reactorclass = getattr(achemkit, marker_class(args.markers))
+    reactor = reactorclass(achem, [])
+
+    if args.outfile is None:
+        sink = TextLogSink(sys.stdout)
+    else:
+        sink = TextLogSink(args.outfile)
+    for event in replay(reactor, read_markers(args.markers), args.event, args.count):
+        sink.event(event.time, event.reactants, event.products, event.rateconstant)
+    sink.close()
+
+
+if __name__=="__main__":
+    main()
@@ -47,6 +47,10 @@ class FrozenBag(collections.Set):
     def count(self, item):
         return self._items.count(item)
         
+    def __reduce__(self):
+        #only the items are needed, which keeps pickles small
+        return (self.__class__, (self._items,))
+        
     def __getstate__(self):
         return self._items
         
@@ -152,6 +156,10 @@ class OrderedFrozenBag(collections.Set):
     def __getitem__(self, index):
         return self._order[index]
         
+    def __reduce__(self):
+        #the bag is rebuilt from the order, so is not pickled
+        return (self.__class__, (self._order,))
+        
     def __getstate__(self):
         return (self._bag, self._order)
         
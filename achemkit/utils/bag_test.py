@@ -56,6 +56,13 @@ class TestFrozenBag(unittest.TestCase):
         newbag = pickle.loads(pickstr)
         self.assertEqual(self.bag, newbag)
         
+    def test_pickle_compact(self):
+        pickstr = pickle.dumps(self.bag, 2)
+        newbag = pickle.loads(pickstr)
+        self.assertEqual(self.bag, newbag)
+        self.assertEqual(tuple(self.bag), tuple(newbag))
+        self.assertEqual(newbag.__class__, self.bag.__class__)
+        
 
 class TestBag(TestFrozenBag):
     
@@ -0,0 +1,444 @@
+"""
+Containers that keep their contents on disk rather than in memory, for
+enumerations that produce more items than will fit in memory.
+
+:py:class:`DiskSet`
+    Set of items that only supports adding and membership tests. Items are
+    stored as fixed-size digests in sorted runs on disk, fronted by a
+    :py:class:`BloomFilter` so that most tests for new items do not read from
+    disk.
+
+:py:class:`DiskList`
+    Append-only list of picklable items.
+
+:py:class:`DiskQueue`
+    First-in first-out queue of picklable items.
+
+Each container writes to files that start with a given prefix. Changes are
+only made durable by :py:meth:`state`, which flushes them to disk and returns a
+small picklable description of the container. Passing that description back
+when the container is opened again restores the container as it was at that
+point, discarding any changes made after it. The owner of several containers
+can therefore save all of their states together (e.g. with
+:py:func:`write_state`) to get a consistent checkpoint that can be resumed
+after an interruption.
+"""
+
+import os
+import math
+import mmap
+import heapq
+import struct
+import hashlib
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle as pickle
+
+_DIGESTSIZE = 16
+_OFFSET = struct.Struct("<Q")
+
+def write_state(filename, state):
+    """
+    Atomically write a picklable state to a file, so that an interruption
+    leaves either the old or the new state.
+    """
+    tmpname = filename + ".tmp"
+    outfile = open(tmpname, "wb")
+    pickle.dump(state, outfile, 2)
+    outfile.flush()
+    os.fsync(outfile.fileno())
+    outfile.close()
+    os.rename(tmpname, filename)
+
+def read_state(filename):
+    """
+    Read a state written by :py:func:`write_state`, or None if there is none.
+    """
+    if not os.path.exists(filename):
+        return None
+    return pickle.load(open(filename, "rb"))
+
+def _sync(fileobj):
+    """
+    Internal function to flush a file to disk.
+    """
+    fileobj.flush()
+    os.fsync(fileobj.fileno())
+
+def _open(filename, length):
+    """
+    Internal function to open a file for reading and writing, truncated to
+    `length` bytes.
+    """
+    if not os.path.exists(filename):
+        open(filename, "wb").close()
+    fileobj = open(filename, "r+b")
+    fileobj.truncate(length)
+    fileobj.seek(0, os.SEEK_END)
+    return fileobj
+
+
+class BloomFilter(object):
+    """
+    Probabilistic set of digests that may report items as present when they
+    are not, but never the reverse.
+    """
+
+    def __init__(self, capacity, error=0.01):
+        """
+        :param capacity: Number of items expected.
+        :param error: Acceptable probability of a false positive when
+                      `capacity` items have been added.
+        """
+        capacity = max(capacity, 1)
+        self.size = int(math.ceil(-capacity * math.log(error) / (math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / float(capacity) * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _indexes(self, digest):
+        """
+        Internal function to get the bits of a digest, by double hashing.
+        """
+        first, second = struct.unpack("<QQ", digest[:16])
+        for i in xrange(self.hashes):
+            yield (first + i * second) % self.size
+
+    def add(self, digest):
+        for i in self._indexes(digest):
+            self.bits[i >> 3] |= 1 << (i & 7)
+
+    def __contains__(self, digest):
+        for i in self._indexes(digest):
+            if not self.bits[i >> 3] & (1 << (i & 7)):
+                return False
+        return True
+
+
+class DiskSet(object):
+    """
+    Set of items stored on disk.
+
+    Items are identified by the MD5 digest of their key, which by default is
+    their :py:func:`repr`, so items with equal keys are equal. Every new
+    digest is appended to a journal file and held in memory until there are
+    `buffersize` of them, when they are written out as a sorted run. Runs are
+    searched by binary search, and are merged when there are more than
+    `maxruns`.
+    """
+
+    def __init__(self, prefix, state=None, key=repr, buffersize=100000, maxruns=8, capacity=1000000, error=0.01):
+        """
+        :param prefix: Prefix of the names of the files to use.
+        :param state: Value from :py:meth:`state` to resume from, or None to
+                      start empty.
+        :param key: Function to convert an item to a string that identifies
+                    it.
+        :param buffersize: Number of digests to hold in memory.
+        :param maxruns: Number of sorted runs on disk before they are merged.
+        :param capacity: Expected number of items, for the Bloom filter.
+        :param error: False positive rate of the Bloom filter.
+        """
+        self.prefix = prefix
+        self.key = key
+        self.buffersize = buffersize
+        self.maxruns = maxruns
+        self.capacity = capacity
+        self.error = error
+        if state is None:
+            state = {"length": 0, "runs": [], "nextrun": 0}
+        self._length = state["length"]
+        self._nextrun = state["nextrun"]
+        #runs as (filename, start, end) ranges of the journal
+        self._runs = [tuple(x) for x in state["runs"]]
+        self._obsolete = []
+        self._maps = {}
+        self._journal = _open(prefix + ".journal", self._length * _DIGESTSIZE)
+        self._bloom = BloomFilter(max(capacity, self._length * 2), error)
+        #rebuild the Bloom filter and buffer from the journal
+        self._journal.seek(0)
+        buffered = self._runs[-1][2] if self._runs else 0
+        self._buffer = set()
+        for i in xrange(self._length):
+            digest = self._journal.read(_DIGESTSIZE)
+            self._bloom.add(digest)
+            if i >= buffered:
+                self._buffer.add(digest)
+        self._journal.seek(0, os.SEEK_END)
+
+    def _digest(self, item):
+        return hashlib.md5(self.key(item)).digest()
+
+    def _map(self, filename):
+        """
+        Internal function to get a memory map of a run.
+        """
+        if filename not in self._maps:
+            runfile = open(filename, "rb")
+            if os.path.getsize(filename) == 0:
+                self._maps[filename] = ""
+            else:
+                self._maps[filename] = mmap.mmap(runfile.fileno(), 0, access=mmap.ACCESS_READ)
+            runfile.close()
+        return self._maps[filename]
+
+    def _in_runs(self, digest):
+        """
+        Internal function to binary search the runs for a digest.
+        """
+        for filename, start, end in self._runs:
+            data = self._map(filename)
+            low = 0
+            high = end - start
+            while low < high:
+                middle = (low + high) // 2
+                value = data[middle * _DIGESTSIZE:(middle + 1) * _DIGESTSIZE]
+                if value < digest:
+                    low = middle + 1
+                elif value > digest:
+                    high = middle
+                else:
+                    return True
+        return False
+
+    def _contains_digest(self, digest):
+        if digest not in self._bloom:
+            return False
+        if digest in self._buffer:
+            return True
+        return self._in_runs(digest)
+
+    def __contains__(self, item):
+        return self._contains_digest(self._digest(item))
+
+    def __len__(self):
+        return self._length
+
+    def add(self, item):
+        """
+        Add an item.
+
+        :rtype: True if the item was not already present.
+        """
+        digest = self._digest(item)
+        if self._contains_digest(digest):
+            return False
+        self._journal.write(digest)
+        self._bloom.add(digest)
+        self._buffer.add(digest)
+        self._length += 1
+        if len(self._buffer) >= self.buffersize:
+            self._write_run()
+        return True
+
+    def _write_run(self):
+        """
+        Internal function to write the buffer out as a sorted run, merging
+        runs if there are too many.
+        """
+        start = self._runs[-1][2] if self._runs else 0
+        filename = "{0}.run{1}".format(self.prefix, self._nextrun)
+        self._nextrun += 1
+        runfile = open(filename, "wb")
+        runfile.write("".join(sorted(self._buffer)))
+        _sync(runfile)
+        runfile.close()
+        self._runs.append((filename, start, self._length))
+        self._buffer = set()
+        if len(self._runs) > self.maxruns:
+            self._merge_runs()
+
+    def _iter_run(self, filename, count):
+        """
+        Internal function to iterate over the digests of a run in order.
+        """
+        data = self._map(filename)
+        for i in xrange(count):
+            yield data[i * _DIGESTSIZE:(i + 1) * _DIGESTSIZE]
+
+    def _merge_runs(self):
+        """
+        Internal function to merge all runs into one. The old runs are only
+        deleted by :py:meth:`cleanup`, as a previous state may refer to them.
+        """
+        filename = "{0}.run{1}".format(self.prefix, self._nextrun)
+        self._nextrun += 1
+        runfile = open(filename, "wb")
+        runs = [self._iter_run(runname, end - start) for runname, start, end in self._runs]
+        for digest in heapq.merge(*runs):
+            runfile.write(digest)
+        _sync(runfile)
+        runfile.close()
+        self._obsolete.extend(runname for runname, start, end in self._runs)
+        self._runs = [(filename, 0, self._length - len(self._buffer))]
+
+    def state(self):
+        """
+        Make all items durable.
+
+        :rtype: picklable description to resume from.
+        """
+        _sync(self._journal)
+        return {"length": self._length, "runs": list(self._runs), "nextrun": self._nextrun}
+
+    def cleanup(self):
+        """
+        Delete files that are no longer needed, once the owner has durably
+        saved a newer :py:meth:`state`.
+        """
+        for filename in self._obsolete:
+            mapped = self._maps.pop(filename, None)
+            if mapped:
+                mapped.close()
+            if os.path.exists(filename):
+                os.remove(filename)
+        self._obsolete = []
+
+    def close(self):
+        for mapped in self._maps.values():
+            if mapped:
+                mapped.close()
+        self._maps = {}
+        self._journal.close()
+
+
+class DiskList(object):
+    """
+    Append-only list of picklable items stored on disk.
+
+    Items are pickled one after another in a data file, and the offset of each
+    is stored in an index file so items can be read in any order.
+    """
+
+    def __init__(self, prefix, state=None):
+        """
+        :param prefix: Prefix of the names of the files to use.
+        :param state: Value from :py:meth:`state` to resume from, or None to
+                      start empty.
+        """
+        self.prefix = prefix
+        if state is None:
+            state = {"length": 0, "size": 0}
+        self._length = state["length"]
+        self._size = state["size"]
+        self._data = _open(prefix + ".data", self._size)
+        self._index = _open(prefix + ".index", self._length * _OFFSET.size)
+
+    def __len__(self):
+        return self._length
+
+    def append(self, item):
+        self._index.write(_OFFSET.pack(self._size))
+        data = pickle.dumps(item, 2)
+        self._data.write(data)
+        self._size += len(data)
+        self._length += 1
+
+    def _offset(self, i):
+        """
+        Internal function to get the offset of item `i`.
+        """
+        if i >= self._length:
+            return self._size
+        self._index.flush()
+        self._index.seek(i * _OFFSET.size)
+        offset = _OFFSET.unpack(self._index.read(_OFFSET.size))[0]
+        self._index.seek(0, os.SEEK_END)
+        return offset
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._length
+        if i < 0 or i >= self._length:
+            raise IndexError("DiskList index out of range")
+        start = self._offset(i)
+        end = self._offset(i + 1)
+        self._data.flush()
+        self._data.seek(start)
+        data = self._data.read(end - start)
+        self._data.seek(0, os.SEEK_END)
+        return pickle.loads(data)
+
+    def iter_from(self, start):
+        """
+        Iterate over the items from index `start` onwards, as they were when
+        this was called.
+        """
+        length = self._length
+        if start >= length:
+            return
+        self._data.flush()
+        infile = open(self.prefix + ".data", "rb")
+        infile.seek(self._offset(start))
+        for i in xrange(start, length):
+            yield pickle.load(infile)
+        infile.close()
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def state(self):
+        """
+        Make all items durable.
+
+        :rtype: picklable description to resume from.
+        """
+        _sync(self._data)
+        _sync(self._index)
+        return {"length": self._length, "size": self._size}
+
+    def cleanup(self):
+        pass
+
+    def close(self):
+        self._data.close()
+        self._index.close()
+
+
+class DiskQueue(DiskList):
+    """
+    First-in first-out queue of picklable items stored on disk, with the
+    interface of :py:class:`collections.deque` used by
+    :py:class:`achemkit.ReactorEnumerate`.
+
+    Items taken from the queue are not removed from disk, so files only grow.
+    Items put back at the front are held in memory, so only a few should be.
+    """
+
+    def __init__(self, prefix, state=None):
+        super(DiskQueue, self).__init__(prefix, state)
+        if state is None:
+            state = {"head": 0, "front": []}
+        self._head = state["head"]
+        self._front = list(state["front"])
+
+    def __len__(self):
+        return len(self._front) + self._length - self._head
+
+    def popleft(self):
+        if self._front:
+            return self._front.pop()
+        if self._head >= self._length:
+            raise IndexError("pop from an empty DiskQueue")
+        item = self[self._head]
+        self._head += 1
+        return item
+
+    def extendleft(self, items):
+        """
+        Put items back at the front of the queue, in reverse order like
+        :py:meth:`collections.deque.extendleft`.
+        """
+        self._front.extend(items)
+
+    def __iter__(self):
+        for item in reversed(self._front):
+            yield item
+        for item in self.iter_from(self._head):
+            yield item
+
+    def state(self):
+        state = super(DiskQueue, self).state()
+        state["head"] = self._head
+        state["front"] = list(self._front)
+        return state
@@ -0,0 +1,100 @@
+"""
+This is the test harness for :py:mod:`achemkit.utils.diskset`.
+"""
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from achemkit.utils.diskset import BloomFilter, DiskSet, DiskList, DiskQueue, write_state, read_state
+
+class TestBloomFilter(unittest.TestCase):
+    
+    def test_contains(self):
+        bloom = BloomFilter(100, 0.01)
+        digests = [os.urandom(16) for i in xrange(100)]
+        for digest in digests:
+            bloom.add(digest)
+        for digest in digests:
+            self.assertTrue(digest in bloom)
+        falsepositives = sum(1 for i in xrange(1000) if os.urandom(16) in bloom)
+        self.assertTrue(falsepositives < 50)
+        
+class TestDiskContainers(unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.prefix = os.path.join(self.directory, "test")
+        
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        
+    def test_set(self):
+        diskset = DiskSet(self.prefix, buffersize=10, maxruns=3, capacity=10)
+        for i in xrange(100):
+            self.assertTrue(diskset.add(i))
+        for i in xrange(100):
+            self.assertFalse(diskset.add(i))
+            self.assertTrue(i in diskset)
+        self.assertFalse(100 in diskset)
+        self.assertEqual(len(diskset), 100)
+        diskset.cleanup()
+        #merged runs are removed
+        self.assertTrue(len([x for x in os.listdir(self.directory) if ".run" in x]) <= 4)
+        diskset.close()
+        
+    def test_set_resume(self):
+        diskset = DiskSet(self.prefix, buffersize=10, maxruns=3)
+        for i in xrange(25):
+            diskset.add(i)
+        state = diskset.state()
+        for i in xrange(25, 50):
+            diskset.add(i)
+        diskset.close()
+        #changes after the state are discarded
+        diskset = DiskSet(self.prefix, state, buffersize=10, maxruns=3)
+        self.assertEqual(len(diskset), 25)
+        self.assertTrue(24 in diskset)
+        self.assertFalse(25 in diskset)
+        self.assertTrue(diskset.add(25))
+        diskset.close()
+        
+    def test_list(self):
+        disklist = DiskList(self.prefix)
+        for i in xrange(10):
+            disklist.append(("item", i))
+        self.assertEqual(len(disklist), 10)
+        self.assertEqual(disklist[3], ("item", 3))
+        self.assertEqual(disklist[-1], ("item", 9))
+        self.assertEqual(list(disklist.iter_from(8)), [("item", 8), ("item", 9)])
+        state = disklist.state()
+        disklist.append("extra")
+        disklist.close()
+        disklist = DiskList(self.prefix, state)
+        self.assertEqual(list(disklist), [("item", i) for i in xrange(10)])
+        disklist.close()
+        
+    def test_queue(self):
+        queue = DiskQueue(self.prefix)
+        for i in xrange(5):
+            queue.append(i)
+        self.assertEqual(queue.popleft(), 0)
+        self.assertEqual(queue.popleft(), 1)
+        queue.extendleft([1, 0])
+        self.assertEqual(len(queue), 5)
+        self.assertEqual(list(queue), range(5))
+        self.assertEqual(queue.popleft(), 0)
+        state = queue.state()
+        queue.popleft()
+        queue.close()
+        queue = DiskQueue(self.prefix, state)
+        self.assertEqual([queue.popleft() for i in xrange(len(queue))], range(1, 5))
+        self.assertRaises(IndexError, queue.popleft)
+        queue.close()
+        
+    def test_state(self):
+        filename = os.path.join(self.directory, "state")
+        self.assertEqual(read_state(filename), None)
+        write_state(filename, {"a": 1})
+        self.assertEqual(read_state(filename), {"a": 1})
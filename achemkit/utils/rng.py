@@ -0,0 +1,96 @@
+"""
+Reproducible streams of random numbers for parallel simulations.
+
+Every stream is identified by the seed of the whole run and a path, a tuple of
+names or numbers such as ``(replicate,)`` or ``(compartment, "migration",
+round)``. The seed of a stream is a hash of both, so a stream does not depend
+on which other streams exist, in what order they are used, or which process
+uses them. Results are therefore the same however work is split across
+workers.
+
+For example::
+
+    root = SplitRandom(42)
+    for replicate in xrange(10):
+        reactor = ReactorGillespieLike(achem, mols, root.child(replicate))
+"""
+
+import random
+import hashlib
+
+def derive_seed(seed, *path):
+    """
+    Derive the seed of the stream at `path` from the seed of a run.
+
+    Path elements are converted with :py:func:`str`, so ``1`` and ``"1"``
+    give the same stream.
+
+    :rtype: integer of 160 bits.
+    """
+    key = ":".join(str(x) for x in (seed,) + path)
+    return int(hashlib.sha1(key).hexdigest(), 16)
+
+def new_seed():
+    """
+    A new seed for a run, from the operating system's source of randomness.
+    """
+    return random.SystemRandom().getrandbits(64)
+
+
+class SplitRandom(random.Random):
+    """
+    :py:class:`random.Random` for the stream at ``path`` from the run seed
+    ``root``, which can derive the streams below it with :py:meth:`child`.
+
+    Drawing numbers from a stream does not change its children.
+    """
+
+    def __new__(cls, seed=None, path=()):
+        #the base class only accepts a seed
+        return random.Random.__new__(cls)
+
+    def __init__(self, seed=None, path=()):
+        """
+        :param seed: Seed for the run. If not specified, one will be generated
+                     at random and stored as ``root``.
+        :param path: Path of this stream from the run seed.
+        """
+        if seed is None:
+            seed = new_seed()
+        self.root = seed
+        self.path = tuple(path)
+        random.Random.__init__(self, derive_seed(seed, *self.path))
+
+    def __reduce__(self):
+        return (self.__class__, (self.root, self.path), self.getstate())
+
+    def __repr__(self):
+        return "SplitRandom({0}, {1})".format(repr(self.root), repr(self.path))
+
+    def child(self, *path):
+        """
+        The stream below this one at `path`.
+
+        :rtype: :py:class:`SplitRandom`
+        """
+        return SplitRandom(self.root, self.path + path)
+
+    def children(self, count):
+        """
+        The first `count` streams below this one, numbered from zero.
+
+        :rtype: list of :py:class:`SplitRandom`
+        """
+        return [self.child(i) for i in xrange(count)]
+
+
+def stream(seed, *path):
+    """
+    The stream at `path` from the run seed `seed`, or below it if `seed` is
+    already a :py:class:`SplitRandom`.
+
+    :rtype: :py:class:`SplitRandom`
+    """
+    if isinstance(seed, SplitRandom):
+        return seed.child(*path)
+    return SplitRandom(seed, path)
@@ -0,0 +1,48 @@
+"""
+This is the test harness for :py:mod:`achemkit.utils.rng`.
+
+"""
+
+import pickle
+import random
+import unittest
+
+from achemkit.utils.rng import SplitRandom, derive_seed, stream
+
+class TestSplitRandom(unittest.TestCase):
+    
+    def test_derive(self):
+        self.assertEqual(derive_seed(42, 1, "a"), derive_seed(42, 1, "a"))
+        self.assertEqual(derive_seed(42, 1), derive_seed(42, "1"))
+        self.assertNotEqual(derive_seed(42, 1, 2), derive_seed(42, 2, 1))
+        self.assertNotEqual(derive_seed(42, 1), derive_seed(43, 1))
+        
+    def test_path(self):
+        root = SplitRandom(42)
+        self.assertEqual(root.child(1, 2).random(), SplitRandom(42, (1, 2)).random())
+        self.assertEqual(root.child(1).child(2).random(), stream(42, 1, 2).random())
+        self.assertEqual(stream(root, 3).path, (3,))
+        self.assertEqual(root.random(), random.Random(derive_seed(42)).random())
+        
+    def test_independent(self):
+        #children do not depend on use of the parent or of each other
+        root = SplitRandom(42)
+        expected = [child.random() for child in root.children(4)]
+        root.random()
+        children = root.children(4)
+        children.reverse()
+        self.assertEqual([child.random() for child in children], expected[::-1])
+        self.assertEqual(len(set(expected)), 4)
+        
+    def test_pickle(self):
+        rng = SplitRandom(42, ("a",))
+        rng.random()
+        copy = pickle.loads(pickle.dumps(rng))
+        self.assertEqual(copy.path, ("a",))
+        self.assertEqual(copy.random(), rng.random())
+        self.assertEqual(copy.child(1).random(), rng.child(1).random())
+        
+    def test_random(self):
+        first = SplitRandom()
+        second = SplitRandom()
+        self.assertNotEqual(first.root, second.root)
@@ -0,0 +1,250 @@
+"""
+Precompiled samplers for drawing from discrete distributions repeatedly.
+
+Unlike :py:func:`achemkit.utils.utils.get_sample`, these do the work of
+interpreting the distribution once, when they are created, so that each draw
+is as cheap as possible. :py:func:`make_sampler` creates the sampler for any
+distribution that :py:func:`~achemkit.utils.utils.get_sample` accepts.
+
+Every sampler draws one value with ``sample(rng)`` and many with
+``samples(count, rng)``. If `rng` is a :py:class:`numpy.random.RandomState`,
+the random numbers for :py:meth:`Sampler.samples` are drawn and mapped to
+values as arrays rather than one at a time.
+"""
+
+class AliasTable(object):
+    """
+    Walker's alias method for drawing indexes in proportion to a sequence of
+    non-negative weights in O(1) time, after O(n) construction.
+    """
+    __slots__ = ["_probabilities", "_aliases", "_n"]
+
+    def __init__(self, weights):
+        """
+        :param weights: Sequence of non-negative weights, at least one of
+                        which must be positive.
+        """
+        weights = [float(weight) for weight in weights]
+        n = len(weights)
+        total = sum(weights)
+        if n == 0 or total <= 0.0:
+            raise ValueError("no weight to sample from")
+        for weight in weights:
+            if weight < 0.0:
+                raise ValueError("negative weight ("+repr(weight)+")")
+
+        #Vose's construction
+        scaled = [weight * n / total for weight in weights]
+        probabilities = [1.0] * n
+        aliases = range(n)
+        small = [i for i in xrange(n) if scaled[i] < 1.0]
+        large = [i for i in xrange(n) if scaled[i] >= 1.0]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            probabilities[less] = scaled[less]
+            aliases[less] = more
+            scaled[more] = (scaled[more] + scaled[less]) - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+        #anything left over is only due to rounding, so is always itself
+        self._probabilities = tuple(probabilities)
+        self._aliases = tuple(aliases)
+        self._n = n
+
+    def __len__(self):
+        return self._n
+
+    def sample(self, rng):
+        """
+        Draw an index at random in proportion to its weight.
+
+        :param rng: Instance of :py:class:`random.Random` or equivalent.
+        """
+        u = rng.random() * self._n
+        i = int(u)
+        if u - i < self._probabilities[i]:
+            return i
+        else:
+            return self._aliases[i]
+
+    def samples(self, count, rng):
+        """
+        Draw `count` indexes at random in proportion to their weights.
+
+        :param rng: Instance of :py:class:`random.Random` or equivalent, or of
+                    :py:class:`numpy.random.RandomState`.
+        :rtype: list of indexes, or NumPy array if `rng` is a
+                :py:class:`numpy.random.RandomState`.
+        """
+        if _is_numpy(rng):
+            import numpy
+            u = rng.random_sample(count) * self._n
+            i = u.astype(numpy.intp)
+            probabilities = numpy.array(self._probabilities)
+            aliases = numpy.array(self._aliases, dtype=numpy.intp)
+            return numpy.where(u - i < probabilities[i], i, aliases[i])
+        return [self.sample(rng) for x in xrange(count)]
+
+
+def _is_numpy(rng):
+    """
+    Internal function for whether `rng` is a
+    :py:class:`numpy.random.RandomState`, without importing NumPy.
+    """
+    return hasattr(rng, "random_sample")
+
+def _take(values, indexes):
+    """
+    Internal function to look up a NumPy array of indexes in a tuple of
+    values of any type.
+    """
+    import numpy
+    array = numpy.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        #assigned singly so that tuples are not unpacked into a new axis
+        array[i] = value
+    return array[indexes].tolist()
+
+
+class Sampler(object):
+    """
+    Abstract class that defines the interface of samplers.
+    """
+    __slots__ = []
+
+    def sample(self, rng):
+        """
+        Draw a value at random.
+
+        :param rng: Instance of :py:class:`random.Random` or equivalent.
+        """
+        raise NotImplementedError, "Sampler is an abstract class"
+
+    def samples(self, count, rng):
+        """
+        Draw `count` values at random, in the same order as that many calls of
+        :py:meth:`sample` would.
+
+        :param rng: Instance of :py:class:`random.Random` or equivalent, or of
+                    :py:class:`numpy.random.RandomState`.
+        :rtype: list of values.
+        """
+        return [self.sample(rng) for x in xrange(count)]
+
+    def indexes(self, count, rng):
+        """
+        Draw `count` values at random as their indexes in ``values``, the
+        tuple of values this sampler can draw, for use with NumPy.
+
+        :param rng: Instance of :py:class:`numpy.random.RandomState`.
+        :rtype: NumPy array of indexes.
+        """
+        raise NotImplementedError, "Sampler is an abstract class"
+
+
+class ConstantSampler(Sampler):
+    """
+    Always the same value, without using the random number generator.
+    """
+    __slots__ = ["value"]
+
+    def __init__(self, value):
+        self.value = value
+
+    def sample(self, rng=None):
+        return self.value
+
+    def samples(self, count, rng=None):
+        return [self.value] * count
+
+    @property
+    def values(self):
+        return (self.value,)
+
+    def indexes(self, count, rng=None):
+        import numpy
+        return numpy.zeros(count, dtype=numpy.intp)
+
+
+class SequenceSampler(Sampler):
+    """
+    A value of a sequence chosen uniformly, so duplicates are more likely.
+
+    This draws the same values as :py:func:`achemkit.utils.utils.get_sample`
+    with the same generator.
+    """
+    __slots__ = ["values", "_n"]
+
+    def __init__(self, values):
+        """
+        :param values: Non-empty sequence of values.
+        """
+        self.values = tuple(values)
+        self._n = len(self.values)
+        if self._n == 0:
+            raise ValueError("no values to sample from")
+
+    def sample(self, rng):
+        return self.values[int(rng.random() * self._n)]
+
+    def samples(self, count, rng):
+        if _is_numpy(rng):
+            return _take(self.values, self.indexes(count, rng))
+        values = self.values
+        n = self._n
+        random = rng.random
+        return [values[int(random() * n)] for x in xrange(count)]
+
+    def indexes(self, count, rng):
+        import numpy
+        return (rng.random_sample(count) * self._n).astype(numpy.intp)
+
+
+class WeightedSampler(Sampler):
+    """
+    Values chosen in proportion to their weights, using an
+    :py:class:`AliasTable`.
+    """
+    __slots__ = ["values", "table"]
+
+    def __init__(self, weights):
+        """
+        :param weights: Dictionary of values to non-negative weights.
+        """
+        self.values = tuple(weights.keys())
+        self.table = AliasTable(weights.values())
+
+    def sample(self, rng):
+        return self.values[self.table.sample(rng)]
+
+    def samples(self, count, rng):
+        if _is_numpy(rng):
+            return _take(self.values, self.table.samples(count, rng))
+        values = self.values
+        return [values[i] for i in self.table.samples(count, rng)]
+
+    def indexes(self, count, rng):
+        return self.table.samples(count, rng)
+
+
+def make_sampler(distribution):
+    """
+    Create the sampler for a distribution in any of the forms accepted by
+    :py:func:`achemkit.utils.utils.get_sample`: a single number, a sequence
+    to choose from uniformly, or a dictionary of values to weights. A
+    :py:class:`Sampler` is returned as it is.
+
+    :rtype: :py:class:`Sampler`
+    """
+    if isinstance(distribution, Sampler):
+        return distribution
+    if isinstance(distribution, int) or isinstance(distribution, float):
+        return ConstantSampler(distribution)
+    if isinstance(distribution, list) or isinstance(distribution, tuple):
+        return SequenceSampler(distribution)
+    if isinstance(distribution, dict):
+        return WeightedSampler(distribution)
+    raise ValueError("unrecognised distribution "+repr(distribution))
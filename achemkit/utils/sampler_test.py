@@ -0,0 +1,94 @@
+"""
+This is the test harness for :py:mod:`achemkit.utils.sampler`.
+
+"""
+
+import unittest
+import random
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from achemkit.utils.utils import get_sample
+from achemkit.utils.sampler import AliasTable, make_sampler
+from achemkit.utils.sampler import ConstantSampler, SequenceSampler, WeightedSampler
+
+class TestAliasTable(unittest.TestCase):
+    
+    def setUp(self):
+        self.rng = random.Random(42)
+        
+    def test_single(self):
+        table = AliasTable((5.0,))
+        self.assertEqual(table.sample(self.rng), 0)
+        
+    def test_zero(self):
+        table = AliasTable((0.0, 1.0, 0.0))
+        for i in xrange(100):
+            self.assertEqual(table.sample(self.rng), 1)
+        
+    def test_invalid(self):
+        self.assertRaises(ValueError, AliasTable, ())
+        self.assertRaises(ValueError, AliasTable, (0.0, 0.0))
+        self.assertRaises(ValueError, AliasTable, (1.0, -1.0))
+        
+    def test_frequencies(self):
+        weights = (1.0, 2.0, 3.0, 4.0)
+        table = AliasTable(weights)
+        repeats = 20000
+        counts = [0] * len(weights)
+        for i in xrange(repeats):
+            counts[table.sample(self.rng)] += 1
+        for weight, count in zip(weights, counts):
+            self.assertAlmostEqual(count / float(repeats), weight / sum(weights), delta=0.02)
+            
+            
+class TestSamplers(unittest.TestCase):
+    
+    def setUp(self):
+        self.rng = random.Random(42)
+        
+    def test_make(self):
+        self.assertTrue(isinstance(make_sampler(2), ConstantSampler))
+        self.assertTrue(isinstance(make_sampler(2.5), ConstantSampler))
+        self.assertTrue(isinstance(make_sampler([1, 2]), SequenceSampler))
+        self.assertTrue(isinstance(make_sampler((1, 2)), SequenceSampler))
+        self.assertTrue(isinstance(make_sampler({1: 1.0}), WeightedSampler))
+        sampler = SequenceSampler((1,))
+        self.assertTrue(make_sampler(sampler) is sampler)
+        self.assertRaises(ValueError, make_sampler, "AB")
+        self.assertRaises(ValueError, make_sampler, [])
+        
+    def test_constant(self):
+        sampler = ConstantSampler(3)
+        self.assertEqual(sampler.sample(self.rng), 3)
+        self.assertEqual(sampler.samples(4, self.rng), [3, 3, 3, 3])
+        
+    def test_sequence(self):
+        #the same draws as get_sample
+        values = [(2, 1), (1, 2), (1, 1)]
+        sampler = SequenceSampler(values)
+        reference = random.Random(7)
+        expected = [get_sample(values, reference) for i in xrange(100)]
+        self.assertEqual(sampler.samples(100, random.Random(7)), expected)
+        self.assertEqual(sampler.sample(random.Random(7)), expected[0])
+        
+    def test_weighted(self):
+        sampler = WeightedSampler({"A": 1.0, "B": 3.0, "C": 0.0})
+        drawn = sampler.samples(10000, self.rng)
+        self.assertEqual(drawn.count("C"), 0)
+        self.assertAlmostEqual(drawn.count("B") / 10000.0, 0.75, delta=0.02)
+        
+    @unittest.skipIf(numpy is None, "requires NumPy")
+    def test_numpy(self):
+        rng = numpy.random.RandomState(42)
+        table = AliasTable((1.0, 2.0, 3.0, 4.0))
+        counts = numpy.bincount(table.samples(20000, rng), minlength=4) / 20000.0
+        for weight, count in zip((1.0, 2.0, 3.0, 4.0), counts):
+            self.assertAlmostEqual(count, weight / 10.0, delta=0.02)
+        drawn = SequenceSampler([(2, 1), (1, 2)]).samples(100, rng)
+        self.assertEqual(len(drawn), 100)
+        self.assertEqual(set(drawn), set([(2, 1), (1, 2)]))
+        drawn = WeightedSampler({"A": 1.0, "B": 0.0}).samples(100, rng)
+        self.assertEqual(drawn, ["A"] * 100)
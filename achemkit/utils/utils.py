@@ -16,33 +16,53 @@ def get_sample(distribution, rng=None):
     Distribution can be a mapping (dict) where the keys are things to be returned and
     values are the relative weightings.
     
+    If `rng` is not given, the shared generator of the :py:mod:`random` module
+    is used, so results can be reproduced with :py:func:`random.seed`.
     """
     #TODO convert this to try/except?
     if isinstance(distribution, int) or isinstance(distribution, float):
         return distribution
         
     if rng is None:
-        rng = random.Random()
+        rng = random
         
     if isinstance(distribution, list) or isinstance(distribution, tuple):
         return (rng.sample(distribution, 1))[0]
         
     if isinstance(distribution, dict):
         #assume its a value:proportion dict
-        total = sum(distribution.values())
+        #walk the items once, rather than building lists at every step
+        total = sum(distribution.itervalues())
         target = rng.random()*total
-        i = 0
-        score = distribution.values()[i]
-        hit = distribution.keys()[i]
-        while score < target:
-            i += 1
-            score += distribution.values()[i]
-            hit = distribution.keys()[i]
+        score = 0
+        for hit, weight in distribution.iteritems():
+            score += weight
+            if score >= target:
+                return hit
         return hit
         
 def get_samples(distribution, count, rng):
     return [get_sample(distribution, rng) for x in xrange(count)]
 
+def get_probabilities(distribution):
+    """
+    Returns a dictionary of the values :py:func:`get_sample` can return
+    for a provided distribution, and the probability of each.
+    """
+    if isinstance(distribution, int) or isinstance(distribution, float):
+        return {distribution: 1.0}
+
+    if isinstance(distribution, list) or isinstance(distribution, tuple):
+        weights = {}
+        for value in distribution:
+            weights[value] = weights.get(value, 0) + 1
+    elif isinstance(distribution, dict):
+        weights = distribution
+    else:
+        raise TypeError("unknown distribution ("+repr(distribution)+")")
+    total = float(sum(weights.values()))
+    return dict((value, weights[value] / total) for value in weights)
+
 def long_subseq(data):
     """
     Given some sequences --- strings, tuples, lists, etc --- return the 
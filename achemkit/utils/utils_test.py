@@ -34,3 +34,21 @@ class TestGetSample(unittest.TestCase):
         self.assertEqual(result, 1)
         result = get_sample({1:10}, random.Random())
         self.assertEqual(result, 1)
+        
+    def test_shared(self):
+        #without a generator, the seed of the random module is used
+        random.seed(42)
+        first = [get_sample(range(100)) for i in xrange(10)]
+        random.seed(42)
+        self.assertEqual([get_sample(range(100)) for i in xrange(10)], first)
+
+class TestGetProbabilities(unittest.TestCase):
+    
+    def test_ints(self):
+        self.assertEqual(get_probabilities(2), {2:1.0})
+        
+    def test_lists(self):
+        self.assertEqual(get_probabilities([1,2,2,2]), {1:0.25, 2:0.75})
+        
+    def test_dicts(self):
+        self.assertEqual(get_probabilities({1:1, 2:3}), {1:0.25, 2:0.75})
@@ -26,6 +26,7 @@ setup(name="AChemKit",
         'chem_to_dot = achemkit.tools.chem_to_dot:main',
         'chem_to_pdf = achemkit.tools.chem_to_pdf:main']},
     install_requires = [
-        'networkx',
-        'pyumpf']
+        'networkx'],
+    extras_require = {
+        'umpf': ['pyumpf']}
     )